@@ -1,49 +1,66 @@
-from flask import Flask, request, jsonify, g
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, g, stream_with_context
 from flask_cors import CORS
 import logging
+import time
 from datetime import datetime
 import os
 
 # Importar servicios de autenticación
 from config import Config
 from auth_service import AuthService
-from mongodb_service import MongoDBService
-from auth_middleware import require_auth, optional_auth, get_current_user
+from auth_middleware import require_auth, require_admin, optional_auth, get_current_user, get_current_session
+from auth_cache import principal_cache, hash_token
+from chat_backends import get_chat_backend
+from token_denylist import token_denylist
+from response_cache import response_cache
+from chat_context import model_context
+from json_provider import get_json_provider_class, public_documents
+from services import services
+from mongodb_service import chat_history_fields
+import exports
+import http_cache
+import log_config
+import metrics
 
-app = Flask(__name__)
-
-# Configurar la aplicación
-app.config.from_object(Config)
-CORS(app, origins=[Config.FRONTEND_URL])
-
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (JSON desde un hilo aparte, ver log_config.py)
+log_config.configure_logging()
 logger = logging.getLogger(__name__)
 
-# Inicializar servicios
-try:
-    db_service = MongoDBService()
-    logger.info("Servicios inicializados correctamente")
-except Exception as e:
-    logger.error(f"Error inicializando servicios: {str(e)}")
-    db_service = None
+# Rutas de la API (se registran en la app desde create_app)
+api = Blueprint('api', __name__)
 
-# Almacenamiento temporal para formularios (en producción usar base de datos)
-form_submissions = []
+def _enqueue_job(name, **kwargs):
+    """Encola un trabajo sin afectar a la respuesta si la cola falla"""
+    job_queue = services.job_queue
+    if not job_queue:
+        return
+    try:
+        job_queue.enqueue(name, **kwargs)
+    except Exception as e:
+        logger.warning(f"No se pudo encolar el trabajo {name}: {str(e)}")
 
-@app.route('/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
 def health_check():
     """Endpoint para verificar el estado del servidor"""
+    db_service = services.db
     return jsonify({
         "status": "ok", 
         "message": "Servidor Flask funcionando correctamente",
-        "mongodb_connected": db_service is not None,
+        "mongodb_connected": db_service is not None and db_service.ping(),
+        "mongodb_pool": db_service.get_pool_stats() if db_service else None,
+        "auth_cache": principal_cache.stats(),
+        "token_denylist": token_denylist.stats(),
+        "response_cache": response_cache.stats(),
+        "chat_writer": db_service.chat_writer.stats() if db_service and db_service.chat_writer else None,
+        "jobs": services.job_queue_stats(),
+        "logging": log_config.logging_stats(),
         "timestamp": datetime.utcnow().isoformat()
     }), 200
 
-@app.route('/auth/google', methods=['POST'])
+@api.route('/auth/google', methods=['POST'])
 def google_auth():
     """Endpoint para autenticación con Google OAuth"""
+    db_service = services.db
     try:
         data = request.json
         google_token = data.get('token')
@@ -67,10 +84,6 @@ def google_auth():
         if not jwt_token:
             return jsonify({"error": "Error generando token de sesión"}), 500
         
-        # Crear sesión en MongoDB
-        if db_service:
-            session_id = db_service.create_session(user_info['google_id'], jwt_token)
-        
         response_data = {
             "message": "Autenticación exitosa",
             "user": {
@@ -83,14 +96,22 @@ def google_auth():
             "expires_in": Config.JWT_ACCESS_TOKEN_EXPIRES
         }
         
-        logger.info(f"Usuario autenticado exitosamente: {user_info['email']}")
-        return jsonify(response_data), 200
+        logger.info("Usuario autenticado exitosamente: %s", user_info['email'])
+        response = jsonify(response_data)
+        
+        # Crear la sesión en MongoDB cuando la respuesta ya se envió (fuera del camino
+        # crítico del login; la revocación del token no depende de la sesión)
+        if db_service:
+            token_hash = hash_token(jwt_token)
+            response.call_on_close(lambda: db_service.create_session(user_info['google_id'], token_hash))
+        
+        return response, 200
         
     except Exception as e:
         logger.error(f"Error en autenticación: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
-@app.route('/auth/verify', methods=['GET'])
+@api.route('/auth/verify', methods=['GET'])
 @require_auth
 def verify_token():
     """Endpoint para verificar si un token JWT es válido"""
@@ -109,29 +130,41 @@ def verify_token():
         logger.error(f"Error verificando token: {str(e)}")
         return jsonify({"error": "Error verificando token"}), 500
 
-@app.route('/auth/logout', methods=['POST'])
+@api.route('/auth/logout', methods=['POST'])
 @require_auth
 def logout():
     """Endpoint para cerrar sesión"""
+    db_service = services.db
     try:
         user = get_current_user()
         
+        # Revocar el jti: el resto de workers lo verán en su próxima sincronización
+        # Si no se pudo guardar, el token seguiría siendo válido en los demás workers
+        if user.get('token_id'):
+            if not token_denylist.revoke(user['token_id'], datetime.utcfromtimestamp(user['token_expires'])):
+                logger.error("No se pudo revocar el token de %s", user['email'])
+                return jsonify({"error": "Error cerrando sesión"}), 503
+        
         # Invalidar sesión en MongoDB si existe
-        if db_service and hasattr(g, 'current_session'):
-            session = g.current_session
+        session = get_current_session() if db_service else None
+        if session:
             db_service.invalidate_session(session['_id'])
         
-        logger.info(f"Usuario cerró sesión: {user['email']}")
+        # Eliminar el token de la caché de autenticación
+        principal_cache.evict_token(g.auth_token_key)
+        
+        logger.info("Usuario cerró sesión: %s", user['email'])
         return jsonify({"message": "Sesión cerrada exitosamente"}), 200
         
     except Exception as e:
         logger.error(f"Error cerrando sesión: {str(e)}")
         return jsonify({"error": "Error cerrando sesión"}), 500
 
-@app.route('/submit-form', methods=['POST'])
+@api.route('/submit-form', methods=['POST'])
 @optional_auth
 def submit_form():
     """Endpoint para manejar envíos de formularios de contacto"""
+    db_service = services.db
     try:
         data = request.json
         
@@ -147,24 +180,29 @@ def submit_form():
         # Agregar información del usuario autenticado si existe
         user = get_current_user()
         submission = {
-            'id': len(form_submissions) + 1,
             'name': data['name'],
             'email': data['email'],
             'message': data['message'],
             'company': data.get('company', ''),
             'phone': data.get('phone', ''),
             'service_type': data.get('service_type', ''),
-            'timestamp': datetime.now().isoformat(),
             'authenticated_user': user['user_id'] if user else None
         }
         
-        form_submissions.append(submission)
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+        
+        submission_id = db_service.save_form_submission(submission)
+        if not submission_id:
+            return jsonify({"error": "Error guardando el formulario"}), 500
         
-        logger.info(f"Nuevo formulario recibido de: {data['email']}")
+        logger.info("Nuevo formulario recibido de: %s", data['email'])
+        _enqueue_job('notify_new_lead', submission_id=submission_id, email=data['email'], service_type=submission['service_type'])
+        _enqueue_job('track_event', event='form_submission')
         
         return jsonify({
             "message": "¡Formulario recibido exitosamente!",
-            "id": submission['id'],
+            "id": submission_id,
             "status": "success"
         }), 200
         
@@ -172,20 +210,79 @@ def submit_form():
         logger.error(f"Error procesando formulario: {str(e)}")
         return jsonify({"error": "Error interno del servidor"}), 500
 
-@app.route('/get-submissions', methods=['GET'])
+@api.route('/get-submissions', methods=['GET'])
 @require_auth
 def get_submissions():
-    """Endpoint para obtener todas las consultas (para admin)"""
-    return jsonify({
-        "submissions": form_submissions,
-        "total": len(form_submissions)
-    }), 200
+    """Endpoint para obtener las consultas (para admin), paginadas y filtrables"""
+    db_service = services.db
+    try:
+        if not db_service:
+            return jsonify({"submissions": [], "total": 0, "next_cursor": None}), 200
+        
+        # Respuesta 304 si no hay formularios nuevos desde la última consulta
+        etag, last_modified = _validators(
+            lambda: db_service.get_form_submissions_version(request.args.get('email'), request.args.get('service_type')),
+            'submissions', request.query_string
+        )
+        if etag and http_cache.is_not_modified(etag, last_modified):
+            return http_cache.not_modified_response(etag, last_modified)
+        
+        try:
+            page = db_service.get_form_submissions_page(
+                limit=request.args.get('limit', 50, type=int),
+                cursor=request.args.get('cursor'),
+                email=request.args.get('email'),
+                service_type=request.args.get('service_type')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        response = jsonify({
+            "submissions": public_documents(page['submissions']),
+            "total": page['total'],
+            "next_cursor": page['next_cursor']
+        })
+        if etag:
+            http_cache.with_validators(response, etag, last_modified)
+        return response, 200
+        
+    except Exception as e:
+        logger.error(f"Error obteniendo formularios: {str(e)}")
+        return jsonify({"error": "Error obteniendo formularios"}), 500
+
+def _validators(version_lookup, *etag_parts):
+    """
+    Calcula (ETag, Last-Modified) a partir de la versión de los datos (último
+    documento), o (None, None) si no se pudo consultar
+    """
+    try:
+        version = version_lookup()
+    except Exception as e:
+        logger.warning(f"No se pudo obtener la versión de los datos: {str(e)}")
+        return None, None
+    
+    if version is None:
+        return http_cache.make_etag('empty', *etag_parts), None
+    return http_cache.make_etag(version['_id'], version['timestamp'].isoformat(), *etag_parts), version['timestamp']
 
-@app.route('/chatbot', methods=['POST'])
+def _sse_event(data, event=None):
+    """Serializa un evento Server-Sent Events"""
+    payload = f"data: {current_app.json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+def _wants_stream(data):
+    """Indica si el cliente pidió la respuesta en streaming (SSE)"""
+    if data.get('stream') or request.args.get('stream') in ('1', 'true'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+@api.route('/chatbot', methods=['POST'])
 @require_auth
 def chatbot():
     """Endpoint para el chatbot - REQUIERE AUTENTICACIÓN"""
+    db_service = services.db
     try:
+        started_at = time.perf_counter()
         data = request.json
         message = data.get('message', '')
         
@@ -193,18 +290,37 @@ def chatbot():
             return jsonify({"error": "Mensaje requerido"}), 400
         
         user = get_current_user()
+        backend = get_chat_backend()
+        
+        # Contexto previo al mensaje: últimos turnos dentro del presupuesto + resumen
+        context = services.context_builder.build(user['user_id']) if services.context_builder else None
+        history = model_context(context) if context else None
         
         # Guardar mensaje del usuario en MongoDB
         if db_service:
             db_service.save_chat_message(user['user_id'], message, 'user')
         
-        # Aquí se integrará la lógica del chatbot con LangGraph
-        # Por ahora, respuesta simulada
-        bot_response = f"Hola {user['name']}, gracias por tu mensaje: '{message}'. Pronto integraremos un chatbot inteligente aquí."
+        cache_key = None
+        if response_cache.allowed(data, user):
+            cache_key = response_cache.make_key(backend, message, user, context)
+        cached_response = response_cache.get(cache_key) if cache_key else None
+        
+        _enqueue_job('track_event', event='chat_message')
+        
+        if _wants_stream(data):
+            return _stream_chatbot_response(backend, message, user, started_at, cache_key, cached_response, context)
+        
+        if cached_response is not None:
+            bot_response = cached_response
+        else:
+            backend_started_at = time.perf_counter()
+            bot_response = backend.complete(message, user, history)
+            if cache_key:
+                response_cache.set(cache_key, bot_response, (time.perf_counter() - backend_started_at) * 1000)
         
         # Guardar respuesta del bot en MongoDB
         if db_service:
-            db_service.save_chat_message(user['user_id'], bot_response, 'bot')
+            db_service.save_chat_message(user['user_id'], bot_response, 'bot', _bot_metadata(cached_response, context))
         
         response = {
             "message": bot_response,
@@ -219,39 +335,276 @@ def chatbot():
         logger.error(f"Error en chatbot: {str(e)}")
         return jsonify({"error": "Error en el chatbot"}), 500
 
-@app.route('/chat/history', methods=['GET'])
+def _bot_metadata(cached_response, context=None):
+    """Metadata del turno del bot en chat_history (caché y resumen de contexto)"""
+    metadata = services.context_builder.summary_metadata(context) if context else {}
+    if cached_response is not None:
+        metadata['cached'] = True
+    return metadata
+
+def _stream_chatbot_response(backend, message, user, started_at, cache_key=None, cached_response=None, context=None):
+    """
+    Envía la respuesta del backend token a token (SSE) y guarda el mensaje
+    del bot en el historial solo cuando el stream termina. Las respuestas
+    cacheadas se envían en un único evento
+    """
+    def generate():
+        tokens = []
+        first_token_at = None
+        backend_started_at = time.perf_counter()
+        try:
+            history = model_context(context) if context else None
+            stream = [cached_response] if cached_response is not None else backend.stream(message, user, history)
+            for token in stream:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens.append(token)
+                yield _sse_event({"token": token})
+            
+            bot_response = ''.join(tokens)
+            finished_at = time.perf_counter()
+            if cache_key and cached_response is None:
+                response_cache.set(cache_key, bot_response, (finished_at - backend_started_at) * 1000)
+            
+            db_service = services.db
+            if db_service:
+                db_service.save_chat_message(user['user_id'], bot_response, 'bot', _bot_metadata(cached_response, context))
+            
+            ttfb_ms = ((first_token_at or finished_at) - started_at) * 1000
+            duration_ms = (finished_at - started_at) * 1000
+            logger.info("Stream de chatbot completado: ttfb=%.1fms duración=%.1fms tokens=%d", ttfb_ms, duration_ms, len(tokens))
+            
+            yield _sse_event({
+                "message": bot_response,
+                "timestamp": datetime.now().isoformat(),
+                "type": "bot_response",
+                "user_id": user['user_id'],
+                "cached": cached_response is not None,
+                "ttfb_ms": round(ttfb_ms, 3),
+                "duration_ms": round(duration_ms, 3)
+            }, event='done')
+            
+        except Exception as e:
+            logger.error(f"Error en stream del chatbot: {str(e)}")
+            yield _sse_event({"error": "Error en el chatbot"}, event='error')
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@api.route('/chat/history', methods=['GET'])
 @require_auth
 def get_chat_history():
-    """Endpoint para obtener el historial de chat del usuario"""
+    """Endpoint para obtener el historial de chat del usuario (paginado por cursor)"""
+    db_service = services.db
     try:
         user = get_current_user()
         limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
+        
+        fields = chat_history_fields(request.args.get('fields'))
         
         if db_service:
-            history = db_service.get_chat_history(user['user_id'], limit)
-            return jsonify({
+            # Respuesta 304 si el usuario no tiene mensajes nuevos desde la última consulta
+            etag, last_modified = _validators(
+                lambda: db_service.get_chat_history_version(user['user_id']),
+                'history', user['user_id'], request.query_string
+            )
+            if etag and http_cache.is_not_modified(etag, last_modified):
+                return http_cache.not_modified_response(etag, last_modified)
+            
+            try:
+                page = db_service.get_chat_history_page(user['user_id'], limit, cursor, fields)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            history = public_documents(page['messages'])
+            response = jsonify({
                 "history": history,
-                "total": len(history)
-            }), 200
+                "total": len(history),
+                "next_cursor": page['next_cursor']
+            })
+            if etag:
+                http_cache.with_validators(response, etag, last_modified)
+            return response, 200
         else:
-            return jsonify({"history": [], "total": 0}), 200
+            return jsonify({"history": [], "total": 0, "next_cursor": None}), 200
         
     except Exception as e:
         logger.error(f"Error obteniendo historial: {str(e)}")
         return jsonify({"error": "Error obteniendo historial"}), 500
 
+def _export_response(name, export_format, cursor, columns):
+    """Respuesta en streaming de una exportación (descarga como fichero adjunto)"""
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    return Response(
+        stream_with_context(exports.stream_export(cursor, export_format, columns, current_app.json.dumps)),
+        mimetype=exports.EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def _export_params():
+    """Formato y rango de fechas [since, until) de una exportación; lanza ValueError"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in exports.EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {export_format} (ndjson o csv)")
+    return export_format, exports.parse_datetime(request.args.get('since')), exports.parse_datetime(request.args.get('until'))
+
+@api.route('/admin/export/chat-history', methods=['GET'])
+@require_admin
+def export_chat_history():
+    """Exporta el historial de chat (NDJSON o CSV) en streaming - SOLO ADMIN"""
+    db_service = services.db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+        
+        try:
+            export_format, since, until = _export_params()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        cursor = db_service.export_chat_history(request.args.get('user_id'), since, until)
+        logger.info("Exportación de historial solicitada por: %s", get_current_user()['email'])
+        return _export_response('chat_history', export_format, cursor, exports.CHAT_HISTORY_COLUMNS)
+        
+    except Exception as e:
+        logger.error(f"Error exportando historial: {str(e)}")
+        return jsonify({"error": "Error exportando historial"}), 500
+
+@api.route('/admin/export/submissions', methods=['GET'])
+@require_admin
+def export_submissions():
+    """Exporta los formularios de contacto (NDJSON o CSV) en streaming - SOLO ADMIN"""
+    db_service = services.db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+        
+        try:
+            export_format, since, until = _export_params()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        cursor = db_service.export_form_submissions(
+            email=request.args.get('email'),
+            service_type=request.args.get('service_type'),
+            since=since,
+            until=until
+        )
+        logger.info("Exportación de formularios solicitada por: %s", get_current_user()['email'])
+        return _export_response('submissions', export_format, cursor, exports.FORM_SUBMISSION_COLUMNS)
+        
+    except Exception as e:
+        logger.error(f"Error exportando formularios: {str(e)}")
+        return jsonify({"error": "Error exportando formularios"}), 500
+
+@api.route('/admin/search/chat-history', methods=['GET'])
+@require_admin
+def search_chat_history():
+    """Búsqueda de texto en el historial de chat, por relevancia y paginada - SOLO ADMIN"""
+    db_service = services.db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+        
+        try:
+            since, until = exports.parse_datetime(request.args.get('since')), exports.parse_datetime(request.args.get('until'))
+            page = db_service.search_chat_history(
+                request.args.get('q'),
+                user_id=request.args.get('user_id'),
+                since=since,
+                until=until,
+                limit=request.args.get('limit', 20, type=int),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(dict(page, results=public_documents(page['results'])))
+        
+    except Exception as e:
+        logger.error(f"Error buscando en el historial: {str(e)}")
+        return jsonify({"error": "Error buscando en el historial"}), 500
+
+@api.route('/admin/search/submissions', methods=['GET'])
+@require_admin
+def search_submissions():
+    """Búsqueda de texto en los formularios de contacto, por relevancia y paginada - SOLO ADMIN"""
+    db_service = services.db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+        
+        try:
+            since, until = exports.parse_datetime(request.args.get('since')), exports.parse_datetime(request.args.get('until'))
+            page = db_service.search_form_submissions(
+                request.args.get('q'),
+                email=request.args.get('email'),
+                service_type=request.args.get('service_type'),
+                since=since,
+                until=until,
+                limit=request.args.get('limit', 20, type=int),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        
+        return jsonify(dict(page, results=public_documents(page['results'])))
+        
+    except Exception as e:
+        logger.error(f"Error buscando formularios: {str(e)}")
+        return jsonify({"error": "Error buscando formularios"}), 500
+
+def create_app(config_object=Config):
+    """
+    Crea la aplicación Flask. No conecta a MongoDB ni crea índices: los servicios
+    se inicializan en la primera request que los necesita (services.py)
+    """
+    app = Flask(__name__)
+    
+    # Codificador JSON de las respuestas (orjson si está disponible; soporta ObjectId y datetime)
+    app.json = get_json_provider_class()(app)
+    
+    # Configurar la aplicación
+    app.config.from_object(config_object)
+    CORS(app, origins=[config_object.FRONTEND_URL])
+    
+    # Id de request (X-Request-ID) en los logs y en la respuesta
+    log_config.init_app(app)
+    
+    # Latencia por request y por operación (/metrics y Server-Timing)
+    metrics.init_app(app)
+    
+    # Compresión gzip/brotli de las respuestas grandes
+    http_cache.init_app(app)
+    
+    app.register_blueprint(api)
+    return app
+
+# Instancia para `gunicorn app:app` y `python app.py`
+app = create_app()
+
 if __name__ == "__main__":
     print("🚀 Iniciando servidor Flask para AI Wrapper Agency...")
     print("📍 Servidor disponible en: http://localhost:5000")
     print("📋 Endpoints disponibles:")
     print("   - GET  /health              - Estado del servidor")
+    print("   - GET  /metrics             - Métricas de latencia (Prometheus)")
     print("   - POST /auth/google         - Autenticación con Google")
     print("   - GET  /auth/verify         - Verificar token JWT")
     print("   - POST /auth/logout         - Cerrar sesión")
     print("   - POST /submit-form         - Envío de formularios")
     print("   - GET  /get-submissions     - Obtener consultas (requiere auth)")
-    print("   - POST /chatbot             - Chatbot (requiere auth)")
+    print("   - POST /chatbot             - Chatbot (requiere auth, stream=true para SSE)")
     print("   - GET  /chat/history        - Historial de chat (requiere auth)")
+    print("   - GET  /admin/export/...    - Exportaciones NDJSON/CSV (requiere admin)")
+    print("   - GET  /admin/search/...    - Búsqueda de texto (requiere admin)")
     
     # Validar configuración antes de iniciar
     try:
@@ -261,4 +614,11 @@ if __name__ == "__main__":
         print(f"❌ Error en configuración: {e}")
         print("📝 Crea un archivo .env con las variables necesarias")
     
+    # En desarrollo se crean los índices al arrancar (en producción: manage.py ensure-indexes)
+    try:
+        if services.db:
+            services.db.ensure_indexes()
+    except Exception as e:
+        print(f"⚠️  No se pudieron crear los índices: {e}")
+    
     app.run(host='0.0.0.0', port=5000, debug=True) 
\ No newline at end of file
@@ -0,0 +1,666 @@
+"""
+App ASGI (Quart) con las mismas rutas que app.py, para servir muchas
+conversaciones lentas a la vez en un solo proceso:
+
+    cd backend
+    hypercorn asgi_app:app --bind 0.0.0.0:5000 --workers 2
+
+Las rutas, la autenticación (async_auth.py) y las operaciones de MongoDB
+(AsyncMongoDBService) son corrutinas: mientras una request espera al modelo o a
+MongoDB, el event loop atiende a las demás, en lugar de ocupar un hilo por
+conversación como con Gunicorn + gthread. La app WSGI (app.py) sigue siendo la
+de por defecto. Las llamadas que siguen siendo síncronas (verificación del token
+de Google, revocación, cola de trabajos) se ejecutan con asyncio.to_thread.
+"""
+from quart import Blueprint, Quart, Response, current_app, request, jsonify, g, stream_with_context, websocket
+from quart_cors import cors
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from config import Config
+from auth_service import AuthService
+from async_auth import require_auth, require_admin, optional_auth, get_current_user, get_current_session
+from auth_cache import principal_cache, hash_token
+from chat_backends import get_chat_backend
+from chat_socket import ChatSocket, ConnectionClosed
+from token_denylist import token_denylist
+from response_cache import response_cache
+from chat_context import model_context
+from json_provider import get_json_provider_class, public_documents
+from mongodb_service import chat_history_fields
+from services import services
+import exports
+import http_cache
+import log_config
+import metrics
+
+log_config.configure_logging()
+logger = logging.getLogger(__name__)
+
+# Rutas de la API (se registran en la app desde create_app)
+api = Blueprint('api', __name__)
+
+async def _enqueue_job(name, **kwargs):
+    """Encola un trabajo sin afectar a la respuesta si la cola falla"""
+    job_queue = services.job_queue
+    if not job_queue:
+        return
+    try:
+        await asyncio.to_thread(job_queue.enqueue, name, **kwargs)
+    except Exception as e:
+        logger.warning(f"No se pudo encolar el trabajo {name}: {str(e)}")
+
+@api.route('/health', methods=['GET'])
+async def health_check():
+    """Endpoint para verificar el estado del servidor"""
+    db_service = services.async_db
+    return jsonify({
+        "status": "ok",
+        "message": "Servidor ASGI funcionando correctamente",
+        "mongodb_connected": db_service is not None and await db_service.ping(),
+        "mongodb_pool": db_service.get_pool_stats() if db_service else None,
+        "auth_cache": principal_cache.stats(),
+        "token_denylist": token_denylist.stats(),
+        "response_cache": response_cache.stats(),
+        "jobs": services.job_queue_stats(),
+        "logging": log_config.logging_stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }), 200
+
+@api.route('/auth/google', methods=['POST'])
+async def google_auth():
+    """Endpoint para autenticación con Google OAuth"""
+    db_service = services.async_db
+    try:
+        data = await request.get_json()
+        google_token = data.get('token')
+
+        if not google_token:
+            return jsonify({"error": "Token de Google requerido"}), 400
+
+        # Verificar el token de Google (firma RSA y, si caducaron, descarga de certificados)
+        user_info = await asyncio.to_thread(AuthService.verify_google_token, google_token)
+        if not user_info:
+            return jsonify({"error": "Token de Google inválido"}), 401
+
+        # Crear o actualizar usuario en MongoDB
+        if db_service:
+            user = await db_service.create_or_update_user(user_info)
+            if not user:
+                return jsonify({"error": "Error creando usuario"}), 500
+
+        # Generar JWT token
+        jwt_token = AuthService.generate_jwt_token(user_info)
+        if not jwt_token:
+            return jsonify({"error": "Error generando token de sesión"}), 500
+
+        # Crear la sesión en segundo plano, fuera del camino crítico del login
+        if db_service:
+            current_app.add_background_task(db_service.create_session, user_info['google_id'], hash_token(jwt_token))
+
+        logger.info("Usuario autenticado exitosamente: %s", user_info['email'])
+        return jsonify({
+            "message": "Autenticación exitosa",
+            "user": {
+                "id": user_info['google_id'],
+                "email": user_info['email'],
+                "name": user_info['name'],
+                "picture": user_info.get('picture', '')
+            },
+            "token": jwt_token,
+            "expires_in": Config.JWT_ACCESS_TOKEN_EXPIRES
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error en autenticación: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/auth/verify', methods=['GET'])
+@require_auth
+async def verify_token():
+    """Endpoint para verificar si un token JWT es válido"""
+    user = get_current_user()
+    return jsonify({
+        "valid": True,
+        "user": {
+            "id": user['user_id'],
+            "email": user['email'],
+            "name": user['name']
+        }
+    }), 200
+
+@api.route('/auth/logout', methods=['POST'])
+@require_auth
+async def logout():
+    """Endpoint para cerrar sesión"""
+    db_service = services.async_db
+    try:
+        user = get_current_user()
+
+        # Revocar el jti: el resto de workers lo verán en su próxima sincronización
+        # Si no se pudo guardar, el token seguiría siendo válido en los demás workers
+        if user.get('token_id'):
+            if not await asyncio.to_thread(token_denylist.revoke, user['token_id'], datetime.utcfromtimestamp(user['token_expires'])):
+                logger.error("No se pudo revocar el token de %s", user['email'])
+                return jsonify({"error": "Error cerrando sesión"}), 503
+
+        # Invalidar sesión en MongoDB si existe
+        session = await get_current_session() if db_service else None
+        if session:
+            await db_service.invalidate_session(session['_id'])
+
+        # Eliminar el token de la caché de autenticación
+        principal_cache.evict_token(g.auth_token_key)
+
+        logger.info("Usuario cerró sesión: %s", user['email'])
+        return jsonify({"message": "Sesión cerrada exitosamente"}), 200
+
+    except Exception as e:
+        logger.error(f"Error cerrando sesión: {str(e)}")
+        return jsonify({"error": "Error cerrando sesión"}), 500
+
+@api.route('/submit-form', methods=['POST'])
+@optional_auth
+async def submit_form():
+    """Endpoint para manejar envíos de formularios de contacto"""
+    db_service = services.async_db
+    try:
+        data = await request.get_json()
+
+        if not data:
+            return jsonify({"error": "No se recibieron datos"}), 400
+
+        # Validar campos requeridos
+        required_fields = ['name', 'email', 'message']
+        for field in required_fields:
+            if field not in data or not data[field].strip():
+                return jsonify({"error": f"El campo '{field}' es requerido"}), 400
+
+        user = get_current_user()
+        submission = {
+            'name': data['name'],
+            'email': data['email'],
+            'message': data['message'],
+            'company': data.get('company', ''),
+            'phone': data.get('phone', ''),
+            'service_type': data.get('service_type', ''),
+            'authenticated_user': user['user_id'] if user else None
+        }
+
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+
+        submission_id = await db_service.save_form_submission(submission)
+        if not submission_id:
+            return jsonify({"error": "Error guardando el formulario"}), 500
+
+        logger.info("Nuevo formulario recibido de: %s", data['email'])
+        await _enqueue_job('notify_new_lead', submission_id=submission_id, email=data['email'], service_type=submission['service_type'])
+        await _enqueue_job('track_event', event='form_submission')
+
+        return jsonify({
+            "message": "¡Formulario recibido exitosamente!",
+            "id": submission_id,
+            "status": "success"
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error procesando formulario: {str(e)}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@api.route('/get-submissions', methods=['GET'])
+@require_auth
+async def get_submissions():
+    """Endpoint para obtener las consultas (para admin), paginadas y filtrables"""
+    db_service = services.async_db
+    try:
+        if not db_service:
+            return jsonify({"submissions": [], "total": 0, "next_cursor": None}), 200
+
+        # Respuesta 304 si no hay formularios nuevos desde la última consulta
+        etag, last_modified = await _validators(
+            db_service.get_form_submissions_version(request.args.get('email'), request.args.get('service_type')),
+            'submissions', request.query_string
+        )
+        if etag and http_cache.is_not_modified(etag, last_modified, request):
+            return http_cache.not_modified_response(etag, last_modified, Response)
+
+        try:
+            page = await db_service.get_form_submissions_page(
+                limit=request.args.get('limit', 50, type=int),
+                cursor=request.args.get('cursor'),
+                email=request.args.get('email'),
+                service_type=request.args.get('service_type')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        response = jsonify({
+            "submissions": public_documents(page['submissions']),
+            "total": page['total'],
+            "next_cursor": page['next_cursor']
+        })
+        if etag:
+            http_cache.with_validators(response, etag, last_modified)
+        return response, 200
+
+    except Exception as e:
+        logger.error(f"Error obteniendo formularios: {str(e)}")
+        return jsonify({"error": "Error obteniendo formularios"}), 500
+
+async def _validators(version_lookup, *etag_parts):
+    """
+    Calcula (ETag, Last-Modified) esperando la corrutina que devuelve la versión
+    de los datos, o (None, None) si no se pudo consultar
+    """
+    try:
+        version = await version_lookup
+    except Exception as e:
+        logger.warning(f"No se pudo obtener la versión de los datos: {str(e)}")
+        return None, None
+
+    if version is None:
+        return http_cache.make_etag('empty', *etag_parts), None
+    return http_cache.make_etag(version['_id'], version['timestamp'].isoformat(), *etag_parts), version['timestamp']
+
+def _sse_event(data, event=None):
+    """Serializa un evento Server-Sent Events"""
+    payload = f"data: {current_app.json.dumps(data)}\n\n"
+    return f"event: {event}\n{payload}" if event else payload
+
+def _wants_stream(data):
+    """Indica si el cliente pidió la respuesta en streaming (SSE)"""
+    if data.get('stream') or request.args.get('stream') in ('1', 'true'):
+        return True
+    return 'text/event-stream' in request.headers.get('Accept', '')
+
+def _bot_metadata(cached_response, context=None):
+    """Metadata del turno del bot en chat_history (caché y resumen de contexto)"""
+    metadata = services.async_context_builder.summary_metadata(context) if context else {}
+    if cached_response is not None:
+        metadata['cached'] = True
+    return metadata
+
+async def _start_chat_turn(data, message, user):
+    """
+    Inicio de un turno del chat (POST /chatbot o canal WebSocket): contexto
+    previo, mensaje del usuario en el historial y consulta a la caché de
+    respuestas. Devuelve (backend, context, cache_key, cached_response)
+    """
+    backend = get_chat_backend()
+
+    # Contexto previo al mensaje: últimos turnos dentro del presupuesto + resumen
+    context_builder = services.async_context_builder
+    context = await context_builder.abuild(user['user_id']) if context_builder else None
+
+    # Guardar mensaje del usuario en MongoDB
+    db_service = services.async_db
+    if db_service:
+        await db_service.save_chat_message(user['user_id'], message, 'user')
+
+    cache_key = None
+    if response_cache.allowed(data, user):
+        cache_key = response_cache.make_key(backend, message, user, context)
+    cached_response = await response_cache.aget(cache_key) if cache_key else None
+
+    await _enqueue_job('track_event', event='chat_message')
+    return backend, context, cache_key, cached_response
+
+async def _finish_chat_turn(user, bot_response, backend_ms, cache_key=None, cached_response=None, context=None):
+    """
+    Fin de un turno del chat: guarda la respuesta en la caché (si no salió de
+    ella) y en el historial
+    """
+    if cache_key and cached_response is None:
+        await response_cache.aset(cache_key, bot_response, backend_ms)
+
+    # Guardar respuesta del bot en MongoDB
+    db_service = services.async_db
+    if db_service:
+        await db_service.save_chat_message(user['user_id'], bot_response, 'bot', _bot_metadata(cached_response, context))
+
+@api.route('/chatbot', methods=['POST'])
+@require_auth
+async def chatbot():
+    """Endpoint para el chatbot - REQUIERE AUTENTICACIÓN"""
+    try:
+        started_at = time.perf_counter()
+        data = await request.get_json()
+        message = data.get('message', '')
+
+        if not message:
+            return jsonify({"error": "Mensaje requerido"}), 400
+
+        user = get_current_user()
+        backend, context, cache_key, cached_response = await _start_chat_turn(data, message, user)
+
+        if _wants_stream(data):
+            return _stream_chatbot_response(backend, message, user, started_at, cache_key, cached_response, context)
+
+        if cached_response is not None:
+            bot_response = cached_response
+            backend_ms = None
+        else:
+            backend_started_at = time.perf_counter()
+            bot_response = await backend.acomplete(message, user, model_context(context) if context else None)
+            backend_ms = (time.perf_counter() - backend_started_at) * 1000
+
+        await _finish_chat_turn(user, bot_response, backend_ms, cache_key, cached_response, context)
+
+        return jsonify({
+            "message": bot_response,
+            "timestamp": datetime.now().isoformat(),
+            "type": "bot_response",
+            "user_id": user['user_id']
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error en chatbot: {str(e)}")
+        return jsonify({"error": "Error en el chatbot"}), 500
+
+def _stream_chatbot_response(backend, message, user, started_at, cache_key=None, cached_response=None, context=None):
+    """
+    Envía la respuesta del backend token a token (SSE) y guarda el mensaje
+    del bot en el historial solo cuando el stream termina
+    """
+    async def generate():
+        tokens = []
+        first_token_at = None
+        backend_started_at = time.perf_counter()
+        try:
+            if cached_response is not None:
+                first_token_at = time.perf_counter()
+                tokens.append(cached_response)
+                yield _sse_event({"token": cached_response})
+            else:
+                history = model_context(context) if context else None
+                async for token in backend.astream(message, user, history):
+                    if first_token_at is None:
+                        first_token_at = time.perf_counter()
+                    tokens.append(token)
+                    yield _sse_event({"token": token})
+
+            bot_response = ''.join(tokens)
+            finished_at = time.perf_counter()
+            await _finish_chat_turn(user, bot_response, (finished_at - backend_started_at) * 1000, cache_key, cached_response, context)
+
+            ttfb_ms = ((first_token_at or finished_at) - started_at) * 1000
+            duration_ms = (finished_at - started_at) * 1000
+            logger.info("Stream de chatbot completado: ttfb=%.1fms duración=%.1fms tokens=%d", ttfb_ms, duration_ms, len(tokens))
+
+            yield _sse_event({
+                "message": bot_response,
+                "timestamp": datetime.now().isoformat(),
+                "type": "bot_response",
+                "user_id": user['user_id'],
+                "cached": cached_response is not None,
+                "ttfb_ms": round(ttfb_ms, 3),
+                "duration_ms": round(duration_ms, 3)
+            }, event='done')
+
+        except Exception as e:
+            logger.error(f"Error en stream del chatbot: {str(e)}")
+            yield _sse_event({"error": "Error en el chatbot"}, event='error')
+
+    return Response(
+        stream_with_context(generate)(),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+async def _socket_chat_message(socket, data):
+    """
+    Atiende un frame message del canal WebSocket (chat_socket.py): el mismo turno
+    que POST /chatbot, con la respuesta en frames token y un frame done final
+    (o solo el done si el frame trae "stream": false)
+    """
+    message_id = data.get('id')
+    message = data.get('message')
+    if not message or not isinstance(message, str):
+        await socket.send({"type": "error", "id": message_id, "code": "INVALID_MESSAGE", "error": "Mensaje requerido"})
+        return
+
+    user = socket.user
+    started_at = time.perf_counter()
+    first_token_at = None
+    try:
+        backend, context, cache_key, cached_response = await _start_chat_turn(data, message, user)
+        stream = data.get('stream', True) is not False
+        backend_started_at = time.perf_counter()
+
+        if cached_response is not None:
+            bot_response = cached_response
+            first_token_at = time.perf_counter()
+            if stream:
+                await socket.send({"type": "token", "id": message_id, "token": bot_response})
+        elif stream:
+            tokens = []
+            async for token in backend.astream(message, user, model_context(context) if context else None):
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                tokens.append(token)
+                await socket.send({"type": "token", "id": message_id, "token": token})
+            bot_response = ''.join(tokens)
+        else:
+            bot_response = await backend.acomplete(message, user, model_context(context) if context else None)
+
+        finished_at = time.perf_counter()
+        await _finish_chat_turn(user, bot_response, (finished_at - backend_started_at) * 1000, cache_key, cached_response, context)
+
+        await socket.send({
+            "type": "done",
+            "id": message_id,
+            "message": bot_response,
+            "timestamp": datetime.now().isoformat(),
+            "cached": cached_response is not None,
+            "ttfb_ms": round(((first_token_at or finished_at) - started_at) * 1000, 3),
+            "duration_ms": round((finished_at - started_at) * 1000, 3)
+        })
+
+    except ConnectionClosed:
+        raise
+    except Exception as e:
+        logger.error(f"Error en el chatbot (WebSocket): {str(e)}")
+        await socket.send({"type": "error", "id": message_id, "code": "CHAT_ERROR", "error": "Error en el chatbot"})
+
+@api.websocket('/chat/ws')
+async def chat_socket():
+    """Canal WebSocket del chatbot (protocolo en chat_socket.py) - REQUIERE AUTENTICACIÓN"""
+    log_config.bind_request_id(log_config.request_id_from(websocket.headers.get(log_config.REQUEST_ID_HEADER)))
+    await ChatSocket(websocket._get_current_object(), _socket_chat_message, current_app.json.dumps).run()
+
+@api.route('/chat/history', methods=['GET'])
+@require_auth
+async def get_chat_history():
+    """Endpoint para obtener el historial de chat del usuario (paginado por cursor)"""
+    db_service = services.async_db
+    try:
+        user = get_current_user()
+        limit = request.args.get('limit', 50, type=int)
+        cursor = request.args.get('cursor')
+        fields = chat_history_fields(request.args.get('fields'))
+
+        if not db_service:
+            return jsonify({"history": [], "total": 0, "next_cursor": None}), 200
+
+        # Respuesta 304 si el usuario no tiene mensajes nuevos desde la última consulta
+        etag, last_modified = await _validators(
+            db_service.get_chat_history_version(user['user_id']),
+            'history', user['user_id'], request.query_string
+        )
+        if etag and http_cache.is_not_modified(etag, last_modified, request):
+            return http_cache.not_modified_response(etag, last_modified, Response)
+
+        try:
+            page = await db_service.get_chat_history_page(user['user_id'], limit, cursor, fields)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        history = public_documents(page['messages'])
+        response = jsonify({
+            "history": history,
+            "total": len(history),
+            "next_cursor": page['next_cursor']
+        })
+        if etag:
+            http_cache.with_validators(response, etag, last_modified)
+        return response, 200
+
+    except Exception as e:
+        logger.error(f"Error obteniendo historial: {str(e)}")
+        return jsonify({"error": "Error obteniendo historial"}), 500
+
+def _export_response(name, export_format, cursor, columns):
+    """Respuesta en streaming de una exportación (descarga como fichero adjunto)"""
+    filename = f"{name}-{datetime.utcnow().strftime('%Y%m%d-%H%M%S')}.{export_format}"
+    dumps = current_app.json.dumps
+    return Response(
+        exports.astream_export(cursor, export_format, columns, dumps),
+        mimetype=exports.EXPORT_FORMATS[export_format],
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+def _export_params():
+    """Formato y rango de fechas [since, until) de una exportación; lanza ValueError"""
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in exports.EXPORT_FORMATS:
+        raise ValueError(f"Formato no soportado: {export_format} (ndjson o csv)")
+    return export_format, exports.parse_datetime(request.args.get('since')), exports.parse_datetime(request.args.get('until'))
+
+@api.route('/admin/export/chat-history', methods=['GET'])
+@require_admin
+async def export_chat_history():
+    """Exporta el historial de chat (NDJSON o CSV) en streaming - SOLO ADMIN"""
+    db_service = services.async_db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+
+        try:
+            export_format, since, until = _export_params()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        cursor = await db_service.export_chat_history(request.args.get('user_id'), since, until)
+        logger.info("Exportación de historial solicitada por: %s", get_current_user()['email'])
+        return _export_response('chat_history', export_format, cursor, exports.CHAT_HISTORY_COLUMNS)
+
+    except Exception as e:
+        logger.error(f"Error exportando historial: {str(e)}")
+        return jsonify({"error": "Error exportando historial"}), 500
+
+@api.route('/admin/export/submissions', methods=['GET'])
+@require_admin
+async def export_submissions():
+    """Exporta los formularios de contacto (NDJSON o CSV) en streaming - SOLO ADMIN"""
+    db_service = services.async_db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+
+        try:
+            export_format, since, until = _export_params()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        cursor = db_service.export_form_submissions(
+            email=request.args.get('email'),
+            service_type=request.args.get('service_type'),
+            since=since,
+            until=until
+        )
+        logger.info("Exportación de formularios solicitada por: %s", get_current_user()['email'])
+        return _export_response('submissions', export_format, cursor, exports.FORM_SUBMISSION_COLUMNS)
+
+    except Exception as e:
+        logger.error(f"Error exportando formularios: {str(e)}")
+        return jsonify({"error": "Error exportando formularios"}), 500
+
+@api.route('/admin/search/chat-history', methods=['GET'])
+@require_admin
+async def search_chat_history():
+    """Búsqueda de texto en el historial de chat, por relevancia y paginada - SOLO ADMIN"""
+    db_service = services.async_db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+
+        try:
+            since, until = exports.parse_datetime(request.args.get('since')), exports.parse_datetime(request.args.get('until'))
+            page = await db_service.search_chat_history(
+                request.args.get('q'),
+                user_id=request.args.get('user_id'),
+                since=since,
+                until=until,
+                limit=request.args.get('limit', 20, type=int),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(dict(page, results=public_documents(page['results'])))
+
+    except Exception as e:
+        logger.error(f"Error buscando en el historial: {str(e)}")
+        return jsonify({"error": "Error buscando en el historial"}), 500
+
+@api.route('/admin/search/submissions', methods=['GET'])
+@require_admin
+async def search_submissions():
+    """Búsqueda de texto en los formularios de contacto, por relevancia y paginada - SOLO ADMIN"""
+    db_service = services.async_db
+    try:
+        if not db_service:
+            return jsonify({"error": "Base de datos no disponible"}), 503
+
+        try:
+            since, until = exports.parse_datetime(request.args.get('since')), exports.parse_datetime(request.args.get('until'))
+            page = await db_service.search_form_submissions(
+                request.args.get('q'),
+                email=request.args.get('email'),
+                service_type=request.args.get('service_type'),
+                since=since,
+                until=until,
+                limit=request.args.get('limit', 20, type=int),
+                cursor=request.args.get('cursor')
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        return jsonify(dict(page, results=public_documents(page['results'])))
+
+    except Exception as e:
+        logger.error(f"Error buscando formularios: {str(e)}")
+        return jsonify({"error": "Error buscando formularios"}), 500
+
+def create_app(config_object=Config):
+    """
+    Crea la aplicación Quart. Como en app.py, los servicios se crean en la
+    primera request que los necesita, ya dentro del event loop del worker
+    """
+    app = Quart(__name__)
+
+    # Mismo codificador JSON que la app WSGI (ObjectId y datetime)
+    app.json = get_json_provider_class()(app)
+
+    app.config.from_object(config_object)
+    app = cors(app, allow_origin=config_object.FRONTEND_URL)
+
+    log_config.init_async_app(app)
+    metrics.init_async_app(app)
+    http_cache.init_async_app(app)
+
+    @app.after_serving
+    async def shutdown_services():
+        await services.ashutdown()
+
+    app.register_blueprint(api)
+    return app
+
+# Instancia para `hypercorn asgi_app:app`
+app = create_app()
@@ -0,0 +1,139 @@
+"""
+Decoradores de autenticación para la app ASGI (asgi_app.py). Equivalen a los
+de auth_middleware.py, pero resuelven el usuario con AsyncMongoDBService y
+guardan el contexto en el `g` de Quart.
+"""
+from functools import wraps
+from quart import g, jsonify, request
+from auth_service import AuthService
+from auth_middleware import auth_error, build_principal, cached_principal, is_admin, parse_bearer_token
+from async_mongodb_service import get_async_db_service
+from auth_cache import hash_token, principal_cache
+from token_denylist import token_denylist
+from metrics import timed
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def check_revoked(token_key, current_user):
+    """
+    Versión asíncrona de auth_middleware.check_revoked: si el filtro de la
+    lista de revocación da positivo, se confirma en MongoDB sin bloquear el
+    event loop. Devuelve 'TOKEN_REVOKED', 'REVOCATION_UNAVAILABLE' o None
+    """
+    try:
+        revoked = await token_denylist.ais_revoked(current_user['token_id'])
+    except Exception as e:
+        logger.error(f"Error comprobando la revocación del token: {str(e)}")
+        return 'REVOCATION_UNAVAILABLE'
+    if revoked:
+        principal_cache.evict_token(token_key)
+        return 'TOKEN_REVOKED'
+    return None
+
+@timed('auth.resolve_principal')
+async def _resolve_principal(token):
+    """
+    Resuelve el usuario asociado a un token (caché en memoria, JWT y MongoDB).
+    Devuelve (current_user, error_code)
+    """
+    token_key = hash_token(token)
+    g.auth_token_key = token_key
+
+    current_user = cached_principal(token_key)
+    if current_user is None:
+        payload = AuthService.verify_jwt_token(token)
+        if not payload:
+            return None, 'INVALID_TOKEN'
+
+        user = await get_async_db_service().get_user_by_google_id(payload['user_id'])
+        if not user:
+            return None, 'USER_NOT_FOUND'
+
+        current_user = build_principal(token_key, payload, user)
+
+    error_code = await check_revoked(token_key, current_user)
+    if error_code:
+        return None, error_code
+
+    return current_user, None
+
+def require_auth(f):
+    """
+    Decorador que requiere autenticación para acceder a una ruta
+    """
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        try:
+            token, error_code = parse_bearer_token(request.headers.get('Authorization'))
+            if not error_code:
+                current_user, error_code = await _resolve_principal(token)
+
+            if error_code:
+                body, status = auth_error(error_code)
+                return jsonify(body), status
+
+            g.current_user = current_user
+            logger.debug("Usuario autenticado: %s", current_user['email'])
+
+        except Exception as e:
+            logger.error(f"Error en middleware de autenticación: {str(e)}")
+            body, status = auth_error('AUTH_ERROR')
+            return jsonify(body), status
+
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+def require_admin(f):
+    """
+    Decorador para rutas de administración (email en ADMIN_EMAILS)
+    """
+    @wraps(f)
+    @require_auth
+    async def decorated_function(*args, **kwargs):
+        if not is_admin(get_current_user()):
+            body, status = auth_error('FORBIDDEN')
+            return jsonify(body), status
+
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+def optional_auth(f):
+    """
+    Decorador que permite autenticación opcional
+    """
+    @wraps(f)
+    async def decorated_function(*args, **kwargs):
+        token, error_code = parse_bearer_token(request.headers.get('Authorization'))
+        if token:
+            try:
+                current_user, error_code = await _resolve_principal(token)
+                if current_user:
+                    g.current_user = current_user
+            except Exception:
+                # Si hay error en el token opcional, simplemente continuar sin autenticación
+                pass
+
+        return await f(*args, **kwargs)
+
+    return decorated_function
+
+def get_current_user():
+    """
+    Usuario autenticado de la request actual, o None
+    """
+    return g.get('current_user')
+
+async def get_current_session():
+    """
+    Sesión actual (se consulta en MongoDB solo cuando una ruta la necesita)
+    """
+    if 'current_session' not in g:
+        user = get_current_user()
+        token_key = g.get('auth_token_key')
+        g.current_session = None
+        if user and token_key:
+            g.current_session = await get_async_db_service().get_active_session(user['user_id'], token_key)
+    return g.current_session
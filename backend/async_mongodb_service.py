@@ -0,0 +1,428 @@
+from pymongo import AsyncMongoClient, ReturnDocument
+from config import Config
+from auth_cache import principal_cache
+from mongodb_service import (
+    BUCKET_READ_BATCH_SIZE, NEWEST_FIRST, BucketPage, PoolStatsListener, decode_page_cursor,
+    _active_session_query, _before_position, _bucket_append, _bucket_export_pipeline,
+    _bucket_history_query, _bucket_search_pipeline, _bucket_version, _chat_document, _chat_export_query,
+    _chat_history_query, _chat_search_pipeline, _next_page_cursor, _search_page, _search_params,
+    _session_document, _submission_export_query, _submission_filters, _submission_search_pipeline,
+    _user_upsert, _utcnow_millis
+)
+from metrics import timed
+from bson import ObjectId
+from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AsyncMongoDBService:
+    """
+    Versión asíncrona de MongoDBService para la app ASGI (asgi_app.py), sobre
+    el driver asíncrono de PyMongo (AsyncMongoClient): cada operación es una
+    corrutina y mientras espera a MongoDB el event loop atiende otras requests.
+    Cubre las operaciones de las rutas; los índices (manage.py), la cola de
+    trabajos y la sincronización de la lista de revocación siguen usando
+    MongoDBService en sus hilos.
+    Las consultas se construyen con los mismos helpers que MongoDBService.
+    """
+
+    def __init__(self):
+        self.pool_stats = PoolStatsListener()
+        # El cliente no conecta hasta la primera operación (dentro del event loop)
+        self.client = AsyncMongoClient(
+            Config.MONGODB_URI,
+            maxPoolSize=Config.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=Config.MONGODB_MIN_POOL_SIZE,
+            waitQueueTimeoutMS=Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            serverSelectionTimeoutMS=Config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            event_listeners=[self.pool_stats]
+        )
+        self.db = self.client.aiwrapper
+
+        # Colecciones
+        self.users = self.db.users
+        self.sessions = self.db.sessions
+        self.chat_history = self.db.chat_history
+        self.chat_buckets = self.db.chat_buckets
+        self.form_submissions = self.db.form_submissions
+        self.response_cache = self.db.response_cache
+        self.revoked_tokens = self.db.revoked_tokens
+
+        # Sin escritor diferido: insert_one no bloquea el worker mientras espera
+        self.chat_writer = None
+        self.bucketed = Config.CHAT_HISTORY_LAYOUT == 'buckets'
+
+        logger.info("Cliente asíncrono de MongoDB creado")
+
+    async def ping(self):
+        """
+        Comprueba que el servidor responde
+        """
+        try:
+            await self.client.admin.command('ping')
+            return True
+        except Exception as e:
+            logger.warning(f"MongoDB no responde: {str(e)}")
+            return False
+
+    def get_pool_stats(self):
+        """
+        Devuelve las estadísticas del pool de conexiones
+        """
+        stats = self.pool_stats.snapshot()
+        stats['max_pool_size'] = Config.MONGODB_MAX_POOL_SIZE
+        stats['min_pool_size'] = Config.MONGODB_MIN_POOL_SIZE
+        return stats
+
+    async def close(self):
+        """
+        Cierra el cliente y libera las conexiones del pool
+        """
+        await self.client.close()
+
+    @timed('mongo.create_or_update_user')
+    async def create_or_update_user(self, user_info):
+        """
+        Crea un nuevo usuario o actualiza uno existente y lo devuelve, en una sola
+        operación atómica (ver MongoDBService.create_or_update_user)
+        """
+        try:
+            now = _utcnow_millis()
+            query, pipeline = _user_upsert(user_info, now)
+            user = await self.users.find_one_and_update(
+                query,
+                pipeline,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+
+            if user['created_at'] == now:
+                logger.info("Nuevo usuario creado: %s", user_info['email'])
+
+            return user
+
+        except Exception as e:
+            logger.error(f"Error creando/actualizando usuario: {str(e)}")
+            return None
+
+    @timed('mongo.get_user_by_google_id')
+    async def get_user_by_google_id(self, google_id):
+        """
+        Obtiene un usuario por su Google ID
+        """
+        try:
+            return await self.users.find_one({'google_id': google_id})
+
+        except Exception as e:
+            logger.error(f"Error obteniendo usuario: {str(e)}")
+            return None
+
+    @timed('mongo.create_session')
+    async def create_session(self, user_id, token_hash):
+        """
+        Crea una nueva sesión para el usuario (se guarda el hash del token, no el token)
+        """
+        try:
+            result = await self.sessions.insert_one(_session_document(user_id, token_hash))
+            logger.info("Sesión creada para usuario: %s", user_id)
+
+            return str(result.inserted_id)
+
+        except Exception as e:
+            logger.error(f"Error creando sesión: {str(e)}")
+            return None
+
+    @timed('mongo.get_active_session')
+    async def get_active_session(self, user_id, token_hash):
+        """
+        Obtiene la sesión activa asociada a un token (por su hash)
+        """
+        try:
+            return await self.sessions.find_one(_active_session_query(user_id, token_hash))
+
+        except Exception as e:
+            logger.error(f"Error obteniendo sesión activa: {str(e)}")
+            return None
+
+    @timed('mongo.invalidate_session')
+    async def invalidate_session(self, session_id):
+        """
+        Invalida una sesión específica
+        """
+        try:
+            session = await self.sessions.find_one_and_update(
+                {'_id': session_id, 'is_active': True},
+                {'$set': {'is_active': False, 'invalidated_at': datetime.utcnow()}},
+                projection={'token_hash': 1}
+            )
+
+            # Evitar que la caché de autenticación siga sirviendo el token de la sesión
+            if session and session.get('token_hash'):
+                principal_cache.evict_token(session['token_hash'])
+
+            return session is not None
+
+        except Exception as e:
+            logger.error(f"Error invalidando sesión: {str(e)}")
+            return False
+
+    @timed('mongo.is_token_revoked')
+    async def is_token_revoked(self, jti):
+        """
+        Comprueba en la base de datos si un jti está revocado. Los errores se
+        propagan (ver MongoDBService.is_token_revoked)
+        """
+        return await self.revoked_tokens.find_one({'jti': jti}, {'_id': 1}) is not None
+
+    @timed('mongo.save_chat_message')
+    async def save_chat_message(self, user_id, message, message_type='user', metadata=None):
+        """
+        Guarda un mensaje del chat en el historial
+        """
+        try:
+            chat_data = _chat_document(user_id, message, message_type, metadata)
+
+            if self.bucketed:
+                chat_data['_id'] = ObjectId()
+                query, update, sort = _bucket_append(chat_data)
+                await self.chat_buckets.find_one_and_update(query, update, sort=sort, upsert=True, projection={'_id': 1})
+                return str(chat_data['_id'])
+
+            result = await self.chat_history.insert_one(chat_data)
+            return str(result.inserted_id)
+
+        except Exception as e:
+            logger.error(f"Error guardando mensaje de chat: {str(e)}")
+            return None
+
+    @timed('mongo.get_chat_history_page')
+    async def get_chat_history_page(self, user_id, limit=50, cursor=None, fields=None):
+        """
+        Obtiene una página del historial de chat (orden cronológico) paginando
+        por cursor sobre (timestamp, _id). Lanza ValueError si el cursor no es válido.
+        """
+        limit = max(1, min(limit, Config.CHAT_HISTORY_MAX_PAGE_SIZE))
+        position = decode_page_cursor(cursor) if cursor else None
+
+        try:
+            if self.bucketed:
+                page = BucketPage(user_id, limit, position, fields)
+                buckets = self.chat_buckets.find(_bucket_history_query(user_id, position)).sort('end', -1).batch_size(BUCKET_READ_BATCH_SIZE)
+                try:
+                    async for bucket in buckets:
+                        if not page.add(bucket):
+                            break
+                finally:
+                    await buckets.close()
+                return page.result()
+
+            query, projection = _chat_history_query(user_id, position, fields)
+
+            # Se pide un documento de más para saber si hay páginas anteriores
+            messages = await self.chat_history.find(query, projection).sort(NEWEST_FIRST).limit(limit + 1).to_list(None)
+
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+
+            # Invertir para mostrar en orden cronológico
+            return {
+                'messages': list(reversed(messages)),
+                'next_cursor': _next_page_cursor(messages, has_more)
+            }
+
+        except Exception as e:
+            logger.error(f"Error obteniendo historial de chat: {str(e)}")
+            return {'messages': [], 'next_cursor': None}
+
+    @timed('mongo.get_chat_history_version')
+    async def get_chat_history_version(self, user_id):
+        """
+        Devuelve el último mensaje del usuario ({'_id', 'timestamp'}) como versión
+        del historial (con buckets, el bucket más reciente y su número de mensajes)
+        """
+        if self.bucketed:
+            return _bucket_version(await self.chat_buckets.find_one({'user_id': user_id}, {'end': 1, 'count': 1}, sort=[('end', -1)]))
+        return await self.chat_history.find_one({'user_id': user_id}, {'timestamp': 1}, sort=NEWEST_FIRST)
+
+    async def export_chat_history(self, user_id=None, since=None, until=None, batch_size=None):
+        """
+        Devuelve un cursor asíncrono sobre el historial en orden cronológico para
+        exportarlo en streaming (mismos índices que MongoDBService.export_chat_history)
+        """
+        if self.bucketed:
+            return await self.chat_buckets.aggregate(
+                _bucket_export_pipeline(user_id, since, until),
+                batchSize=batch_size or Config.EXPORT_BATCH_SIZE
+            )
+
+        query, sort = _chat_export_query(user_id, since, until)
+        return self.chat_history.find(query).sort(sort).batch_size(batch_size or Config.EXPORT_BATCH_SIZE)
+
+    @timed('mongo.search_chat_history')
+    async def search_chat_history(self, search, user_id=None, since=None, until=None, limit=20, cursor=None):
+        """
+        Busca mensajes del historial por texto (ver MongoDBService.search_chat_history).
+        Lanza ValueError si la búsqueda o el cursor no son válidos; los errores
+        de MongoDB se propagan
+        """
+        search, limit, position = _search_params(search, limit, cursor)
+
+        if self.bucketed:
+            results = await self.chat_buckets.aggregate(_bucket_search_pipeline(search, user_id, since, until, position, limit))
+        else:
+            results = await self.chat_history.aggregate(_chat_search_pipeline(search, user_id, since, until, position, limit))
+        return _search_page(await results.to_list(None), limit)
+
+    @timed('mongo.get_cached_response')
+    async def get_cached_response(self, key):
+        """
+        Obtiene una respuesta del chatbot cacheada (si no ha expirado)
+        """
+        try:
+            return await self.response_cache.find_one(
+                {'key': key, 'expires_at': {'$gt': datetime.utcnow()}},
+                {'_id': 0, 'response': 1, 'backend_ms': 1, 'expires_at': 1}
+            )
+
+        except Exception as e:
+            logger.error(f"Error obteniendo respuesta cacheada: {str(e)}")
+            return None
+
+    @timed('mongo.save_cached_response')
+    async def save_cached_response(self, key, response, backend_ms, expires_at):
+        """
+        Guarda (o reemplaza) una respuesta del chatbot en la caché compartida
+        """
+        try:
+            await self.response_cache.update_one(
+                {'key': key},
+                {'$set': {
+                    'response': response,
+                    'backend_ms': backend_ms,
+                    'created_at': datetime.utcnow(),
+                    'expires_at': expires_at
+                }},
+                upsert=True
+            )
+            return True
+
+        except Exception as e:
+            logger.error(f"Error guardando respuesta cacheada: {str(e)}")
+            return False
+
+    @timed('mongo.save_form_submission')
+    async def save_form_submission(self, submission):
+        """
+        Guarda un formulario de contacto y devuelve su id
+        """
+        try:
+            submission_data = dict(submission)
+            submission_data['timestamp'] = datetime.utcnow()
+
+            result = await self.form_submissions.insert_one(submission_data)
+            return str(result.inserted_id)
+
+        except Exception as e:
+            logger.error(f"Error guardando formulario: {str(e)}")
+            return None
+
+    @timed('mongo.get_form_submissions_page')
+    async def get_form_submissions_page(self, limit=50, cursor=None, email=None, service_type=None):
+        """
+        Obtiene una página de formularios (más recientes primero), con filtros
+        opcionales por email y tipo de servicio. Lanza ValueError si el cursor
+        no es válido.
+        """
+        limit = max(1, min(limit, Config.FORM_SUBMISSIONS_MAX_PAGE_SIZE))
+        position = decode_page_cursor(cursor) if cursor else None
+
+        try:
+            filters = _submission_filters(email, service_type)
+            query = dict(filters)
+            if position:
+                query['$or'] = _before_position(*position)
+
+            submissions = await self.form_submissions.find(query, {'notified_at': 0}).sort(NEWEST_FIRST).limit(limit + 1).to_list(None)
+
+            has_more = len(submissions) > limit
+            submissions = submissions[:limit]
+
+            # Sin filtros, el total sale de los metadatos de la colección
+            if filters:
+                total = await self.form_submissions.count_documents(filters)
+            else:
+                total = await self.form_submissions.estimated_document_count()
+
+            return {
+                'submissions': submissions,
+                'next_cursor': _next_page_cursor(submissions, has_more),
+                'total': total
+            }
+
+        except Exception as e:
+            logger.error(f"Error obteniendo formularios: {str(e)}")
+            return {'submissions': [], 'next_cursor': None, 'total': 0}
+
+    def export_form_submissions(self, email=None, service_type=None, since=None, until=None, batch_size=None):
+        """
+        Devuelve un cursor asíncrono sobre los formularios en orden cronológico
+        """
+        query = _submission_export_query(email, service_type, since, until)
+        return self.form_submissions.find(query, {'notified_at': 0}).sort(
+            [('timestamp', 1), ('_id', 1)]
+        ).batch_size(batch_size or Config.EXPORT_BATCH_SIZE)
+
+    @timed('mongo.search_form_submissions')
+    async def search_form_submissions(self, search, email=None, service_type=None, since=None, until=None, limit=20, cursor=None):
+        """
+        Busca formularios por texto (nombre, empresa y mensaje), ordenados por
+        relevancia. Lanza ValueError si la búsqueda o el cursor no son válidos;
+        los errores de MongoDB se propagan
+        """
+        search, limit, position = _search_params(search, limit, cursor)
+
+        pipeline = _submission_search_pipeline(search, email, service_type, since, until, position, limit)
+        results = await self.form_submissions.aggregate(pipeline)
+        return _search_page(await results.to_list(None), limit)
+
+    @timed('mongo.get_form_submissions_version')
+    async def get_form_submissions_version(self, email=None, service_type=None):
+        """
+        Devuelve el formulario más reciente ({'_id', 'timestamp'}) que cumple los filtros
+        """
+        return await self.form_submissions.find_one(
+            _submission_filters(email, service_type),
+            {'timestamp': 1},
+            sort=NEWEST_FIRST
+        )
+
+
+# Instancia compartida por el proceso (se crea dentro del event loop del worker)
+_async_db_service = None
+
+def get_async_db_service():
+    """
+    Devuelve el AsyncMongoDBService compartido del proceso, creándolo la primera
+    vez. Solo se usa desde el event loop, así que no necesita lock
+    """
+    global _async_db_service
+    if _async_db_service is None:
+        _async_db_service = AsyncMongoDBService()
+    return _async_db_service
+
+def reset_async_db_service():
+    """
+    Descarta el cliente heredado tras fork() sin cerrarlo (ver reset_db_service)
+    """
+    global _async_db_service
+    _async_db_service = None
+
+async def close_async_db_service():
+    """
+    Cierra el AsyncMongoDBService compartido
+    """
+    global _async_db_service
+    if _async_db_service is not None:
+        await _async_db_service.close()
+        _async_db_service = None
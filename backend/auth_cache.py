@@ -0,0 +1,109 @@
+from collections import OrderedDict
+from config import Config
+import hashlib
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+def hash_token(token):
+    """
+    Devuelve el hash SHA-256 de un token (nunca se guarda el token en claro)
+    """
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+class PrincipalCache:
+    """
+    Caché LRU con TTL que asocia el hash de un JWT con el usuario ya resuelto,
+    para evitar el decode y las consultas a MongoDB en cada request
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size if max_size is not None else Config.AUTH_CACHE_MAX_SIZE
+        self.ttl = ttl if ttl is not None else Config.AUTH_CACHE_TTL
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, token_key):
+        """
+        Devuelve el current_user en caché o None si no hay entrada válida
+        """
+        with self._lock:
+            entry = self._entries.get(token_key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, current_user = entry
+            if expires_at <= time.time():
+                self._remove(token_key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token_key)
+            self.hits += 1
+            return current_user
+
+    def set(self, token_key, current_user, token_exp=None):
+        """
+        Guarda el usuario resuelto; la entrada nunca vive más que el token
+        """
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, float(token_exp))
+
+        with self._lock:
+            if token_key in self._entries:
+                self._remove(token_key)
+
+            self._entries[token_key] = (expires_at, current_user)
+
+            while len(self._entries) > self.max_size:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+                self.evictions += 1
+
+    def evict_token(self, token_key):
+        """
+        Elimina la entrada asociada a un token (p. ej. en /auth/logout)
+        """
+        with self._lock:
+            if self._remove(token_key):
+                self.invalidations += 1
+                return True
+            return False
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remove(self, token_key):
+        return self._entries.pop(token_key, None) is not None
+
+    def stats(self):
+        """
+        Devuelve los contadores de la caché
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0
+            }
+
+# Caché compartida por todo el proceso
+principal_cache = PrincipalCache()
@@ -1,11 +1,125 @@
 from functools import wraps
 from flask import request, jsonify, g
 from auth_service import AuthService
-from mongodb_service import MongoDBService
+from config import Config
+from mongodb_service import get_db_service
+from auth_cache import principal_cache, hash_token
+from token_denylist import token_denylist
+from metrics import timed
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Errores de autenticación por código: (mensaje, status HTTP)
+AUTH_ERRORS = {
+    'MISSING_TOKEN': ('Token de autorización requerido', 401),
+    'INVALID_TOKEN_FORMAT': ('Formato de autorización inválido. Use: Bearer <token>', 401),
+    'INVALID_TOKEN': ('Token inválido o expirado', 401),
+    'TOKEN_REVOKED': ('Token revocado', 401),
+    'REVOCATION_UNAVAILABLE': ('No se puede comprobar la revocación del token', 503),
+    'USER_NOT_FOUND': ('Usuario no encontrado', 401),
+    'FORBIDDEN': ('Acceso restringido a administradores', 403),
+    'AUTH_ERROR': ('Error interno de autenticación', 500)
+}
+
+def auth_error(code):
+    """
+    Cuerpo y status de la respuesta de error para un código de AUTH_ERRORS
+    """
+    message, status = AUTH_ERRORS[code]
+    return {'error': message, 'code': code}, status
+
+def parse_bearer_token(auth_header):
+    """
+    Extrae el token del header Authorization (Bearer <token>).
+    Devuelve (token, error_code)
+    """
+    if not auth_header:
+        return None, 'MISSING_TOKEN'
+    try:
+        token_type, token = auth_header.split(' ')
+        if token_type.lower() != 'bearer':
+            raise ValueError("Tipo de token inválido")
+    except ValueError:
+        return None, 'INVALID_TOKEN_FORMAT'
+    return token, None
+
+def is_admin(user):
+    """
+    Indica si el email del usuario está en ADMIN_EMAILS
+    """
+    return user['email'].lower() in Config.ADMIN_EMAILS
+
+def cached_principal(token_key):
+    """
+    Copia del usuario en la caché de autenticación para el hash de un token, o None
+    """
+    cached = principal_cache.get(token_key)
+    return dict(cached) if cached else None
+
+def build_principal(token_key, payload, user):
+    """
+    Construye el current_user a partir del JWT y del usuario de MongoDB y lo
+    guarda en la caché de autenticación (nunca más allá de la expiración del token)
+    """
+    current_user = {
+        'user_id': payload['user_id'],
+        'email': payload['email'],
+        'name': payload['name'],
+        'user_data': user,
+        'token_id': payload.get('jti'),
+        'token_expires': payload.get('exp')
+    }
+    principal_cache.set(token_key, current_user, payload.get('exp'))
+    return dict(current_user)
+
+def check_revoked(token_key, current_user):
+    """
+    Comprueba la revocación (logout) contra la lista local de jtis revocados,
+    sin ir a la base de datos salvo para confirmar un positivo. Devuelve
+    'TOKEN_REVOKED', 'REVOCATION_UNAVAILABLE' si no se pudo confirmar (el token
+    no se acepta) o None
+    """
+    try:
+        revoked = token_denylist.is_revoked(current_user['token_id'])
+    except Exception as e:
+        logger.error(f"Error comprobando la revocación del token: {str(e)}")
+        return 'REVOCATION_UNAVAILABLE'
+    if revoked:
+        principal_cache.evict_token(token_key)
+        return 'TOKEN_REVOKED'
+    return None
+
+@timed('auth.resolve_principal')
+def _resolve_principal(token):
+    """
+    Resuelve el usuario asociado a un token, usando la caché en memoria antes
+    de decodificar el JWT y consultar MongoDB. La revocación (logout) se
+    comprueba contra la lista local de jtis revocados, sin ir a la base de datos.
+    Devuelve (current_user, error_code)
+    """
+    token_key = hash_token(token)
+    g.auth_token_key = token_key
+    
+    current_user = cached_principal(token_key)
+    if current_user is None:
+        payload = AuthService.verify_jwt_token(token)
+        if not payload:
+            return None, 'INVALID_TOKEN'
+        
+        db_service = get_db_service()
+        user = db_service.get_user_by_google_id(payload['user_id'])
+        if not user:
+            return None, 'USER_NOT_FOUND'
+        
+        current_user = build_principal(token_key, payload, user)
+    
+    error_code = check_revoked(token_key, current_user)
+    if error_code:
+        return None, error_code
+    
+    return current_user, None
+
 def require_auth(f):
     """
     Decorador que requiere autenticación para acceder a una ruta
@@ -13,67 +127,44 @@ def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
-            # Obtener el token del header Authorization
-            auth_header = request.headers.get('Authorization')
-            
-            if not auth_header:
-                return jsonify({
-                    'error': 'Token de autorización requerido',
-                    'code': 'MISSING_TOKEN'
-                }), 401
-            
-            # Verificar formato del header (Bearer <token>)
-            try:
-                token_type, token = auth_header.split(' ')
-                if token_type.lower() != 'bearer':
-                    raise ValueError("Tipo de token inválido")
-            except ValueError:
-                return jsonify({
-                    'error': 'Formato de autorización inválido. Use: Bearer <token>',
-                    'code': 'INVALID_TOKEN_FORMAT'
-                }), 401
+            # Obtener el token del header Authorization (Bearer <token>)
+            token, error_code = parse_bearer_token(request.headers.get('Authorization'))
             
-            # Verificar el JWT token
-            payload = AuthService.verify_jwt_token(token)
-            if not payload:
-                return jsonify({
-                    'error': 'Token inválido o expirado',
-                    'code': 'INVALID_TOKEN'
-                }), 401
+            # Verificar el JWT token y el usuario (con caché en memoria)
+            if not error_code:
+                current_user, error_code = _resolve_principal(token)
             
-            # Verificar que el usuario existe en la base de datos
-            db_service = MongoDBService()
-            user = db_service.get_user_by_google_id(payload['user_id'])
-            
-            if not user:
-                return jsonify({
-                    'error': 'Usuario no encontrado',
-                    'code': 'USER_NOT_FOUND'
-                }), 401
+            if error_code:
+                body, status = auth_error(error_code)
+                return jsonify(body), status
             
             # Agregar información del usuario al contexto de la request
-            g.current_user = {
-                'user_id': payload['user_id'],
-                'email': payload['email'],
-                'name': payload['name'],
-                'user_data': user
-            }
-            
-            # Verificar si hay una sesión activa
-            session = db_service.get_active_session(payload['user_id'])
-            if session:
-                g.current_session = session
+            g.current_user = current_user
             
-            logger.info(f"Usuario autenticado: {payload['email']}")
+            logger.debug("Usuario autenticado: %s", current_user['email'])
             
             return f(*args, **kwargs)
             
         except Exception as e:
             logger.error(f"Error en middleware de autenticación: {str(e)}")
-            return jsonify({
-                'error': 'Error interno de autenticación',
-                'code': 'AUTH_ERROR'
-            }), 500
+            body, status = auth_error('AUTH_ERROR')
+            return jsonify(body), status
+    
+    return decorated_function
+
+def require_admin(f):
+    """
+    Decorador para rutas de administración: requiere autenticación y que el
+    email del usuario esté en ADMIN_EMAILS
+    """
+    @wraps(f)
+    @require_auth
+    def decorated_function(*args, **kwargs):
+        if not is_admin(get_current_user()):
+            body, status = auth_error('FORBIDDEN')
+            return jsonify(body), status
+        
+        return f(*args, **kwargs)
     
     return decorated_function
 
@@ -85,29 +176,14 @@ def optional_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         try:
-            auth_header = request.headers.get('Authorization')
+            token, error_code = parse_bearer_token(request.headers.get('Authorization'))
             
-            if auth_header:
+            if token:
                 try:
-                    token_type, token = auth_header.split(' ')
-                    if token_type.lower() == 'bearer':
-                        payload = AuthService.verify_jwt_token(token)
-                        
-                        if payload:
-                            db_service = MongoDBService()
-                            user = db_service.get_user_by_google_id(payload['user_id'])
-                            
-                            if user:
-                                g.current_user = {
-                                    'user_id': payload['user_id'],
-                                    'email': payload['email'],
-                                    'name': payload['name'],
-                                    'user_data': user
-                                }
-                                
-                                session = db_service.get_active_session(payload['user_id'])
-                                if session:
-                                    g.current_session = session
+                    current_user, error_code = _resolve_principal(token)
+                    
+                    if current_user:
+                        g.current_user = current_user
                 except:
                     # Si hay error en el token opcional, simplemente continuar sin autenticación
                     pass
@@ -128,9 +204,16 @@ def get_current_user():
 
 def get_current_session():
     """
-    Función helper para obtener la sesión actual desde el contexto
+    Función helper para obtener la sesión actual desde el contexto.
+    La sesión se consulta en MongoDB solo cuando una ruta la necesita
     """
-    return getattr(g, 'current_session', None)
+    if not hasattr(g, 'current_session'):
+        user = get_current_user()
+        token_key = getattr(g, 'auth_token_key', None)
+        g.current_session = None
+        if user and token_key:
+            g.current_session = get_db_service().get_active_session(user['user_id'], token_key)
+    return g.current_session
 
 def is_authenticated():
     """
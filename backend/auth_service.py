@@ -1,30 +1,41 @@
 import jwt
-import requests
+import uuid
 from datetime import datetime, timedelta
-from google.auth.transport import requests as google_requests
-from google.oauth2 import id_token
 from flask import current_app
 from config import Config
+from google_certs import google_cert_cache
+from metrics import timed
 import logging
 
 logger = logging.getLogger(__name__)
 
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
 class AuthService:
     """Servicio para manejar autenticación con Google OAuth y JWT"""
     
     @staticmethod
+    @timed('auth.verify_google_token')
     def verify_google_token(token):
         """
         Verifica el token de Google OAuth y extrae la información del usuario
         """
         try:
-            # Verificar el token con Google
-            idinfo = id_token.verify_oauth2_token(
+            # google-auth se importa en el primer login y no al arrancar el worker
+            from google.auth import jwt as google_jwt
+            
+            # Verificar la firma con los certificados de Google en caché
+            key_id = jwt.get_unverified_header(token).get('kid')
+            certs = google_cert_cache.get_certs(key_id)
+            idinfo = google_jwt.decode(
                 token, 
-                google_requests.Request(), 
-                Config.GOOGLE_CLIENT_ID
+                certs=certs, 
+                audience=Config.GOOGLE_CLIENT_ID
             )
             
+            if idinfo.get('iss') not in GOOGLE_ISSUERS:
+                raise ValueError('Token inválido: emisor incorrecto')
+            
             # Verificar que el token sea para nuestra aplicación
             if idinfo['aud'] != Config.GOOGLE_CLIENT_ID:
                 raise ValueError('Token inválido: audiencia incorrecta')
@@ -38,7 +49,7 @@ class AuthService:
                 'email_verified': idinfo.get('email_verified', False)
             }
             
-            logger.info(f"Usuario autenticado: {user_info['email']}")
+            logger.debug("Token de Google verificado: %s", user_info['email'])
             return user_info
             
         except ValueError as e:
@@ -49,6 +60,7 @@ class AuthService:
             return None
     
     @staticmethod
+    @timed('auth.generate_jwt_token')
     def generate_jwt_token(user_info):
         """
         Genera un JWT token para el usuario autenticado
@@ -59,7 +71,8 @@ class AuthService:
                 'email': user_info['email'],
                 'name': user_info['name'],
                 'exp': datetime.utcnow() + timedelta(seconds=Config.JWT_ACCESS_TOKEN_EXPIRES),
-                'iat': datetime.utcnow()
+                'iat': datetime.utcnow(),
+                'jti': uuid.uuid4().hex
             }
             
             token = jwt.encode(
@@ -75,6 +88,7 @@ class AuthService:
             return None
     
     @staticmethod
+    @timed('auth.verify_jwt_token')
     def verify_jwt_token(token):
         """
         Verifica y decodifica un JWT token
@@ -98,6 +112,7 @@ class AuthService:
             return None
     
     @staticmethod
+    @timed('auth.refresh_token')
     def refresh_token(old_token):
         """
         Refresca un JWT token si está próximo a expirar
@@ -0,0 +1,135 @@
+"""
+Benchmark de capacidad de conversaciones concurrentes: la app WSGI (Gunicorn,
+1 worker con N hilos) frente a la app ASGI (Hypercorn, 1 worker con un event
+loop) con un backend de modelo lento (CHAT_ECHO_TOKEN_DELAY por token).
+
+Para cada nivel de concurrencia se lanzan a la vez ese número de POST /chatbot,
+cada uno en su propia conexión, y se mide cuánto tarda cada conversación. Con
+la app WSGI las conversaciones que no caben en los hilos esperan en cola; con
+la ASGI todas avanzan a la vez.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_async --concurrency 8,64,256 --token-delay 0.02
+    python -m benchmarks.bench_async --mongodb-uri mongodb://localhost:27017/aiwrapper
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.bench_scaling import free_port, stop_gunicorn
+from benchmarks.fakes import FakeGoogleIssuer
+from benchmarks.load_test import CLIENT_ID, login_users, percentile
+
+def start_server(mode, threads, env):
+    """
+    Arranca la app WSGI con Gunicorn o la ASGI con Hypercorn (1 worker) y espera a que responda
+    """
+    import requests
+
+    port = free_port()
+    bind = f"127.0.0.1:{port}"
+    if mode == 'wsgi':
+        app_spec = 'app:app' if 'MONGODB_URI' in env else 'benchmarks.mongomock_app:app'
+        command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', app_spec]
+        env = dict(env, GUNICORN_WORKERS='1', GUNICORN_THREADS=str(threads), GUNICORN_BIND=bind)
+    else:
+        app_spec = 'asgi_app:app' if 'MONGODB_URI' in env else 'benchmarks.mongomock_asgi_app:app'
+        command = [sys.executable, '-m', 'hypercorn', '--bind', bind, '--workers', '1', app_spec]
+
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://{bind}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/metrics", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit(f"El servidor {mode} no arrancó en 30 segundos")
+
+async def post_chat(base_url, token, message, timeout):
+    """
+    POST /chatbot en una conexión nueva (Connection: close). Devuelve (status, segundos)
+    """
+    url = urlsplit(base_url)
+    body = json.dumps({'message': message, 'cache': False}).encode('utf-8')
+    head = (
+        f"POST /chatbot HTTP/1.1\r\nHost: {url.netloc}\r\n"
+        f"Authorization: Bearer {token}\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    ).encode('ascii')
+
+    started_at = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(url.hostname, url.port), timeout)
+        writer.write(head + body)
+        await writer.drain()
+        response = await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        status = int(response.split(b' ', 2)[1]) if response else 0
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        status = 0
+    return status, time.perf_counter() - started_at
+
+async def run_burst(base_url, tokens, concurrency, timeout):
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*(
+        post_chat(base_url, tokens[i % len(tokens)], f"Consulta {i} sobre precios", timeout)
+        for i in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started_at
+    samples = sorted(duration for status, duration in results if status == 200)
+    return {
+        'errors': sum(1 for status, _ in results if status != 200),
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'max_ms': (samples[-1] * 1000) if samples else 0.0,
+        'chats_per_second': len(samples) / elapsed if elapsed else 0.0
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='wsgi,asgi')
+    parser.add_argument('--concurrency', default='8,64,256', help='conversaciones simultáneas, separadas por comas')
+    parser.add_argument('--threads', type=int, default=8, help='hilos del worker WSGI')
+    parser.add_argument('--token-delay', type=float, default=0.02, help='segundos por token del backend de modelo')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--mongodb-uri', help='MongoDB real en lugar del sustituto en memoria')
+    args = parser.parse_args()
+
+    issuer = FakeGoogleIssuer(CLIENT_ID).start()
+    env = dict(
+        os.environ,
+        GOOGLE_CLIENT_ID=CLIENT_ID,
+        GOOGLE_CERTS_URL=issuer.certs_url,
+        CHAT_ECHO_TOKEN_DELAY=str(args.token_delay),
+        RESPONSE_CACHE_ENABLED='false'
+    )
+    env.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret')
+    if args.mongodb_uri:
+        env['MONGODB_URI'] = args.mongodb_uri
+
+    print(f"Backend de modelo: {args.token_delay * 1000:.0f}ms por token; WSGI con {args.threads} hilos")
+    for mode in args.modes.split(','):
+        process, base_url = start_server(mode, args.threads, env)
+        try:
+            tokens = login_users(base_url, issuer, args.users)
+            for concurrency in (int(n) for n in args.concurrency.split(',')):
+                summary = asyncio.run(run_burst(base_url, tokens, concurrency, args.timeout))
+                print(f"{mode:4s} concurrencia={concurrency:<5d} err={summary['errors']:4d} "
+                      f"p50={summary['p50_ms']:8.1f}ms p95={summary['p95_ms']:8.1f}ms "
+                      f"max={summary['max_ms']:8.1f}ms {summary['chats_per_second']:7.1f} chats/s")
+        finally:
+            stop_gunicorn(process)
+
+    issuer.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Benchmark del esquema del historial de chat: un documento por mensaje
+(CHAT_HISTORY_LAYOUT=documents) frente a buckets de CHAT_BUCKET_SIZE mensajes
+(CHAT_HISTORY_LAYOUT=buckets). Mide:
+
+- almacenamiento: documentos, entradas de índice y tamaño (collStats con un
+  MongoDB real; con el sustituto en memoria, tamaño BSON de los documentos)
+- la migración (python manage.py migrate-chat-buckets) de todo el historial
+- escritura: latencia de save_chat_message y round trips por mensaje
+- lectura: latencia de la primera página del historial y de una página profunda
+
+Con el sustituto en memoria, --round-trip-ms simula la latencia de red. Con
+--mongodb-uri usa una base de datos real, que debe tener chat_history y
+chat_buckets vacías (el benchmark escribe en ellas).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_chat_buckets --users 50 --messages 20000
+    python -m benchmarks.bench_chat_buckets --mongodb-uri mongodb://localhost:27017/aiwrapper
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import bson
+from bson import ObjectId
+
+from benchmarks.fakes import use_mongomock
+
+def generate_history(users, messages):
+    """Mensajes de `users` usuarios repartidos en los últimos 30 días"""
+    started_at = datetime.utcnow() - timedelta(days=30)
+    step = timedelta(days=30) / messages
+    for i in range(messages):
+        timestamp = started_at + step * i
+        yield {
+            '_id': ObjectId(),
+            'user_id': f"10485760000000000{random.randrange(users):04d}",
+            'message': f"Mensaje {i}: necesito información sobre precios y plazos para un chatbot con IA",
+            'message_type': 'user' if i % 2 == 0 else 'bot',
+            'timestamp': timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000),
+            'metadata': {'cached': i % 5 == 0}
+        }
+
+def storage_stats(db, name):
+    """(documentos, entradas de índice, bytes de datos, bytes de índices o None)"""
+    collection = db[name]
+    indexes = len(collection.index_information())
+    try:
+        stats = db.command('collStats', name)
+        return stats['count'], stats['count'] * indexes, stats['size'], stats['totalIndexSize']
+    except Exception:
+        # El sustituto en memoria no implementa collStats
+        documents = list(collection.find())
+        return len(documents), len(documents) * indexes, sum(len(bson.encode(doc)) for doc in documents), None
+
+def timed_calls(fn, args_list):
+    """Latencias en ms de fn(*args) para cada args de la lista"""
+    latencies = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+def deep_cursor(db_service, user_id, page_size, depth):
+    """Cursor de la página número `depth` del historial del usuario (o None si es más corto)"""
+    cursor = None
+    for _ in range(depth):
+        cursor = db_service.get_chat_history_page(user_id, page_size, cursor, ['message'])['next_cursor']
+        if cursor is None:
+            return None
+    return cursor
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    return (f"p50={statistics.median(latencies):7.2f}ms "
+            f"p95={latencies[int(len(latencies) * 0.95) - 1]:7.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--messages', type=int, default=20000, help='mensajes del historial inicial')
+    parser.add_argument('--bucket-size', type=int, default=100)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--depth', type=int, default=5, help='página que se mide como página profunda')
+    parser.add_argument('--writes', type=int, default=500)
+    parser.add_argument('--round-trip-ms', type=float, default=0.5, help='latencia simulada (solo en memoria)')
+    parser.add_argument('--mongodb-uri', help='MongoDB real (por defecto, mongomock)')
+    args = parser.parse_args()
+
+    counter = None
+    if args.mongodb_uri:
+        os.environ['MONGODB_URI'] = args.mongodb_uri
+    else:
+        from mongomock.store import ServerStore
+        counter = use_mongomock(round_trip_ms=args.round_trip_ms, store=ServerStore())
+
+    from config import Config
+    from mongodb_service import MongoDBService
+    Config.CHAT_BUCKET_SIZE = args.bucket_size
+
+    services = {}
+    for layout in ('documents', 'buckets'):
+        Config.CHAT_HISTORY_LAYOUT = layout
+        services[layout] = MongoDBService()
+    db = services['documents'].db
+    if db.chat_history.estimated_document_count() or db.chat_buckets.estimated_document_count():
+        raise SystemExit("chat_history y chat_buckets deben estar vacías")
+
+    db.chat_history.insert_many(generate_history(args.users, args.messages), ordered=False)
+
+    start = time.perf_counter()
+    while services['documents'].migrate_chat_history_batch(1000):
+        pass
+    elapsed = time.perf_counter() - start
+    print(f"{args.messages} mensajes, {args.users} usuarios, buckets de {args.bucket_size}")
+    print(f"migración: {elapsed:.2f}s ({args.messages / elapsed:.0f} mensajes/s)")
+
+    user_ids = db.chat_history.distinct('user_id')
+    writes = [(random.choice(user_ids), f"Mensaje nuevo {i}", 'user') for i in range(args.writes)]
+    reads = [(user_id, args.page_size) for user_id in user_ids]
+    results = {}
+    for layout, db_service in services.items():
+        write_round_trips = counter.count if counter else 0
+        write_latencies = timed_calls(db_service.save_chat_message, writes)
+        if counter:
+            write_round_trips = (counter.count - write_round_trips) / len(writes)
+
+        first_page = timed_calls(db_service.get_chat_history_page, reads)
+        deep_reads = [
+            (user_id, args.page_size, cursor)
+            for user_id, cursor in ((user_id, deep_cursor(db_service, user_id, args.page_size, args.depth)) for user_id in user_ids)
+            if cursor
+        ]
+        deep_page = timed_calls(db_service.get_chat_history_page, deep_reads)
+        results[layout] = (write_latencies, write_round_trips, first_page, deep_page)
+
+    for layout, name in (('documents', 'chat_history'), ('buckets', 'chat_buckets')):
+        documents, index_entries, data_size, index_size = storage_stats(db, name)
+        index_text = f"{index_size / 1024:9.1f} KiB" if index_size is not None else '        n/d'
+        write_latencies, write_round_trips, first_page, deep_page = results[layout]
+        print(f"{layout}")
+        print(f"  almacenamiento    {documents:8d} docs  {index_entries:8d} entradas de índice  "
+              f"datos={data_size / 1024:9.1f} KiB  índices={index_text}")
+        print(f"  escritura         {summary(write_latencies)}  round trips/mensaje={write_round_trips:.2f}")
+        print(f"  primera página    {summary(first_page)}")
+        if deep_page:
+            print(f"  página {args.depth:<3d}        {summary(deep_page)}")
+
+if __name__ == '__main__':
+    main()
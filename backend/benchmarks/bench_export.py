@@ -0,0 +1,83 @@
+"""
+Benchmark de memoria de las exportaciones en streaming: pico de memoria
+(tracemalloc) y throughput al exportar N mensajes como NDJSON y CSV, frente a
+construir la lista completa en memoria y serializarla de una vez.
+
+El cursor es un generador que crea los documentos por lotes, como un cursor de
+MongoDB con batch_size, para medir solo el coste del lado de la app.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_export --rows 10000,100000
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+
+import exports
+from json_provider import get_json_provider_class
+
+class LazyCursor:
+    """Genera `count` mensajes de chat bajo demanda, de batch_size en batch_size"""
+
+    def __init__(self, count, batch_size=1000):
+        self.count = count
+        self.batch_size = batch_size
+        self.started_at = datetime.utcnow() - timedelta(days=30)
+
+    def __iter__(self):
+        for start in range(0, self.count, self.batch_size):
+            batch = [self._document(i) for i in range(start, min(start + self.batch_size, self.count))]
+            yield from batch
+
+    def _document(self, i):
+        return {
+            '_id': ObjectId(),
+            'user_id': f"10485760000000000{i % 50:04d}",
+            'message': f"Mensaje {i}: necesito información sobre precios y plazos para un chatbot con IA",
+            'message_type': 'user' if i % 2 == 0 else 'bot',
+            'timestamp': self.started_at + timedelta(seconds=i),
+            'metadata': {'cached': i % 5 == 0}
+        }
+
+    def close(self):
+        pass
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', default='10000,100000')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    dumps = get_json_provider_class()(app).dumps
+
+    def streamed(count, export_format):
+        return lambda: sum(len(chunk) for chunk in exports.stream_export(
+            LazyCursor(count), export_format, exports.CHAT_HISTORY_COLUMNS, dumps))
+
+    def in_memory(count):
+        return lambda: len(dumps({'history': list(LazyCursor(count))}))
+
+    for count in (int(n) for n in args.rows.split(',')):
+        print(f"{count} mensajes")
+        for label, fn in (('ndjson (stream)', streamed(count, 'ndjson')),
+                          ('csv (stream)', streamed(count, 'csv')),
+                          ('json (lista en memoria)', in_memory(count))):
+            size, elapsed, peak = measure(fn)
+            print(f"  {label:24s} {size / 1024 / 1024:7.1f} MiB en {elapsed:6.2f}s "
+                  f"({count / elapsed:9.0f} filas/s)  pico de memoria={peak / 1024 / 1024:7.2f} MiB")
+
+if __name__ == '__main__':
+    main()
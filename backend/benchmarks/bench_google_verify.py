@@ -0,0 +1,73 @@
+"""
+Benchmark de AuthService.verify_google_token: verificación en frío (descarga
+de certificados) frente a verificación en caliente (certificados en caché).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_google_verify --iterations 200
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.fakes import FakeGoogleIssuer
+
+CLIENT_ID = 'bench-client-id.apps.googleusercontent.com'
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p95_ms': samples[int(len(samples) * 0.95) - 1] * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    issuer = FakeGoogleIssuer(CLIENT_ID).start()
+    os.environ['GOOGLE_CLIENT_ID'] = CLIENT_ID
+    os.environ['GOOGLE_CERTS_URL'] = issuer.certs_url
+
+    # Importar después de configurar el entorno: Config lee las variables al importar
+    import requests
+    import auth_service
+    from auth_service import AuthService
+    from google_certs import GoogleCertCache
+
+    token = issuer.issue_token('bench-user', 'bench@example.com', 'Bench User')
+    cache = auth_service.google_cert_cache
+
+    def run(label, before_each=None):
+        samples = []
+        for _ in range(args.iterations):
+            if before_each:
+                before_each()
+            start = time.perf_counter()
+            user_info = AuthService.verify_google_token(token)
+            samples.append(time.perf_counter() - start)
+            assert user_info and user_info['google_id'] == 'bench-user'
+        return label, _summary(samples)
+
+    def fresh_transport():
+        # Comportamiento anterior: transporte HTTP y certificados nuevos en cada login
+        auth_service.google_cert_cache = GoogleCertCache()
+        auth_service.google_cert_cache.session = requests.Session()
+
+    results = [run('cold (transporte nuevo)', fresh_transport)]
+    auth_service.google_cert_cache = cache
+    results.append(run('cold (sesión HTTP reutilizada)', cache.invalidate))
+    cache.fetch()
+    results.append(run('warm (certificados en caché)'))
+
+    print(f"verify_google_token, {args.iterations} iteraciones")
+    for label, summary in results:
+        print(f"  {label:34s} mean={summary['mean_ms']:.3f}ms p50={summary['p50_ms']:.3f}ms p95={summary['p95_ms']:.3f}ms")
+    print(f"  peticiones al servidor de certificados: {issuer.cert_requests}")
+
+    issuer.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark de compresión y GET condicionales en /chat/history y /get-submissions:
+
+- tamaño y coste de CPU de cada codificación (identity, gzip, brotli) sobre
+  historiales y listados de formularios realistas
+- latencia de un sondeo sin cambios: respuesta completa (200) frente a 304
+
+Uso (desde backend/):
+    python -m benchmarks.bench_http_cache --messages 100 --iterations 200
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.bench_json_encoder import build_history
+from benchmarks.fakes import use_mongomock
+
+def _median_ms(samples):
+    return statistics.median(samples) * 1000
+
+def bench_encodings(app, name, payload, iterations):
+    import http_cache
+
+    with app.app_context():
+        body = app.json.response(payload).get_data()
+
+    encodings = [('identity', None), ('gzip', 'gzip')]
+    if http_cache.brotli is not None:
+        encodings.append(('br', 'br'))
+
+    print(f"{name}: {len(body) / 1024:.1f} KiB sin comprimir")
+    for label, encoding in encodings:
+        samples = []
+        size = len(body)
+        for _ in range(iterations if encoding else 1):
+            start = time.perf_counter()
+            compressed = http_cache.compress(body, encoding) if encoding else body
+            samples.append(time.perf_counter() - start)
+            size = len(compressed)
+        print(f"  {label:8s} {size / 1024:8.1f} KiB ({size / len(body):6.1%})  cpu={_median_ms(samples):.3f}ms")
+
+def bench_polling(client, label, url, headers, iterations):
+    first = client.get(url, headers=headers)
+    etag = first.headers['ETag']
+
+    def run(extra_headers):
+        samples = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = client.get(url, headers=dict(headers, **extra_headers))
+            samples.append(time.perf_counter() - start)
+        return response, samples
+
+    full, full_samples = run({'Accept-Encoding': 'gzip, br'})
+    cached, cached_samples = run({'Accept-Encoding': 'gzip, br', 'If-None-Match': etag})
+    assert cached.status_code == 304
+    print(f"  {label:16s} 200={_median_ms(full_samples):7.3f}ms ({len(full.data)} bytes)  "
+          f"304={_median_ms(cached_samples):7.3f}ms ({len(cached.data)} bytes)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--messages', type=int, default=100, help='mensajes por página de historial')
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret')
+    use_mongomock()
+
+    import logging
+    logging.disable(logging.INFO)
+    from app import app, services
+    from auth_service import AuthService
+
+    # Tamaño y CPU de cada codificación
+    history = build_history(args.messages)
+    bench_encodings(app, f"historial de {args.messages} mensajes", history, args.iterations)
+    submissions = [{
+        '_id': message['_id'],
+        'name': f"Lead {i}",
+        'email': f"lead{i}@example.com",
+        'message': 'Quiero un presupuesto para un asistente con IA que atienda a clientes 24/7',
+        'company': 'ACME', 'phone': '+34 600 000 000',
+        'service_type': ('chatbot', 'automation', 'consulting')[i % 3],
+        'authenticated_user': None,
+        'timestamp': message['timestamp']
+    } for i, message in enumerate(history['history'])]
+    bench_encodings(app, f"{len(submissions)} formularios", {'submissions': submissions, 'total': len(submissions), 'next_cursor': None}, args.iterations)
+
+    # Sondeos sin cambios: 200 completo frente a 304
+    db_service = services.db
+    user_info = {'google_id': 'bench-user', 'email': 'bench@example.com', 'name': 'Bench', 'picture': '', 'email_verified': True}
+    db_service.create_or_update_user(user_info)
+    for message in history['history']:
+        db_service.chat_history.insert_one(dict(message, user_id='bench-user'))
+    for submission in submissions:
+        db_service.form_submissions.insert_one(dict(submission))
+
+    headers = {'Authorization': f"Bearer {AuthService.generate_jwt_token(user_info)}"}
+    client = app.test_client()
+    print(f"sondeo sin cambios ({args.iterations} iteraciones, mediana)")
+    bench_polling(client, '/chat/history', f"/chat/history?limit={args.messages}", headers, args.iterations)
+    bench_polling(client, '/get-submissions', f"/get-submissions?limit={args.messages}", headers, args.iterations)
+
+if __name__ == '__main__':
+    main()
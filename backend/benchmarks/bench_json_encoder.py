@@ -0,0 +1,64 @@
+"""
+Benchmark de los codificadores JSON de respuesta: tiempo de serialización y
+tamaño de un historial de chat de 500 mensajes (documentos con ObjectId y datetime).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_json_encoder --messages 500 --iterations 200
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+
+from json_provider import JSON_PROVIDERS, orjson
+
+def build_history(count):
+    """Genera documentos con la misma forma que chat_history"""
+    started_at = datetime.utcnow() - timedelta(hours=1)
+    history = []
+    for i in range(count):
+        message_type = 'user' if i % 2 == 0 else 'bot'
+        history.append({
+            '_id': ObjectId(),
+            'user_id': '104857600000000000001',
+            'message': f"Mensaje {i}: necesito información sobre precios y plazos para un chatbot con IA " * (1 if message_type == 'user' else 3),
+            'message_type': message_type,
+            'timestamp': started_at + timedelta(seconds=i * 7),
+            'metadata': {'tokens': 42 + i % 17, 'cached': i % 5 == 0}
+        })
+    return {'history': history, 'total': count, 'next_cursor': None}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--iterations', type=int, default=200)
+    args = parser.parse_args()
+
+    payload = build_history(args.messages)
+    app = Flask(__name__)
+
+    print(f"historial de {args.messages} mensajes, {args.iterations} iteraciones")
+    for name, provider_class in JSON_PROVIDERS.items():
+        if name == 'orjson' and orjson is None:
+            print(f"  {name:8s} (no instalado)")
+            continue
+
+        provider = provider_class(app)
+        with app.app_context():
+            samples = []
+            size = 0
+            for _ in range(args.iterations):
+                start = time.perf_counter()
+                body = provider.response(payload).get_data()
+                samples.append(time.perf_counter() - start)
+                size = len(body)
+
+        samples.sort()
+        print(f"  {name:8s} mean={statistics.mean(samples) * 1000:.3f}ms "
+              f"p95={samples[int(len(samples) * 0.95) - 1] * 1000:.3f}ms bytes={size}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark del coste del logging por request: N requests a una ruta protegida
+(/auth/verify, con require_auth) con el cliente de pruebas de Flask y MongoDB en
+memoria, en un proceso nuevo por configuración. stderr se redirige a un fichero
+temporal, como cuando el proceso escribe a un fichero o a una tubería.
+
+- antes: escritura síncrona en texto y un mensaje INFO por request autenticada
+- sync-json: escritura síncrona en JSON, sin el mensaje por request
+- async-json: configuración por defecto (cola + hilo del listener, JSON)
+- async-json-debug: como async-json, con el mensaje por request activado (DEBUG)
+- sin-logs: LOG_LEVEL=WARNING (referencia sin logging)
+
+También mide el coste de una llamada logger.debug(...) en el hilo que la hace y
+lo que tarda en vaciarse el buffer al final.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_logging --requests 5000 --runs 3
+"""
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Mensajes registrados para medir el coste de cada llamada al logger
+LOG_CALLS = 5000
+
+SCENARIOS = {
+    'antes': {'LOG_ASYNC': 'false', 'LOG_FORMAT': 'text', 'LOG_LEVEL': 'DEBUG', 'LOG_RATE_LIMIT': '0'},
+    'sync-json': {'LOG_ASYNC': 'false', 'LOG_FORMAT': 'json', 'LOG_LEVEL': 'INFO'},
+    'async-json': {'LOG_ASYNC': 'true', 'LOG_FORMAT': 'json', 'LOG_LEVEL': 'INFO'},
+    'async-json-debug': {'LOG_ASYNC': 'true', 'LOG_FORMAT': 'json', 'LOG_LEVEL': 'DEBUG', 'LOG_RATE_LIMIT': '0'},
+    'sin-logs': {'LOG_LEVEL': 'WARNING'}
+}
+
+def run_scenario(requests_count):
+    """Se ejecuta en el proceso hijo; imprime el resultado en JSON por stdout"""
+    from benchmarks.fakes import use_mongomock
+    use_mongomock()
+
+    import app as app_module
+    import log_config
+    from auth_service import AuthService
+    from services import services
+
+    user_info = {'google_id': 'bench-user', 'email': 'bench@example.com', 'name': 'Bench', 'picture': '', 'email_verified': True}
+    services.db.create_or_update_user(user_info)
+    headers = {'Authorization': f"Bearer {AuthService.generate_jwt_token(user_info)}"}
+    client = app_module.app.test_client()
+
+    for _ in range(200):
+        client.get('/auth/verify', headers=headers)
+
+    start = time.perf_counter()
+    for _ in range(requests_count):
+        response = client.get('/auth/verify', headers=headers)
+        assert response.status_code == 200
+    elapsed = time.perf_counter() - start
+
+    # Coste de un mensaje DEBUG en el hilo que lo registra (casi nulo si el nivel está desactivado)
+    bench_logger = logging.getLogger('benchmarks.bench_logging')
+    start = time.perf_counter()
+    for _ in range(LOG_CALLS):
+        bench_logger.debug("Usuario autenticado: %s", user_info['email'])
+    log_call = time.perf_counter() - start
+
+    start = time.perf_counter()
+    log_config.stop_logging()
+    flush = time.perf_counter() - start
+
+    stats = log_config.logging_stats()
+    print(json.dumps({
+        'request_us': elapsed / requests_count * 1e6,
+        'log_call_us': log_call / LOG_CALLS * 1e6,
+        'flush_ms': flush * 1000,
+        'dropped': stats['dropped'] if stats else 0
+    }))
+
+def run_child(name, requests_count):
+    env = dict(os.environ, JWT_SECRET_KEY='bench-jwt-secret', **SCENARIOS[name])
+    with tempfile.TemporaryFile() as log_file:
+        result = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_logging', '--scenario', name, '--requests', str(requests_count)],
+            env=env, stdout=subprocess.PIPE, stderr=log_file, text=True
+        )
+        log_size = log_file.tell()
+        if result.returncode != 0:
+            log_file.seek(0)
+            raise SystemExit(f"Error en el escenario {name}:\n{log_file.read()[-2000:].decode()}")
+    return dict(json.loads(result.stdout.strip().splitlines()[-1]), log_bytes=log_size)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scenario:
+        return run_scenario(args.requests)
+
+    # Las configuraciones se alternan en cada ronda y se queda la mejor de cada una
+    results = {}
+    for _ in range(args.runs):
+        for name in args.scenarios.split(','):
+            result = run_child(name, args.requests)
+            if name not in results or result['request_us'] < results[name]['request_us']:
+                results[name] = result
+
+    baseline = results.get('sin-logs')
+    print(f"{args.requests} requests a /auth/verify por escenario")
+    for name, result in results.items():
+        overhead = f" ({result['request_us'] - baseline['request_us']:+6.1f}µs)" if baseline else ''
+        print(f"  {name:18s} {result['request_us']:8.1f}µs/request{overhead}  "
+              f"debug()={result['log_call_us']:6.2f}µs  vaciado={result['flush_ms']:6.1f}ms  "
+              f"log={result['log_bytes'] / 1024:7.1f} KiB  descartados={result['dropped']}")
+
+if __name__ == '__main__':
+    main()
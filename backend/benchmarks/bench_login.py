@@ -0,0 +1,101 @@
+"""
+Benchmark de la parte de MongoDB del login (/auth/google) contra el sustituto
+en memoria con una latencia de red simulada por operación:
+
+- antes: update_one (upsert) + find_one del usuario + insert_one de la sesión,
+  todo en el camino crítico y reescribiendo last_login en cada login
+- ahora: un único find_one_and_update; la sesión se escribe tras enviar la respuesta
+
+Uso (desde backend/):
+    python -m benchmarks.bench_login --iterations 200 --round-trip-ms 1
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fakes import use_mongomock
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        'mean_ms': statistics.mean(samples) * 1000,
+        'p50_ms': samples[len(samples) // 2] * 1000,
+        'p95_ms': samples[int(len(samples) * 0.95) - 1] * 1000
+    }
+
+def legacy_login(db_service, user_info, token_hash, expires_in):
+    """Camino anterior: tres round trips secuenciales"""
+    now = datetime.utcnow()
+    db_service.users.update_one(
+        {'google_id': user_info['google_id']},
+        {
+            '$set': dict(user_info, last_login=now, updated_at=now),
+            '$setOnInsert': {'created_at': now}
+        },
+        upsert=True
+    )
+    user = db_service.users.find_one({'google_id': user_info['google_id']})
+    db_service.sessions.insert_one({
+        'user_id': user_info['google_id'],
+        'token_hash': token_hash,
+        'created_at': now,
+        'expires_at': now + timedelta(seconds=expires_in),
+        'is_active': True
+    })
+    return user
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--users', type=int, default=20, help='usuarios distintos (logins repetidos)')
+    parser.add_argument('--round-trip-ms', type=float, default=1.0, help='latencia simulada por operación')
+    args = parser.parse_args()
+
+    round_trips = use_mongomock(args.round_trip_ms)
+
+    import logging
+    logging.disable(logging.INFO)
+    from config import Config
+    from mongodb_service import MongoDBService
+
+    db_service = MongoDBService()
+
+    def user_info(i):
+        return {
+            'google_id': f'bench-user-{i}',
+            'email': f'bench{i}@example.com',
+            'name': f'Bench User {i}',
+            'picture': '',
+            'email_verified': True
+        }
+
+    def run(label, login):
+        samples = []
+        round_trips.reset()
+        for i in range(args.iterations):
+            start = time.perf_counter()
+            user = login(user_info(i % args.users), f'token-hash-{i}')
+            samples.append(time.perf_counter() - start)
+            assert user and user['google_id'] == f'bench-user-{i % args.users}'
+        return label, _summary(samples), round_trips.count / args.iterations
+
+    def legacy(info, token_hash):
+        return legacy_login(db_service, info, token_hash, Config.JWT_ACCESS_TOKEN_EXPIRES)
+
+    def current(info, token_hash):
+        # La sesión se crea en call_on_close, después de responder: no se mide
+        return db_service.create_or_update_user(info)
+
+    results = [
+        run('antes (upsert + find_one + sesión)', legacy),
+        run('ahora (find_one_and_update)', current)
+    ]
+
+    print(f"{args.iterations} logins de {args.users} usuarios, {args.round_trip_ms}ms por round trip")
+    for label, summary, trips in results:
+        print(f"  {label:36s} mean={summary['mean_ms']:.3f}ms p50={summary['p50_ms']:.3f}ms "
+              f"p95={summary['p95_ms']:.3f}ms round_trips/login={trips:.1f}")
+
+if __name__ == '__main__':
+    main()
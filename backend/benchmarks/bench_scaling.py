@@ -0,0 +1,98 @@
+"""
+Benchmark de escalado multi-worker: sirve la app con Gunicorn (gunicorn.conf.py,
+preload + fork) con 1..N workers y mide el throughput de cada configuración.
+
+Con el sustituto en memoria cada worker tiene su propia base de datos, así que
+por defecto solo se miden rutas que no dependen de datos de otra request
+(login con Google y formulario). Con --mongodb-uri se pueden medir todas.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_scaling --workers 1,2,4 --requests 1000 --concurrency 32
+    python -m benchmarks.bench_scaling --mongodb-uri mongodb://localhost:27017/aiwrapper --routes auth_google,chatbot
+"""
+import argparse
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.fakes import FakeGoogleIssuer
+from benchmarks.load_test import CLIENT_ID, build_scenarios, login_users, run_load
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_gunicorn(workers, threads, env):
+    """
+    Arranca Gunicorn con la configuración de producción y espera a que responda
+    """
+    import requests
+
+    port = free_port()
+    env = dict(env, GUNICORN_WORKERS=str(workers), GUNICORN_THREADS=str(threads), GUNICORN_BIND=f"127.0.0.1:{port}")
+    app_spec = 'app:app' if 'MONGODB_URI' in env else 'benchmarks.mongomock_app:app'
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', app_spec],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f"{base_url}/metrics", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise SystemExit("Gunicorn no arrancó en 30 segundos")
+
+def stop_gunicorn(process):
+    """Apagado ordenado (SIGTERM) como en un despliegue"""
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=35)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', default=f"1,{os.cpu_count()}", help='configuraciones de workers, separadas por comas')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=500, help='peticiones por ruta')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--routes', default='auth_google,submit_form')
+    parser.add_argument('--mongodb-uri', help='MongoDB real compartido por los workers')
+    args = parser.parse_args()
+
+    issuer = FakeGoogleIssuer(CLIENT_ID).start()
+    env = dict(os.environ, GOOGLE_CLIENT_ID=CLIENT_ID, GOOGLE_CERTS_URL=issuer.certs_url)
+    env.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret')
+    if args.mongodb_uri:
+        env['MONGODB_URI'] = args.mongodb_uri
+
+    print(f"{os.cpu_count()} CPUs, {args.threads} hilos por worker, concurrencia {args.concurrency}")
+    baseline = {}
+    for workers in (int(n) for n in sorted(set(args.workers.split(',')), key=int)):
+        process, base_url = start_gunicorn(workers, args.threads, env)
+        try:
+            users = login_users(base_url, issuer, args.users)
+            scenarios = build_scenarios(base_url, issuer, users)
+            for route in args.routes.split(','):
+                label, summary = run_load(route, scenarios[route], args.requests, args.concurrency)
+                baseline.setdefault(label, summary['throughput_rps'])
+                speedup = summary['throughput_rps'] / baseline[label] if baseline[label] else 0.0
+                print(f"workers={workers:<3d} {label:16s} err={summary['errors']:3d} "
+                      f"p50={summary['p50_ms']:7.2f}ms p95={summary['p95_ms']:7.2f}ms "
+                      f"{summary['throughput_rps']:8.1f} req/s  x{speedup:.2f}")
+        finally:
+            stop_gunicorn(process)
+
+    issuer.stop()
+
+if __name__ == '__main__':
+    main()
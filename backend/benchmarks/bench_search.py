@@ -0,0 +1,232 @@
+"""
+Benchmark de la búsqueda de texto (/admin/search/...): latencia de
+search_chat_history y search_form_submissions con volúmenes realistas, por tipo
+de consulta:
+
+- término frecuente, término poco frecuente y frase exacta
+- con filtro por usuario (o por tipo de servicio) y por rango de fechas
+- página profunda: la página número --depth siguiendo next_cursor
+
+Con --check comprueba además el orden y la paginación de los resultados:
+cada página va por relevancia (score y _id descendentes), recorrer todas las
+páginas con next_cursor no repite ni pierde resultados (tantos como documentos
+encuentra $text con count_documents) y la búsqueda usa las raíces de las
+palabras ("presupuestos" encuentra "presupuesto"). Termina con error si falla.
+
+Necesita un MongoDB real (--mongodb-uri): el sustituto en memoria no implementa
+$text. La base de datos debe tener chat_history, chat_buckets y form_submissions
+vacías; el benchmark crea los índices (como manage.py ensure-indexes) y escribe
+en ellas. Con --layout buckets mide la búsqueda en el historial en buckets
+(migrando antes los mensajes).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_search --mongodb-uri mongodb://localhost:27017/aiwrapper_bench
+    python -m benchmarks.bench_search --mongodb-uri ... --messages 1000000 --layout buckets
+    python -m benchmarks.bench_search --mongodb-uri ... --messages 20000 --check
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+# Vocabulario de los mensajes generados: unas palabras aparecen en casi todos y
+# otras en muy pocos, como en un historial real
+COMMON_WORDS = ['precio', 'chatbot', 'información', 'proyecto', 'necesito', 'empresa', 'automatizar']
+RARE_WORDS = ['kubernetes', 'facturación', 'whatsapp', 'migración', 'auditoría', 'blockchain']
+FILLER_WORDS = ['quiero', 'saber', 'cuánto', 'cuesta', 'para', 'nuestro', 'equipo', 'clientes', 'plazo',
+                'integrar', 'con', 'web', 'datos', 'ventas', 'soporte', 'atención', 'semanas', 'presupuesto']
+SERVICE_TYPES = ['chatbot', 'automatizacion', 'consultoria', 'integracion']
+
+def random_text(words):
+    text = random.choices(FILLER_WORDS, k=words)
+    text[random.randrange(words)] = random.choice(COMMON_WORDS)
+    if random.random() < 0.01:
+        text[random.randrange(words)] = random.choice(RARE_WORDS)
+    return ' '.join(text)
+
+def generate_history(users, messages):
+    """Mensajes de `users` usuarios repartidos en los últimos 90 días"""
+    started_at = datetime.utcnow() - timedelta(days=90)
+    step = timedelta(days=90) / messages
+    for i in range(messages):
+        timestamp = started_at + step * i
+        yield {
+            '_id': ObjectId(),
+            'user_id': f"10485760000000000{random.randrange(users):04d}",
+            'message': random_text(random.randint(8, 40)),
+            'message_type': 'user' if i % 2 == 0 else 'bot',
+            'timestamp': timestamp.replace(microsecond=timestamp.microsecond // 1000 * 1000),
+            'metadata': {}
+        }
+
+def generate_submissions(count):
+    started_at = datetime.utcnow() - timedelta(days=365)
+    step = timedelta(days=365) / count
+    for i in range(count):
+        yield {
+            'name': f"Cliente {i}",
+            'email': f"cliente{i}@example.com",
+            'company': f"Empresa {random.choice(FILLER_WORDS)} {i % 500}",
+            'phone': '',
+            'service_type': random.choice(SERVICE_TYPES),
+            'message': random_text(random.randint(20, 120)),
+            'timestamp': started_at + step * i,
+            'status': 'new'
+        }
+
+def timed_searches(search, queries):
+    """Latencias en ms y número medio de resultados de search(**kwargs) para cada consulta"""
+    latencies = []
+    results = 0
+    for kwargs in queries:
+        start = time.perf_counter()
+        page = search(**kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results += len(page['results'])
+    return latencies, results / len(queries)
+
+def deep_cursors(search, queries, depth):
+    """Cursores de la página número `depth` de cada consulta (se omiten las más cortas)"""
+    deep = []
+    for kwargs in queries:
+        cursor = None
+        for _ in range(depth):
+            cursor = search(**dict(kwargs, cursor=cursor))['next_cursor']
+            if cursor is None:
+                break
+        if cursor:
+            deep.append(dict(kwargs, cursor=cursor))
+    return deep
+
+def all_pages(search, kwargs):
+    """Resultados de todas las páginas de una búsqueda siguiendo next_cursor"""
+    pages = []
+    cursor = None
+    while True:
+        page = search(**dict(kwargs, cursor=cursor))
+        pages.append(page['results'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return pages
+
+def check_search(search, collection, kwargs):
+    """
+    Comprueba el orden por relevancia y la paginación de una búsqueda.
+    Devuelve la lista de errores encontrados
+    """
+    errors = []
+    pages = all_pages(search, kwargs)
+    results = [result for page in pages for result in page]
+    keys = [(result['score'], result['_id']) for result in results]
+    if keys != sorted(keys, reverse=True):
+        errors.append(f"{kwargs}: resultados fuera de orden (score, _id)")
+    if len(set(result['_id'] for result in results)) != len(results):
+        errors.append(f"{kwargs}: resultados repetidos entre páginas")
+    if any(len(page) > kwargs['limit'] for page in pages) or any(not page for page in pages[:-1]):
+        errors.append(f"{kwargs}: páginas de tamaño incorrecto {[len(page) for page in pages]}")
+    expected = collection.count_documents({'$text': {'$search': kwargs['search']}})
+    if len(results) != expected:
+        errors.append(f"{kwargs}: {len(results)} resultados en {len(pages)} páginas, $text encuentra {expected}")
+    return errors
+
+def run_checks(db_service, layout, limit):
+    db = db_service.db
+    history = db.chat_buckets if layout == 'buckets' else db.chat_history
+    checks = [
+        (search, collection, {'search': word, 'limit': limit})
+        for search, collection in ((db_service.search_chat_history, history),
+                                   (db_service.search_form_submissions, db.form_submissions))
+        for word in random.sample(RARE_WORDS, 2)
+    ]
+    errors = []
+    for search, collection, kwargs in checks:
+        errors += check_search(search, collection, kwargs)
+    if not db_service.search_chat_history('presupuestos', limit=limit)['results']:
+        errors.append("'presupuestos' no encuentra 'presupuesto' en el historial")
+    for error in errors:
+        print(f"  ERROR {error}")
+    if errors:
+        raise SystemExit(f"{len(errors)} comprobaciones fallidas")
+    print(f"comprobaciones de orden y paginación: ok ({len(checks)} búsquedas)")
+
+def summary(latencies):
+    latencies = sorted(latencies)
+    return (f"p50={statistics.median(latencies):7.2f}ms "
+            f"p95={latencies[max(0, int(len(latencies) * 0.95) - 1)]:7.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mongodb-uri', required=True)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--messages', type=int, default=200000, help='mensajes del historial')
+    parser.add_argument('--submissions', type=int, default=20000)
+    parser.add_argument('--layout', choices=('documents', 'buckets'), default='documents')
+    parser.add_argument('--page-size', type=int, default=20)
+    parser.add_argument('--depth', type=int, default=5, help='página que se mide como página profunda')
+    parser.add_argument('--queries', type=int, default=50, help='consultas por tipo')
+    parser.add_argument('--check', action='store_true', help='comprueba el orden y la paginación de los resultados')
+    args = parser.parse_args()
+
+    os.environ['MONGODB_URI'] = args.mongodb_uri
+    from config import Config
+    from mongodb_service import MongoDBService
+    Config.CHAT_HISTORY_LAYOUT = args.layout
+    db_service = MongoDBService()
+    db = db_service.db
+    for name in ('chat_history', 'chat_buckets', 'form_submissions'):
+        if db[name].estimated_document_count():
+            raise SystemExit("chat_history, chat_buckets y form_submissions deben estar vacías")
+
+    start = time.perf_counter()
+    db.chat_history.insert_many(generate_history(args.users, args.messages), ordered=False)
+    db.form_submissions.insert_many(generate_submissions(args.submissions), ordered=False)
+    if args.layout == 'buckets':
+        while db_service.migrate_chat_history_batch(1000, settle_seconds=0):
+            pass
+    seeded = time.perf_counter() - start
+    start = time.perf_counter()
+    db_service.ensure_indexes()
+    print(f"{args.messages} mensajes ({args.layout}), {args.users} usuarios, {args.submissions} formularios")
+    print(f"carga: {seeded:.1f}s  índices: {time.perf_counter() - start:.1f}s")
+
+    if args.check:
+        run_checks(db_service, args.layout, args.page_size)
+    
+    user_ids = db.chat_history.distinct('user_id')
+    now = datetime.utcnow()
+    limit = args.page_size
+
+    def queries(make):
+        return [make() for _ in range(args.queries)]
+
+    chat_queries = {
+        'término frecuente': queries(lambda: {'search': random.choice(COMMON_WORDS), 'limit': limit}),
+        'término raro': queries(lambda: {'search': random.choice(RARE_WORDS), 'limit': limit}),
+        'frase': queries(lambda: {'search': '"cuánto cuesta"', 'limit': limit}),
+        'por usuario': queries(lambda: {'search': random.choice(COMMON_WORDS), 'user_id': random.choice(user_ids), 'limit': limit}),
+        'últimos 7 días': queries(lambda: {'search': random.choice(COMMON_WORDS), 'since': now - timedelta(days=7), 'limit': limit}),
+    }
+    submission_queries = {
+        'término frecuente': queries(lambda: {'search': random.choice(COMMON_WORDS), 'limit': limit}),
+        'término raro': queries(lambda: {'search': random.choice(RARE_WORDS), 'limit': limit}),
+        'por servicio': queries(lambda: {'search': random.choice(COMMON_WORDS), 'service_type': random.choice(SERVICE_TYPES), 'limit': limit}),
+        'último mes': queries(lambda: {'search': random.choice(COMMON_WORDS), 'since': now - timedelta(days=30), 'limit': limit}),
+    }
+
+    for title, search, cases in (('historial', db_service.search_chat_history, chat_queries),
+                                 ('formularios', db_service.search_form_submissions, submission_queries)):
+        print(title)
+        for name, kwargs_list in cases.items():
+            latencies, results = timed_searches(search, kwargs_list)
+            print(f"  {name:18s} {summary(latencies)}  resultados/página={results:5.1f}")
+        deep = deep_cursors(search, cases['término frecuente'][:10], args.depth)
+        if deep:
+            latencies, results = timed_searches(search, deep)
+            print(f"  {f'página {args.depth}':18s} {summary(latencies)}  resultados/página={results:5.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Benchmark del arranque en frío de un worker: tiempo de `import app` en un
+intérprete nuevo y desglose de las importaciones más pesadas (python -X importtime).
+
+- lazy: comportamiento actual (sin conexión a MongoDB ni DDL al importar)
+- eager: como antes, inicializando MongoDB y creando índices al arrancar
+
+Uso (desde backend/):
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --runs 5 --mongodb-uri mongodb://localhost:27017/aiwrapper
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# Módulos cuyo tiempo acumulado de importación se muestra
+TRACKED_MODULES = ('flask', 'pymongo', 'jwt', 'google.auth', 'google.auth.jwt', 'requests', 'orjson', 'auth_service', 'mongodb_service', 'app')
+
+SCENARIOS = {
+    'lazy': ('import app', {}),
+    'eager': ('import app; app.services.db', {'MONGODB_AUTO_CREATE_INDEXES': 'true'})
+}
+
+def parse_importtime(stderr):
+    """Devuelve {módulo: tiempo acumulado en ms} a partir de la salida de -X importtime"""
+    cumulative = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, module = (part.strip() for part in line.replace('import time:', '|', 1).split('|'))
+        cumulative[module] = int(cumulative_us) / 1000
+    return cumulative
+
+def run_once(code, extra_env):
+    env = dict(os.environ, **extra_env)
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        env=env, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        raise SystemExit(f"Error importando la app:\n{result.stderr[-2000:]}")
+    return elapsed, parse_importtime(result.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--scenarios', default='lazy,eager')
+    parser.add_argument('--mongodb-uri', help='MongoDB para el escenario eager (por defecto el de Config)')
+    args = parser.parse_args()
+
+    if args.mongodb_uri:
+        os.environ['MONGODB_URI'] = args.mongodb_uri
+
+    for name in args.scenarios.split(','):
+        code, extra_env = SCENARIOS[name]
+        samples = []
+        modules = {}
+        for _ in range(args.runs):
+            elapsed, cumulative = run_once(code, extra_env)
+            samples.append(elapsed)
+            for module in TRACKED_MODULES:
+                if module in cumulative:
+                    modules.setdefault(module, []).append(cumulative[module])
+
+        print(f"{name}: {args.runs} arranques, mediana={statistics.median(samples) * 1000:.1f}ms "
+              f"min={min(samples) * 1000:.1f}ms max={max(samples) * 1000:.1f}ms")
+        for module in TRACKED_MODULES:
+            if module in modules:
+                print(f"  import {module:16s} {statistics.median(modules[module]):8.1f}ms")
+            else:
+                print(f"  import {module:16s} (no se importa al arrancar)")
+
+if __name__ == '__main__':
+    main()
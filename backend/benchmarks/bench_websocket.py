@@ -0,0 +1,221 @@
+"""
+Benchmark del canal WebSocket del chat (/chat/ws) frente a POST /chatbot en la
+app ASGI (Hypercorn, 1 worker): mensajes por segundo por conexión, con cada
+conexión enviando sus mensajes uno tras otro (el siguiente cuando termina la
+respuesta del anterior).
+
+- http: POST /chatbot con keep-alive (autenticación en cada mensaje)
+- http-sse: POST /chatbot con stream=true (tokens por Server-Sent Events)
+- ws: frames message con stream=false en una conexión autenticada al abrirse
+  (la respuesta completa en el frame done)
+- ws-stream: como ws, con la respuesta en frames token (equivale a http-sse)
+
+Cada modo se mide con un servidor recién arrancado: con el sustituto en memoria
+el coste de leer el historial crece con el número de mensajes guardados.
+
+Los clientes usan h11 y wsproto (dependencias de Hypercorn) sobre asyncio.
+La caché de respuestas está desactivada para que todos los mensajes lleguen al
+backend de modelo (echo, sin retardo por defecto).
+
+Uso (desde backend/):
+    python -m benchmarks.bench_websocket --connections 1,8 --messages 200
+    python -m benchmarks.bench_websocket --mongodb-uri mongodb://localhost:27017/aiwrapper
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+import h11
+from wsproto import ConnectionType, WSConnection
+from wsproto.events import AcceptConnection, CloseConnection, Message, Ping, RejectConnection, Request
+
+from benchmarks.bench_async import start_server
+from benchmarks.bench_scaling import stop_gunicorn
+from benchmarks.fakes import FakeGoogleIssuer
+from benchmarks.load_test import CLIENT_ID, login_users, percentile
+
+FRONTEND_URL = 'http://localhost:3000'
+
+class HttpClient:
+    """Cliente HTTP/1.1 con keep-alive (una conexión, una request cada vez)"""
+
+    async def connect(self, base_url):
+        url = urlsplit(base_url)
+        self.host = url.netloc
+        self.reader, self.writer = await asyncio.open_connection(url.hostname, url.port)
+        self.connection = h11.Connection(h11.CLIENT)
+
+    async def post(self, path, token, payload):
+        body = json.dumps(payload).encode('utf-8')
+        headers = [('Host', self.host), ('Authorization', f"Bearer {token}"),
+                   ('Content-Type', 'application/json'), ('Content-Length', str(len(body)))]
+        self.writer.write(self.connection.send(h11.Request(method='POST', target=path, headers=headers)))
+        self.writer.write(self.connection.send(h11.Data(data=body)))
+        self.writer.write(self.connection.send(h11.EndOfMessage()))
+
+        status = 0
+        while True:
+            event = self.connection.next_event()
+            if event is h11.NEED_DATA:
+                self.connection.receive_data(await self.reader.read(65536))
+            elif isinstance(event, h11.Response):
+                status = event.status_code
+            elif isinstance(event, h11.EndOfMessage):
+                self.connection.start_next_cycle()
+                return status
+            elif isinstance(event, h11.ConnectionClosed):
+                raise ConnectionError("El servidor cerró la conexión")
+
+    async def close(self):
+        self.writer.close()
+
+class WebsocketClient:
+    """Cliente WebSocket mínimo sobre wsproto"""
+
+    async def connect(self, base_url, token):
+        url = urlsplit(base_url)
+        self.reader, self.writer = await asyncio.open_connection(url.hostname, url.port)
+        self.connection = WSConnection(ConnectionType.CLIENT)
+        self.pending = []
+        self.text = []
+        self.writer.write(self.connection.send(Request(
+            host=url.netloc, target='/chat/ws',
+            extra_headers=[(b'origin', FRONTEND_URL.encode()), (b'authorization', f"Bearer {token}".encode())]
+        )))
+        self.accepted = False
+        while not self.accepted:
+            await self._read()
+
+    async def _read(self):
+        """Lee del socket y guarda los frames JSON completos en self.pending"""
+        data = await self.reader.read(65536)
+        if not data:
+            raise ConnectionError("El servidor cerró la conexión")
+        self.connection.receive_data(data)
+        for event in self.connection.events():
+            if isinstance(event, AcceptConnection):
+                self.accepted = True
+            elif isinstance(event, RejectConnection):
+                raise ConnectionError(f"Conexión WebSocket rechazada: {event.status_code}")
+            elif isinstance(event, Ping):
+                self.writer.write(self.connection.send(event.response()))
+            elif isinstance(event, CloseConnection):
+                raise ConnectionError(f"Conexión WebSocket cerrada: {event.code} {event.reason}")
+            elif isinstance(event, Message):
+                self.text.append(event.data)
+                if event.message_finished:
+                    self.pending.append(json.loads(''.join(self.text)))
+                    self.text = []
+
+    async def send(self, frame):
+        self.writer.write(self.connection.send(Message(data=json.dumps(frame))))
+
+    async def receive(self):
+        """Siguiente frame JSON del servidor"""
+        while not self.pending:
+            await self._read()
+        return self.pending.pop(0)
+
+    async def close(self):
+        self.writer.close()
+
+async def run_http_connection(base_url, token, messages, stream):
+    client = HttpClient()
+    await client.connect(base_url)
+    latencies = []
+    errors = 0
+    try:
+        for i in range(messages):
+            started_at = time.perf_counter()
+            status = await client.post('/chatbot', token, {'message': f"Consulta {i} sobre precios", 'cache': False, 'stream': stream})
+            latencies.append(time.perf_counter() - started_at)
+            errors += status != 200
+    finally:
+        await client.close()
+    return latencies, errors
+
+async def run_websocket_connection(base_url, token, messages, stream):
+    client = WebsocketClient()
+    await client.connect(base_url, token)
+    latencies = []
+    errors = 0
+    try:
+        frame = await client.receive()
+        if frame['type'] != 'ready':
+            raise ConnectionError(f"Autenticación WebSocket fallida: {frame}")
+        for i in range(messages):
+            started_at = time.perf_counter()
+            await client.send({'type': 'message', 'id': str(i), 'message': f"Consulta {i} sobre precios",
+                               'cache': False, 'stream': stream})
+            while True:
+                frame = await client.receive()
+                if frame['type'] in ('done', 'error'):
+                    break
+            latencies.append(time.perf_counter() - started_at)
+            errors += frame['type'] != 'done'
+    finally:
+        await client.close()
+    return latencies, errors
+
+async def run_connections(mode, base_url, tokens, connections, messages):
+    if mode.startswith('ws'):
+        runs = [run_websocket_connection(base_url, tokens[i % len(tokens)], messages, mode == 'ws-stream') for i in range(connections)]
+    else:
+        runs = [run_http_connection(base_url, tokens[i % len(tokens)], messages, mode == 'http-sse') for i in range(connections)]
+    started_at = time.perf_counter()
+    results = await asyncio.gather(*runs)
+    elapsed = time.perf_counter() - started_at
+
+    latencies = sorted(latency for connection_latencies, _ in results for latency in connection_latencies)
+    return {
+        'errors': sum(errors for _, errors in results),
+        'per_connection': messages / elapsed,
+        'total': connections * messages / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='http,ws,http-sse,ws-stream')
+    parser.add_argument('--connections', default='1,8', help='conexiones simultáneas, separadas por comas')
+    parser.add_argument('--messages', type=int, default=200, help='mensajes por conexión')
+    parser.add_argument('--token-delay', type=float, default=0.0, help='segundos por token del backend de modelo')
+    parser.add_argument('--mongodb-uri', help='MongoDB real en lugar del sustituto en memoria')
+    args = parser.parse_args()
+
+    issuer = FakeGoogleIssuer(CLIENT_ID).start()
+    env = dict(
+        os.environ,
+        GOOGLE_CLIENT_ID=CLIENT_ID,
+        GOOGLE_CERTS_URL=issuer.certs_url,
+        CHAT_ECHO_TOKEN_DELAY=str(args.token_delay),
+        RESPONSE_CACHE_ENABLED='false',
+        FRONTEND_URL=FRONTEND_URL,
+        LOG_LEVEL='WARNING'
+    )
+    env.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret')
+    if args.mongodb_uri:
+        env['MONGODB_URI'] = args.mongodb_uri
+
+    print(f"{args.messages} mensajes por conexión, Hypercorn con 1 worker")
+    for connections in (int(n) for n in args.connections.split(',')):
+        for mode in args.modes.split(','):
+            process, base_url = start_server('asgi', 1, env)
+            try:
+                tokens = login_users(base_url, issuer, connections)
+                asyncio.run(run_connections(mode, base_url, tokens, 1, 10))
+                summary = asyncio.run(run_connections(mode, base_url, tokens, connections, args.messages))
+            finally:
+                stop_gunicorn(process)
+            print(f"  {mode:9s} conexiones={connections:<4d} err={summary['errors']:4d} "
+                  f"{summary['per_connection']:8.1f} msg/s por conexión  {summary['total']:8.1f} msg/s en total  "
+                  f"p50={summary['p50_ms']:7.2f}ms p95={summary['p95_ms']:7.2f}ms")
+
+    issuer.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""
+Dobles locales para ejecutar los benchmarks sin acceso a red:
+un emisor falso de ID tokens de Google que sirve sus certificados por HTTP,
+y un sustituto en memoria de MongoDB (mongomock, opcional).
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from google.auth import crypt
+from google.auth import jwt as google_jwt
+import asyncio
+import json
+import threading
+import time
+import rsa
+
+class FakeGoogleIssuer:
+    """
+    Emite ID tokens firmados con RS256 y publica la clave pública en
+    http://127.0.0.1:<puerto>/oauth2/v1/certs con Cache-Control: max-age
+    """
+
+    def __init__(self, client_id, key_id='fake-key-1', max_age=3600, key_size=2048):
+        self.client_id = client_id
+        self.key_id = key_id
+        self.max_age = max_age
+        public_key, private_key = rsa.newkeys(key_size)
+        self.signer = crypt.RSASigner.from_string(private_key.save_pkcs1('PEM'), key_id=key_id)
+        self.certs = {key_id: public_key.save_pkcs1('PEM').decode('utf-8')}
+        self.cert_requests = 0
+        self._server = None
+        self._thread = None
+
+    @property
+    def certs_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/oauth2/v1/certs"
+
+    def start(self):
+        issuer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                if self.path != '/oauth2/v1/certs':
+                    self.send_error(404)
+                    return
+                issuer.cert_requests += 1
+                body = json.dumps(issuer.certs).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', f"public, max-age={issuer.max_age}")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def issue_token(self, sub, email, name, lifetime=3600):
+        """
+        Devuelve un ID token con los mismos claims que usa AuthService
+        """
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com',
+            'aud': self.client_id,
+            'sub': sub,
+            'email': email,
+            'email_verified': True,
+            'name': name,
+            'picture': '',
+            'iat': now,
+            'exp': now + lifetime
+        }
+        token = google_jwt.encode(self.signer, payload, key_id=self.key_id)
+        return token.decode('utf-8')
+
+
+# Operaciones de colección que equivalen a un round trip al servidor
+ROUND_TRIP_OPERATIONS = (
+    'find_one', 'insert_one', 'insert_many', 'update_one', 'update_many',
+    'find_one_and_update', 'delete_one', 'delete_many', 'count_documents'
+)
+
+class RoundTripCounter:
+    """
+    Cuenta los round trips simulados (por hilo no se separan: usar en un solo hilo)
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+def use_mongomock(round_trip_ms=0, store=None):
+    """
+    Sustituye el MongoClient de mongodb_service por un cliente en memoria
+    (mongomock). Debe llamarse antes de crear el MongoDBService compartido.
+    Con round_trip_ms > 0 cada operación de colección espera ese tiempo, para
+    simular la latencia de red de un MongoDB real. Devuelve un RoundTripCounter.
+    Para medir contra un MongoDB real, basta con no llamarla y definir MONGODB_URI.
+    """
+    try:
+        import mongomock
+    except ImportError:
+        raise SystemExit("mongomock no está instalado: pip install mongomock (o usa --mongodb-uri)")
+
+    import mongodb_service
+
+    class MongomockClient(mongomock.MongoClient):
+        def __init__(self, host=None, **kwargs):
+            # Las opciones del pool y los listeners no aplican al cliente en memoria
+            super().__init__(_store=store)
+
+    mongodb_service.MongoClient = MongomockClient
+
+    counter = RoundTripCounter()
+    local = threading.local()
+
+    def with_round_trip(method):
+        def wrapper(*args, **kwargs):
+            # Solo cuenta la llamada más externa (mongomock se llama a sí mismo)
+            if getattr(local, 'depth', 0):
+                return method(*args, **kwargs)
+            local.depth = 1
+            try:
+                counter.count += 1
+                if round_trip_ms:
+                    time.sleep(round_trip_ms / 1000)
+                return method(*args, **kwargs)
+            finally:
+                local.depth = 0
+        return wrapper
+
+    for name in ROUND_TRIP_OPERATIONS:
+        method = getattr(mongomock.collection.Collection, name)
+        setattr(mongomock.collection.Collection, name, with_round_trip(method))
+    return counter
+
+class AsyncMongomockCursor:
+    """Cursor asíncrono sobre un cursor de mongomock (subconjunto de AsyncCursor)"""
+
+    def __init__(self, cursor, round_trip):
+        self._cursor = cursor
+        self._round_trip = round_trip
+
+    def sort(self, *args, **kwargs):
+        self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, limit):
+        self._cursor.limit(limit)
+        return self
+
+    def batch_size(self, batch_size):
+        self._cursor.batch_size(batch_size)
+        return self
+
+    async def to_list(self, length=None):
+        await self._round_trip()
+        documents = list(self._cursor)
+        return documents[:length] if length else documents
+
+    async def __aiter__(self):
+        await self._round_trip()
+        for document in self._cursor:
+            yield document
+
+    async def close(self):
+        self._cursor.close()
+
+class AsyncMongomockCollection:
+    """Colección asíncrona: cada operación espera el round trip simulado"""
+
+    def __init__(self, collection, round_trip):
+        self._collection = collection
+        self._round_trip = round_trip
+
+    def find(self, *args, **kwargs):
+        return AsyncMongomockCursor(self._collection.find(*args, **kwargs), self._round_trip)
+
+    async def aggregate(self, pipeline, **kwargs):
+        await self._round_trip()
+        return AsyncMongomockCursor(self._collection.aggregate(pipeline, **kwargs), self._round_trip)
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+
+        async def operation(*args, **kwargs):
+            await self._round_trip()
+            return method(*args, **kwargs)
+        return operation
+
+class AsyncMongomockDatabase:
+    def __init__(self, database, round_trip):
+        self._database = database
+        self._round_trip = round_trip
+
+    def __getitem__(self, name):
+        return AsyncMongomockCollection(self._database[name], self._round_trip)
+
+    def __getattr__(self, name):
+        return self[name]
+
+    async def command(self, *args, **kwargs):
+        await self._round_trip()
+        return self._database.command(*args, **kwargs)
+
+def use_async_mongomock(round_trip_ms=0):
+    """
+    Como use_mongomock, pero también para AsyncMongoDBService (app ASGI): el
+    cliente asíncrono y el síncrono (cola de trabajos) comparten la base de
+    datos en memoria. Con round_trip_ms > 0 cada operación asíncrona espera ese
+    tiempo con asyncio.sleep, sin bloquear el event loop
+    """
+    import mongomock
+    from mongomock.store import ServerStore
+
+    import async_mongodb_service
+
+    store = ServerStore()
+    counter = use_mongomock(store=store)
+
+    async def round_trip():
+        counter.count += 1
+        await asyncio.sleep(round_trip_ms / 1000 if round_trip_ms else 0)
+
+    class AsyncMongomockClient:
+        def __init__(self, host=None, **kwargs):
+            self._client = mongomock.MongoClient(_store=store)
+            self.admin = AsyncMongomockDatabase(self._client.admin, round_trip)
+
+        def __getattr__(self, name):
+            return AsyncMongomockDatabase(self._client[name], round_trip)
+
+        async def close(self):
+            self._client.close()
+
+    async_mongodb_service.AsyncMongoClient = AsyncMongomockClient
+    return counter
@@ -0,0 +1,212 @@
+"""
+Prueba de carga de los endpoints de app.py con dobles locales (sin red):
+emisor falso de Google y MongoDB en memoria (o un MongoDB real con --mongodb-uri).
+Informa p50/p95/p99 y throughput por ruta y guarda el resultado en JSON.
+
+Uso (desde backend/):
+    python -m benchmarks.load_test --concurrency 8 --requests 500 --output bench_output.json
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchmarks.fakes import FakeGoogleIssuer, use_mongomock
+
+CLIENT_ID = 'bench-client-id.apps.googleusercontent.com'
+
+ROUTES = ('auth_google', 'auth_verify', 'chatbot', 'chat_history', 'submit_form', 'get_submissions')
+
+def percentile(sorted_samples, fraction):
+    if not sorted_samples:
+        return 0.0
+    index = min(len(sorted_samples) - 1, max(0, int(round(fraction * len(sorted_samples))) - 1))
+    return sorted_samples[index]
+
+def summarize(samples, errors, elapsed):
+    samples = sorted(samples)
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'mean_ms': (sum(samples) / len(samples) * 1000) if samples else 0.0,
+        'p50_ms': percentile(samples, 0.50) * 1000,
+        'p95_ms': percentile(samples, 0.95) * 1000,
+        'p99_ms': percentile(samples, 0.99) * 1000,
+        'throughput_rps': len(samples) / elapsed if elapsed else 0.0
+    }
+
+def setup_environment(args):
+    """
+    Arranca el emisor falso y configura el entorno antes de importar la app
+    """
+    issuer = FakeGoogleIssuer(CLIENT_ID).start()
+    os.environ['GOOGLE_CLIENT_ID'] = CLIENT_ID
+    os.environ['GOOGLE_CERTS_URL'] = issuer.certs_url
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-jwt-secret')
+    if args.mongodb_uri:
+        os.environ['MONGODB_URI'] = args.mongodb_uri
+    else:
+        use_mongomock()
+    return issuer
+
+def start_server(app):
+    """
+    Sirve la app en un hilo con el servidor WSGI multihilo de Werkzeug
+    """
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+def run_load(label, request_fn, total, concurrency):
+    """
+    Ejecuta `total` llamadas a request_fn(session, i) con `concurrency` hilos.
+    Cada hilo reutiliza su propia sesión HTTP (keep-alive)
+    """
+    import requests
+
+    local = threading.local()
+    samples = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def call(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = request_fn(session, i)
+            ok = response.status_code < 400
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                samples.append(elapsed)
+            else:
+                errors[0] += 1
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(total)))
+    return label, summarize(samples, errors[0], time.perf_counter() - started_at)
+
+def build_scenarios(base_url, issuer, users):
+    """
+    Devuelve {ruta: request_fn(session, i)} para cada endpoint de app.py
+    """
+    google_tokens = [issuer.issue_token(f"bench-user-{n}", f"bench{n}@example.com", f"Bench {n}") for n in range(len(users))]
+
+    def auth(i):
+        return {'Authorization': f"Bearer {users[i % len(users)]}"}
+
+    return {
+        'auth_google': lambda s, i: s.post(f"{base_url}/auth/google", json={'token': google_tokens[i % len(google_tokens)]}),
+        'auth_verify': lambda s, i: s.get(f"{base_url}/auth/verify", headers=auth(i)),
+        'chatbot': lambda s, i: s.post(f"{base_url}/chatbot", headers=auth(i), json={'message': f"¿Cuánto cuesta un chatbot? ({i})"}),
+        'chat_history': lambda s, i: s.get(f"{base_url}/chat/history", headers=auth(i), params={'limit': 50}),
+        'submit_form': lambda s, i: s.post(f"{base_url}/submit-form", json={
+            'name': f"Lead {i}",
+            'email': f"lead{i % 500}@example.com",
+            'message': 'Quiero un presupuesto para un asistente con IA',
+            'company': 'ACME',
+            'service_type': ('chatbot', 'automation', 'consulting')[i % 3]
+        }),
+        'get_submissions': lambda s, i: s.get(f"{base_url}/get-submissions", headers=auth(i), params={'limit': 50})
+    }
+
+def login_users(base_url, issuer, count):
+    """
+    Inicia sesión con `count` usuarios falsos y devuelve sus JWT
+    """
+    import requests
+
+    tokens = []
+    with requests.Session() as session:
+        for n in range(count):
+            google_token = issuer.issue_token(f"bench-user-{n}", f"bench{n}@example.com", f"Bench {n}")
+            response = session.post(f"{base_url}/auth/google", json={'token': google_token})
+            response.raise_for_status()
+            tokens.append(response.json()['token'])
+    return tokens
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=500, help='peticiones por ruta')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--routes', default=','.join(ROUTES), help='rutas a medir, separadas por comas')
+    parser.add_argument('--mongodb-uri', help='MongoDB real en lugar del sustituto en memoria')
+    parser.add_argument('--output', help='fichero JSON de resultados')
+    parser.add_argument('--baseline', help='JSON de una ejecución anterior con el que comparar el p95')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='aumento de p95 tolerado (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    issuer = setup_environment(args)
+
+    # Importar después de configurar el entorno: Config lee las variables al importar
+    from app import app, services
+    services.db.ensure_indexes()
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    server, base_url = start_server(app)
+    users = login_users(base_url, issuer, args.users)
+    scenarios = build_scenarios(base_url, issuer, users)
+
+    results = {}
+    for route in args.routes.split(','):
+        label, summary = run_load(route, scenarios[route], args.requests, args.concurrency)
+        results[label] = summary
+        print(f"{label:16s} n={summary['requests']:5d} err={summary['errors']:3d} "
+              f"p50={summary['p50_ms']:7.2f}ms p95={summary['p95_ms']:7.2f}ms p99={summary['p99_ms']:7.2f}ms "
+              f"{summary['throughput_rps']:8.1f} req/s")
+
+    report = {
+        'timestamp': datetime.utcnow().isoformat(),
+        'config': {
+            'concurrency': args.concurrency,
+            'requests_per_route': args.requests,
+            'users': args.users,
+            'mongodb': args.mongodb_uri or 'mongomock'
+        },
+        'routes': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+
+    server.shutdown()
+    issuer.stop()
+
+    if args.baseline and compare_with_baseline(results, args.baseline, args.max_regression):
+        raise SystemExit(1)
+
+def compare_with_baseline(results, baseline_path, max_regression):
+    """
+    Compara el p95 de cada ruta con una ejecución anterior.
+    Devuelve True si alguna ruta empeora más de lo tolerado
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)['routes']
+
+    regressed = False
+    for route, summary in results.items():
+        if route not in baseline or not baseline[route]['p95_ms']:
+            continue
+        change = summary['p95_ms'] / baseline[route]['p95_ms'] - 1
+        flag = 'REGRESIÓN' if change > max_regression else 'ok'
+        regressed = regressed or change > max_regression
+        print(f"{route:16s} p95 {baseline[route]['p95_ms']:7.2f}ms -> {summary['p95_ms']:7.2f}ms ({change:+.0%}) {flag}")
+    return regressed
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+"""
+La app con MongoDB sustituido por mongomock, para servirla con Gunicorn en los
+benchmarks (cada worker tiene su propia base de datos en memoria):
+
+    gunicorn -c gunicorn.conf.py benchmarks.mongomock_app:app
+"""
+from benchmarks.fakes import use_mongomock
+
+use_mongomock()
+
+from app import app
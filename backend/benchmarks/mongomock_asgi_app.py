@@ -0,0 +1,11 @@
+"""
+La app ASGI con MongoDB sustituido por mongomock, para servirla con Hypercorn
+en los benchmarks:
+
+    hypercorn benchmarks.mongomock_asgi_app:app
+"""
+from benchmarks.fakes import use_async_mongomock
+
+use_async_mongomock()
+
+from asgi_app import app
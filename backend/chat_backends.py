@@ -0,0 +1,114 @@
+from config import Config
+import asyncio
+import hashlib
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ChatBackend:
+    """
+    Interfaz de los backends de modelo para el chatbot.
+    Las implementaciones generan la respuesta como una secuencia de tokens.
+    """
+
+    name = 'base'
+    version = '1'
+    system_prompt = ''
+    # True si la respuesta depende del usuario (la caché de respuestas se separa por usuario)
+    personalized = False
+
+    def fingerprint(self):
+        """
+        Identifica el backend, su versión y su system prompt (para la caché de respuestas)
+        """
+        prompt_hash = hashlib.sha256(self.system_prompt.encode('utf-8')).hexdigest()[:16]
+        return f"{self.name}:{self.version}:{prompt_hash}"
+
+    def stream(self, message, user, history=None):
+        """
+        Genera los tokens de la respuesta a medida que están disponibles
+        """
+        raise NotImplementedError
+
+    def complete(self, message, user, history=None):
+        """
+        Devuelve la respuesta completa (concatenando el stream)
+        """
+        return ''.join(self.stream(message, user, history))
+
+    async def astream(self, message, user, history=None):
+        """
+        Versión asíncrona de stream (app ASGI). Por defecto consume el stream
+        síncrono en un hilo aparte para no bloquear el event loop; los backends
+        con un cliente asíncrono deberían sobrescribirla
+        """
+        iterator = iter(self.stream(message, user, history))
+        done = object()
+        while True:
+            token = await asyncio.to_thread(next, iterator, done)
+            if token is done:
+                return
+            yield token
+
+    async def acomplete(self, message, user, history=None):
+        """
+        Versión asíncrona de complete
+        """
+        return ''.join([token async for token in self.astream(message, user, history)])
+
+class EchoChatBackend(ChatBackend):
+    """
+    Backend local y determinista (para desarrollo y pruebas): responde con un
+    texto fijo, troceado por palabras, con un retardo opcional entre tokens
+    """
+
+    name = 'echo'
+    personalized = True
+
+    def __init__(self, token_delay=None):
+        self.token_delay = token_delay if token_delay is not None else Config.CHAT_ECHO_TOKEN_DELAY
+
+    def _tokens(self, message, user):
+        response = f"Hola {user['name']}, gracias por tu mensaje: '{message}'. Pronto integraremos un chatbot inteligente aquí."
+        words = response.split(' ')
+        return [word if i == len(words) - 1 else word + ' ' for i, word in enumerate(words)]
+
+    def stream(self, message, user, history=None):
+        for token in self._tokens(message, user):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield token
+
+    async def astream(self, message, user, history=None):
+        for token in self._tokens(message, user):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            yield token
+
+# Backends disponibles, por nombre (Config.CHAT_BACKEND)
+CHAT_BACKENDS = {
+    EchoChatBackend.name: EchoChatBackend
+}
+
+_chat_backend = None
+
+def get_chat_backend():
+    """
+    Devuelve la instancia del backend configurado en Config.CHAT_BACKEND
+    """
+    global _chat_backend
+    if _chat_backend is None:
+        backend_class = CHAT_BACKENDS.get(Config.CHAT_BACKEND)
+        if backend_class is None:
+            raise ValueError(f"Backend de chat desconocido: {Config.CHAT_BACKEND}")
+        _chat_backend = backend_class()
+        logger.info("Backend de chat inicializado: %s", backend_class.name)
+    return _chat_backend
+
+def set_chat_backend(backend):
+    """
+    Reemplaza el backend activo (útil en pruebas y benchmarks)
+    """
+    global _chat_backend
+    _chat_backend = backend
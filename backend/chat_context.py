@@ -0,0 +1,139 @@
+from config import Config
+from mongodb_service import decode_page_cursor, document_position, encode_page_cursor, position_key
+import logging
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_FIELDS = ('message', 'message_type', 'metadata')
+
+def estimate_tokens(text):
+    """
+    Estimación aproximada de tokens (~4 caracteres por token), sin tokenizador
+    """
+    return max(1, len(text) // 4)
+
+def extractive_summary(previous_summary, turns, token_budget):
+    """
+    Resumen incremental por defecto: añade una línea recortada por turno y
+    descarta las líneas más antiguas cuando se supera el presupuesto
+    """
+    lines = previous_summary.split('\n') if previous_summary else []
+    for turn in turns:
+        speaker = 'Usuario' if turn['message_type'] == 'user' else 'Asistente'
+        text = ' '.join(turn['message'].split())
+        lines.append(f"{speaker}: {text[:160]}{'…' if len(text) > 160 else ''}")
+
+    while len(lines) > 1 and estimate_tokens('\n'.join(lines)) > token_budget:
+        lines.pop(0)
+    return '\n'.join(lines)
+
+class ChatContextBuilder:
+    """
+    Construye el contexto que se envía al modelo: los últimos turnos que caben
+    en el presupuesto de tokens más un resumen acumulado de los turnos anteriores.
+    El resumen se guarda en el metadata del último mensaje del bot y se actualiza
+    de forma incremental, así que cada turno lee una única página de historial
+    de tamaño fijo, sea cual sea la longitud de la conversación.
+    """
+
+    def __init__(self, db_service, max_turns=None, token_budget=None, summary_token_budget=None, summarizer=None):
+        self.db_service = db_service
+        self.max_turns = max_turns or Config.CHAT_CONTEXT_MAX_TURNS
+        self.token_budget = token_budget or Config.CHAT_CONTEXT_TOKEN_BUDGET
+        self.summary_token_budget = summary_token_budget or Config.CHAT_SUMMARY_TOKEN_BUDGET
+        self.summarizer = summarizer or extractive_summary
+
+    def build(self, user_id):
+        """
+        Devuelve el contexto de la conversación antes del nuevo mensaje:
+        {'summary', 'turns', 'tokens'} más el estado necesario para actualizar el resumen
+        """
+        page = self.db_service.get_chat_history_page(user_id, self.max_turns, fields=CONTEXT_FIELDS)
+        return self._context(page['messages'])
+
+    async def abuild(self, user_id):
+        """
+        Versión asíncrona de build, con un AsyncMongoDBService como db_service
+        """
+        page = await self.db_service.get_chat_history_page(user_id, self.max_turns, fields=CONTEXT_FIELDS)
+        return self._context(page['messages'])
+
+    def _context(self, messages):
+        summary, summarized_until = '', None
+        for message in reversed(messages):
+            context_metadata = (message.get('metadata') or {}).get('context')
+            if context_metadata:
+                summary = context_metadata.get('summary', '')
+                summarized_until = context_metadata.get('summarized_until')
+                break
+        summarized_position = position_key(*decode_page_cursor(summarized_until)) if summarized_until else None
+
+        # Los turnos ya resumidos no se vuelven a enviar completos
+        budget = self.token_budget - estimate_tokens(summary) if summary else self.token_budget
+        turns = []
+        used = 0
+        for message in reversed(messages):
+            if summarized_position and document_position(message) <= summarized_position:
+                break
+            cost = estimate_tokens(message['message'])
+            if turns and used + cost > budget:
+                break
+            turns.append({
+                'role': 'user' if message['message_type'] == 'user' else 'assistant',
+                'content': message['message']
+            })
+            used += cost
+        turns.reverse()
+
+        # Los mensajes sin resumir que no cupieron en el presupuesto se añaden al
+        # resumen, para no dejar un hueco entre el resumen y los turnos
+        dropped = messages[:len(messages) - len(turns)]
+        if summarized_position:
+            dropped = [message for message in dropped if document_position(message) > summarized_position]
+        if dropped:
+            summary = self.summarizer(summary, dropped, self.summary_token_budget)
+            summarized_until = encode_page_cursor(dropped[-1]['timestamp'], dropped[-1]['_id'])
+            summarized_position = document_position(dropped[-1])
+
+        return {
+            'summary': summary,
+            'turns': turns,
+            'tokens': used + (estimate_tokens(summary) if summary else 0),
+            '_messages': messages,
+            '_summarized_position': summarized_position,
+            '_summarized_until': summarized_until
+        }
+
+    def summary_metadata(self, context):
+        """
+        Calcula el resumen actualizado tras el intercambio (usuario + bot) y lo
+        devuelve como metadata para el mensaje del bot. Además de los mensajes
+        que ya se resumieron al construir el contexto, se resumen los turnos que
+        salen de la ventana
+        """
+        messages = context['_messages']
+        summarized_position = context['_summarized_position']
+
+        # Tras el intercambio la ventana conserva los max_turns - 2 mensajes más recientes
+        keep = max(0, self.max_turns - 2)
+        evicted = messages[:len(messages) - keep] if len(messages) > keep else []
+        if summarized_position:
+            evicted = [message for message in evicted if document_position(message) > summarized_position]
+
+        if not evicted:
+            if not context['summary']:
+                return {}
+            return {'context': {'summary': context['summary'], 'summarized_until': context['_summarized_until']}}
+
+        summary = self.summarizer(context['summary'], evicted, self.summary_token_budget)
+        last = evicted[-1]
+        return {'context': {
+            'summary': summary,
+            'summarized_until': encode_page_cursor(last['timestamp'], last['_id'])
+        }}
+
+def model_context(context):
+    """
+    Vista del contexto para el backend del modelo (sin el estado interno)
+    """
+    return {key: value for key, value in context.items() if not key.startswith('_')}
@@ -0,0 +1,276 @@
+"""
+Canal WebSocket del chat (/chat/ws, solo en la app ASGI): la conexión se
+autentica una vez al abrirse y los mensajes y las respuestas en streaming van
+por el mismo socket, sin repetir la autenticación en cada mensaje.
+
+Protocolo (un objeto JSON por frame):
+
+- autenticación: header `Authorization: Bearer <token>` al conectar o, desde un
+  navegador, primer frame `{"type": "auth", "token": "..."}`. El servidor
+  responde `{"type": "ready", "user_id": ..., "expires_at": ...}`. Un nuevo
+  frame `auth` renueva el token sin cerrar la conexión
+- mensajes: `{"type": "message", "id": "...", "message": "...", "stream": true}`;
+  la respuesta son frames `token` con el mismo id y un `done` al final
+- origen: como el resto de la app, quart_cors rechaza (400) la conexión si el
+  header Origin no es FRONTEND_URL; los clientes que no son navegadores deben enviarlo
+- heartbeat: el servidor envía `ping` cada WS_HEARTBEAT_INTERVAL segundos y
+  cierra la conexión si no recibe nada del cliente en WS_IDLE_TIMEOUT segundos
+
+El token solo se vuelve a comprobar cuando expira (y la revocación por logout,
+que solo consulta MongoDB si el filtro en memoria da positivo, en cada heartbeat). Los mensajes se atienden de
+uno en uno por conexión: se aceptan hasta WS_MAX_PENDING en espera y el resto
+se rechazan con un error BUSY. Los frames de salida pasan por una cola de
+WS_SEND_QUEUE_SIZE frames: si el cliente lee más despacio de lo que el modelo
+genera, los tokens pendientes se agrupan en un solo frame y, con la cola
+llena, se deja de leer del modelo hasta que haya sitio. Un envío que lleva más
+de WS_SEND_TIMEOUT segundos sin completarse (se comprueba en cada heartbeat)
+cierra la conexión.
+"""
+from auth_middleware import AUTH_ERRORS, parse_bearer_token
+from async_auth import _resolve_principal, check_revoked
+from auth_cache import hash_token
+from config import Config
+import asyncio
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Códigos de cierre de la conexión (4000-4999 son de la aplicación)
+CLOSE_INTERNAL_ERROR = 1011
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_IDLE = 4408
+CLOSE_SLOW_CONSUMER = 4429
+
+class ConnectionClosed(Exception):
+    """La conexión se está cerrando y ya no acepta frames"""
+
+class ChatSocket:
+    """
+    Una conexión del canal WebSocket. `handle_message(socket, data)` atiende un
+    frame de tipo message y envía la respuesta con socket.send
+    """
+
+    def __init__(self, websocket, handle_message, dumps=json.dumps):
+        self.websocket = websocket
+        self.handle_message = handle_message
+        self.dumps = dumps
+        self.user = None
+        self.token_key = None
+        self.expires_at = None
+        self.last_seen = time.monotonic()
+        self.close_code = None
+        self.close_reason = ''
+        self._sending_since = None
+        self._pending = asyncio.Queue(maxsize=Config.WS_MAX_PENDING)
+        self._outgoing = asyncio.Queue(maxsize=Config.WS_SEND_QUEUE_SIZE)
+
+    async def run(self):
+        """
+        Autentica la conexión y atiende los mensajes hasta que se cierra
+        """
+        await self.websocket.accept()
+        if not await self._authenticate_on_connect():
+            await self.websocket.close(self.close_code, self.close_reason)
+            return
+
+        reader, writer, worker, heartbeat = tasks = [
+            asyncio.create_task(coroutine)
+            for coroutine in (self._reader(), self._writer(), self._worker(), self._heartbeat())
+        ]
+        try:
+            await self.send(self._ready_frame())
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception():
+                    logger.error(f"Error en la conexión WebSocket: {str(task.exception())}")
+                    self.close(CLOSE_INTERNAL_ERROR, 'Error interno')
+            for task in (reader, worker, heartbeat):
+                task.cancel()
+            if self.close_code not in (None, CLOSE_SLOW_CONSUMER) and not writer.done():
+                # Envía lo pendiente (p. ej. el error de un mensaje) antes de cerrar
+                await asyncio.wait_for(self._drain(writer), Config.WS_SEND_TIMEOUT)
+            if self.close_code is not None:
+                await self.websocket.close(self.close_code, self.close_reason)
+        except asyncio.TimeoutError:
+            await self.websocket.close(CLOSE_SLOW_CONSUMER, 'Cliente demasiado lento')
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info("Conexión WebSocket cerrada: user=%s código=%s", self.user['user_id'], self.close_code)
+
+    async def send(self, frame):
+        """
+        Encola un frame para el cliente; espera si la cola de salida está llena
+        """
+        if self.close_code is not None:
+            raise ConnectionClosed(self.close_reason)
+        await self._outgoing.put(frame)
+
+    def close(self, code, reason):
+        """Marca la conexión para cerrarla; run() la cierra al terminar las tareas"""
+        if self.close_code is None:
+            self.close_code = code
+            self.close_reason = reason
+
+    def _ready_frame(self):
+        return {'type': 'ready', 'user_id': self.user['user_id'], 'expires_at': self.expires_at}
+
+    async def _authenticate_on_connect(self):
+        """Token del header Authorization o, si no viene, del primer frame"""
+        token, error_code = parse_bearer_token(self.websocket.headers.get('Authorization'))
+        if error_code == 'MISSING_TOKEN':
+            try:
+                data = json.loads(await asyncio.wait_for(self.websocket.receive(), Config.WS_AUTH_TIMEOUT))
+            except asyncio.TimeoutError:
+                self.close(CLOSE_UNAUTHORIZED, 'Autenticación no recibida')
+                return False
+            except (TypeError, ValueError):
+                data = None
+            if isinstance(data, dict) and data.get('type') == 'auth':
+                token, error_code = data.get('token'), None
+        return await self._authenticate(token, error_code)
+
+    async def _authenticate(self, token, error_code=None):
+        """
+        Resuelve el usuario del token como require_auth. Si falla, marca la
+        conexión para cerrarla y devuelve False
+        """
+        current_user = None
+        if not error_code:
+            if not token or not isinstance(token, str):
+                error_code = 'MISSING_TOKEN'
+            else:
+                try:
+                    current_user, error_code = await _resolve_principal(token)
+                except Exception as e:
+                    logger.error(f"Error autenticando WebSocket: {str(e)}")
+                    error_code = 'AUTH_ERROR'
+
+        if error_code:
+            self.close(CLOSE_UNAUTHORIZED, AUTH_ERRORS[error_code][0])
+            return False
+        if self.user and current_user['user_id'] != self.user['user_id']:
+            self.close(CLOSE_UNAUTHORIZED, 'El token pertenece a otro usuario')
+            return False
+
+        self.user = current_user
+        self.token_key = hash_token(token)
+        self.expires_at = current_user.get('token_expires')
+        logger.debug("WebSocket autenticado: %s", current_user['email'])
+        return True
+
+    def _expired(self):
+        return self.expires_at is not None and time.time() >= self.expires_at
+
+    async def _reader(self):
+        """Lee los frames del cliente; los mensajes se encolan para _worker"""
+        while True:
+            raw = await self.websocket.receive()
+            self.last_seen = time.monotonic()
+            try:
+                data = json.loads(raw)
+                frame_type = data.get('type')
+            except (TypeError, ValueError, AttributeError):
+                await self.send({'type': 'error', 'code': 'INVALID_FRAME', 'error': 'Frame JSON inválido'})
+                continue
+
+            if frame_type == 'message':
+                try:
+                    self._pending.put_nowait(data)
+                except asyncio.QueueFull:
+                    await self.send({'type': 'error', 'id': data.get('id'), 'code': 'BUSY',
+                                     'error': 'Demasiados mensajes pendientes'})
+            elif frame_type == 'ping':
+                await self.send({'type': 'pong'})
+            elif frame_type == 'auth':
+                if not await self._authenticate(data.get('token')):
+                    return
+                await self.send(self._ready_frame())
+            elif frame_type != 'pong':
+                await self.send({'type': 'error', 'code': 'INVALID_FRAME',
+                                 'error': f"Tipo de frame desconocido: {frame_type}"})
+
+    async def _worker(self):
+        """Atiende los mensajes de uno en uno; solo comprueba si el token expiró"""
+        while True:
+            data = await self._pending.get()
+            if self._expired():
+                self.close(CLOSE_UNAUTHORIZED, AUTH_ERRORS['INVALID_TOKEN'][0])
+                return
+            try:
+                await self.handle_message(self, data)
+            except ConnectionClosed:
+                return
+
+    async def _writer(self):
+        """
+        Envía los frames de la cola. Los tokens de un mismo mensaje que se
+        acumularon mientras el cliente leía se envían en un solo frame
+        """
+        frame = None
+        while True:
+            if frame is None:
+                frame = await self._outgoing.get()
+                if frame is None:
+                    return
+            next_frame = None
+            if frame.get('type') == 'token':
+                frame, next_frame = self._coalesce_tokens(frame)
+            # Sin wait_for por frame: el heartbeat vigila los envíos bloqueados
+            self._sending_since = time.monotonic()
+            await self.websocket.send(self.dumps(frame))
+            self._sending_since = None
+            frame = next_frame
+
+    def _coalesce_tokens(self, frame):
+        """
+        Une al frame los tokens del mismo mensaje que ya estén en la cola.
+        Devuelve (frame, siguiente frame de la cola o None)
+        """
+        tokens = [frame['token']]
+        while not self._outgoing.empty():
+            next_frame = self._outgoing.get_nowait()
+            if next_frame is None or next_frame.get('type') != 'token' or next_frame.get('id') != frame.get('id'):
+                return self._with_tokens(frame, tokens), next_frame
+            tokens.append(next_frame['token'])
+        return self._with_tokens(frame, tokens), None
+
+    @staticmethod
+    def _with_tokens(frame, tokens):
+        return frame if len(tokens) == 1 else dict(frame, token=''.join(tokens))
+
+    async def _drain(self, writer):
+        """Espera a que el writer envíe los frames que quedan en la cola"""
+        await self._outgoing.put(None)
+        await writer
+
+    async def _heartbeat(self):
+        """
+        Envía ping periódicamente, cierra las conexiones inactivas o con un envío
+        bloqueado y comprueba la expiración y la revocación del token
+        """
+        while True:
+            await asyncio.sleep(Config.WS_HEARTBEAT_INTERVAL)
+            sending_since = self._sending_since
+            if sending_since is not None and time.monotonic() - sending_since > Config.WS_SEND_TIMEOUT:
+                logger.warning("Cliente WebSocket demasiado lento: user=%s", self.user['user_id'])
+                self.close(CLOSE_SLOW_CONSUMER, 'Cliente demasiado lento')
+                return
+            if time.monotonic() - self.last_seen > Config.WS_IDLE_TIMEOUT:
+                self.close(CLOSE_IDLE, 'Conexión inactiva')
+                return
+            if self._expired():
+                self.close(CLOSE_UNAUTHORIZED, AUTH_ERRORS['INVALID_TOKEN'][0])
+                return
+            error_code = await check_revoked(self.token_key, self.user)
+            if error_code:
+                self.close(CLOSE_UNAUTHORIZED, AUTH_ERRORS[error_code][0])
+                return
+            try:
+                self._outgoing.put_nowait({'type': 'ping'})
+            except asyncio.QueueFull:
+                # Con la cola llena la conexión no está inactiva: no hace falta el ping
+                pass
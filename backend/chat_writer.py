@@ -0,0 +1,179 @@
+from collections import deque
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import Config
+import atexit
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ChatMessageWriter:
+    """
+    Escritura diferida (write-behind) de mensajes de chat: encola los documentos
+    en memoria y los inserta en lotes con insert_many, por tamaño o por intervalo.
+    Un único hilo de escritura con cola FIFO preserva el orden por usuario.
+    """
+
+    def __init__(self, collection, batch_size=None, flush_interval=None, max_buffer=None, max_retries=None):
+        self.collection = collection
+        self.batch_size = batch_size or Config.CHAT_WRITE_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else Config.CHAT_WRITE_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or Config.CHAT_WRITE_MAX_BUFFER
+        self.max_retries = max_retries if max_retries is not None else Config.CHAT_WRITE_MAX_RETRIES
+        self._pending = deque()
+        self._inflight = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._force_flush = False
+        self._oldest_at = 0.0
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+        self._thread = threading.Thread(target=self._run, name='chat-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def enqueue(self, document):
+        """
+        Encola un documento; si el buffer está lleno espera a que se vacíe
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("El escritor de chat está cerrado")
+
+            while len(self._pending) >= self.max_buffer and not self._closed:
+                self._cond.notify_all()
+                self._cond.wait(self.flush_interval or 0.1)
+
+            if not self._pending:
+                self._oldest_at = time.monotonic()
+                self._cond.notify_all()
+            self._pending.append(document)
+            self.enqueued += 1
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify_all()
+
+    def pending_for_user(self, user_id):
+        """
+        Devuelve (en orden) los mensajes de un usuario aún no confirmados en MongoDB
+        """
+        with self._cond:
+            return [doc for doc in list(self._inflight) + list(self._pending) if doc['user_id'] == user_id]
+
+    def flush(self, timeout=None):
+        """
+        Fuerza el vaciado del buffer y espera a que termine
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            self._force_flush = True
+            self._cond.notify_all()
+            while self._pending or self._inflight:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self):
+        """
+        Vacía el buffer y detiene el hilo de escritura (se llama también al salir)
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        logger.info("Escritor de chat cerrado: %s mensajes escritos, %s descartados", self.written, self.dropped)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                # Esperar a completar un lote, a que venza el intervalo o al cierre
+                while not self._closed and not self._force_flush and len(self._pending) < self.batch_size:
+                    if self._pending:
+                        remaining = self._oldest_at + self.flush_interval - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                    else:
+                        self._cond.wait()
+
+                if not self._pending:
+                    self._force_flush = False
+                    if self._closed:
+                        return
+                    continue
+
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popleft())
+                self._inflight = batch
+                self._oldest_at = time.monotonic()
+                self._cond.notify_all()
+
+            self._write(batch)
+
+            with self._cond:
+                self._inflight = []
+                self._cond.notify_all()
+
+    def _write(self, batch):
+        started_at = time.perf_counter()
+        size = len(batch)
+        remaining = batch
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.collection.insert_many(remaining, ordered=True)
+                remaining = []
+                break
+            except BulkWriteError as e:
+                # Con ordered=True los documentos anteriores al error ya se insertaron
+                write_errors = e.details.get('writeErrors', [])
+                index = write_errors[0]['index'] if write_errors else 0
+                if write_errors and write_errors[0].get('code') == 11000:
+                    index += 1  # El documento ya existía (reintento de un lote parcial)
+                remaining = remaining[index:]
+                if not remaining:
+                    break
+                logger.warning(f"Error escribiendo lote de chat (intento {attempt + 1}): {str(e)}")
+            except PyMongoError as e:
+                logger.warning(f"Error escribiendo lote de chat (intento {attempt + 1}): {str(e)}")
+
+            if attempt < self.max_retries:
+                time.sleep(min(0.1 * (2 ** attempt), 2.0))
+
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        with self._cond:
+            self.flushes += 1
+            self.written += size - len(remaining)
+            self.dropped += len(remaining)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+
+        if remaining:
+            logger.error(f"Se descartaron {len(remaining)} mensajes de chat tras {self.max_retries + 1} intentos")
+
+    def stats(self):
+        """
+        Devuelve profundidad del buffer, latencia de vaciado y escrituras descartadas
+        """
+        with self._cond:
+            return {
+                'buffer_depth': len(self._pending) + len(self._inflight),
+                'enqueued': self.enqueued,
+                'written': self.written,
+                'dropped': self.dropped,
+                'flushes': self.flushes,
+                'last_flush_ms': self.last_flush_ms,
+                'avg_flush_ms': (self._total_flush_ms / self.flushes) if self.flushes else 0.0,
+                'max_flush_ms': self.max_flush_ms
+            }
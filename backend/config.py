@@ -14,13 +14,136 @@ class Config:
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hora
     
+    # Revocación de JWT por jti (lista local sincronizada con MongoDB)
+    JWT_DENYLIST_SYNC_INTERVAL = float(os.getenv('JWT_DENYLIST_SYNC_INTERVAL', '5'))  # segundos
+    JWT_DENYLIST_REBUILD_INTERVAL = float(os.getenv('JWT_DENYLIST_REBUILD_INTERVAL', '3600'))
+    JWT_DENYLIST_CAPACITY = int(os.getenv('JWT_DENYLIST_CAPACITY', '100000'))
+    JWT_DENYLIST_ERROR_RATE = float(os.getenv('JWT_DENYLIST_ERROR_RATE', '0.001'))
+    
+    # last_login solo se reescribe si es más antiguo que este intervalo (segundos)
+    LAST_LOGIN_UPDATE_INTERVAL = int(os.getenv('LAST_LOGIN_UPDATE_INTERVAL', '300'))
+    
+    # Caché en memoria de usuarios autenticados (token -> usuario/sesión)
+    AUTH_CACHE_MAX_SIZE = int(os.getenv('AUTH_CACHE_MAX_SIZE', '10000'))
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', '300'))  # segundos
+    
     # Configuración de Google OAuth
     GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
     GOOGLE_CLIENT_SECRET = os.getenv('GOOGLE_CLIENT_SECRET')
+    GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v1/certs')
+    GOOGLE_CERTS_REFRESH_MARGIN = int(os.getenv('GOOGLE_CERTS_REFRESH_MARGIN', '300'))  # segundos antes de expirar
+    GOOGLE_CERTS_DEFAULT_MAX_AGE = int(os.getenv('GOOGLE_CERTS_DEFAULT_MAX_AGE', '3600'))
+    # Mínimo entre descargas forzadas por un key id desconocido (segundos)
+    GOOGLE_CERTS_MIN_REFETCH_INTERVAL = float(os.getenv('GOOGLE_CERTS_MIN_REFETCH_INTERVAL', '60'))
+    GOOGLE_HTTP_TIMEOUT = int(os.getenv('GOOGLE_HTTP_TIMEOUT', '5'))
     
     # Configuración de MongoDB
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/aiwrapper')
     
+    # Pool de conexiones de MongoDB (compartido por todo el proceso)
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', '50'))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', '0'))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+    
+    # Los índices se crean con `python manage.py ensure-indexes` en cada despliegue;
+    # activar solo para desarrollo (cada worker ejecutaría el DDL al arrancar)
+    MONGODB_AUTO_CREATE_INDEXES = os.getenv('MONGODB_AUTO_CREATE_INDEXES', 'false').lower() == 'true'
+    MONGODB_RETRY_INTERVAL = int(os.getenv('MONGODB_RETRY_INTERVAL', '10'))  # segundos entre reintentos de conexión
+    
+    # Configuración del chatbot
+    CHAT_BACKEND = os.getenv('CHAT_BACKEND', 'echo')
+    CHAT_ECHO_TOKEN_DELAY = float(os.getenv('CHAT_ECHO_TOKEN_DELAY', '0'))  # segundos entre tokens
+    
+    # Canal WebSocket del chat (/chat/ws, app ASGI): heartbeat, cierre por
+    # inactividad y límites de mensajes en espera y de frames por enviar
+    WS_HEARTBEAT_INTERVAL = float(os.getenv('WS_HEARTBEAT_INTERVAL', '20'))  # segundos
+    WS_IDLE_TIMEOUT = float(os.getenv('WS_IDLE_TIMEOUT', '60'))  # segundos
+    WS_AUTH_TIMEOUT = float(os.getenv('WS_AUTH_TIMEOUT', '10'))  # segundos
+    WS_SEND_TIMEOUT = float(os.getenv('WS_SEND_TIMEOUT', '10'))  # segundos
+    WS_MAX_PENDING = int(os.getenv('WS_MAX_PENDING', '4'))
+    WS_SEND_QUEUE_SIZE = int(os.getenv('WS_SEND_QUEUE_SIZE', '64'))
+    
+    # Contexto de conversación enviado al modelo
+    CHAT_CONTEXT_MAX_TURNS = int(os.getenv('CHAT_CONTEXT_MAX_TURNS', '20'))
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '2000'))
+    CHAT_SUMMARY_TOKEN_BUDGET = int(os.getenv('CHAT_SUMMARY_TOKEN_BUDGET', '500'))
+    
+    # Caché de respuestas del chatbot (coincidencia exacta del prompt normalizado)
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+    RESPONSE_CACHE_MAX_SIZE = int(os.getenv('RESPONSE_CACHE_MAX_SIZE', '1000'))
+    RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', '86400'))  # segundos
+    RESPONSE_CACHE_PERSISTENT = os.getenv('RESPONSE_CACHE_PERSISTENT', 'false').lower() == 'true'
+    
+    # Escritura diferida (write-behind) del historial de chat
+    CHAT_WRITE_BEHIND = os.getenv('CHAT_WRITE_BEHIND', 'false').lower() == 'true'
+    CHAT_WRITE_BATCH_SIZE = int(os.getenv('CHAT_WRITE_BATCH_SIZE', '100'))
+    CHAT_WRITE_FLUSH_INTERVAL = float(os.getenv('CHAT_WRITE_FLUSH_INTERVAL', '0.5'))  # segundos
+    CHAT_WRITE_MAX_BUFFER = int(os.getenv('CHAT_WRITE_MAX_BUFFER', '10000'))
+    CHAT_WRITE_MAX_RETRIES = int(os.getenv('CHAT_WRITE_MAX_RETRIES', '3'))
+    
+    # Paginación del historial de chat
+    CHAT_HISTORY_MAX_PAGE_SIZE = int(os.getenv('CHAT_HISTORY_MAX_PAGE_SIZE', '100'))
+    
+    # Esquema del historial: 'documents' (un documento por mensaje en chat_history)
+    # o 'buckets' (hasta CHAT_BUCKET_SIZE mensajes por documento en chat_buckets)
+    CHAT_HISTORY_LAYOUT = os.getenv('CHAT_HISTORY_LAYOUT', 'documents')
+    CHAT_BUCKET_SIZE = int(os.getenv('CHAT_BUCKET_SIZE', '100'))
+    # Tamaño máximo (BSON) de los mensajes de un bucket: un documento no puede pasar de 16 MB
+    CHAT_BUCKET_MAX_BYTES = int(os.getenv('CHAT_BUCKET_MAX_BYTES', str(1024 * 1024)))
+    # La migración solo copia en la fase 'tail' los mensajes con un _id de hace
+    # más de estos segundos: antes pueden llegar mensajes con un _id anterior
+    CHAT_MIGRATION_SETTLE_SECONDS = int(os.getenv('CHAT_MIGRATION_SETTLE_SECONDS', '30'))
+    
+    # Paginación de formularios de contacto (/get-submissions)
+    FORM_SUBMISSIONS_MAX_PAGE_SIZE = int(os.getenv('FORM_SUBMISSIONS_MAX_PAGE_SIZE', '100'))
+    
+    # Búsqueda de texto (/admin/search/*): idioma de los índices de texto
+    # (stemming y palabras vacías) y máximo de resultados por página
+    SEARCH_LANGUAGE = os.getenv('SEARCH_LANGUAGE', 'spanish')
+    SEARCH_MAX_PAGE_SIZE = int(os.getenv('SEARCH_MAX_PAGE_SIZE', '50'))
+    
+    # Codificador JSON de las respuestas ('orjson' o 'json')
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+    
+    # Cola de trabajos en segundo plano ('memory' o 'mongo' para persistirla y compartirla entre workers)
+    JOBS_BACKEND = os.getenv('JOBS_BACKEND', 'memory')
+    JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', '2'))
+    JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', '5'))
+    JOBS_RETRY_BACKOFF = float(os.getenv('JOBS_RETRY_BACKOFF', '2'))  # segundos, elevado al nº de intento
+    JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', '1'))  # segundos
+    JOBS_LEASE_SECONDS = int(os.getenv('JOBS_LEASE_SECONDS', '300'))
+    SESSION_CLEANUP_INTERVAL = int(os.getenv('SESSION_CLEANUP_INTERVAL', '3600'))  # segundos
+    
+    # Compresión de respuestas (gzip, o brotli si está instalado) a partir de un tamaño mínimo
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '1024'))  # bytes
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))
+    
+    # Métricas de latencia (/metrics) y cabecera Server-Timing en las respuestas
+    SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+    
+    # Logging: nivel, formato ('json' o 'text') y escritura desde un hilo aparte
+    # cada LOG_FLUSH_INTERVAL segundos, con un buffer de LOG_QUEUE_SIZE mensajes
+    # (si se llena, se descartan)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))
+    LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '0.1'))
+    # Mensajes INFO/DEBUG frecuentes: máximo por mensaje y segundo (0 = sin límite)
+    # y muestreo por logger, p. ej. 'auth_middleware=0.01,app=0.1'
+    LOG_RATE_LIMIT = int(os.getenv('LOG_RATE_LIMIT', '50'))
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+    
+    # Administradores (emails separados por comas): acceso a /admin/export/*
+    ADMIN_EMAILS = {email.strip().lower() for email in os.getenv('ADMIN_EMAILS', '').split(',') if email.strip()}
+    
+    # Exportaciones en streaming: documentos por lote del cursor y tamaño de cada bloque enviado
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+    EXPORT_CHUNK_SIZE = int(os.getenv('EXPORT_CHUNK_SIZE', '65536'))  # bytes
+    
     # Configuración de CORS
     FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
     
@@ -0,0 +1,133 @@
+from datetime import date, datetime, timezone
+from bson import ObjectId
+from config import Config
+import csv
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Formatos de exportación y su tipo de contenido
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+# Columnas del CSV de cada exportación (NDJSON incluye el documento completo)
+CHAT_HISTORY_COLUMNS = ('_id', 'user_id', 'timestamp', 'message_type', 'message', 'metadata')
+FORM_SUBMISSION_COLUMNS = ('_id', 'timestamp', 'name', 'email', 'company', 'phone', 'service_type', 'message', 'authenticated_user')
+
+# Prefijos que una hoja de cálculo interpretaría como fórmula
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def parse_datetime(value):
+    """
+    Convierte una fecha ISO 8601 ('2024-05-01' o '2024-05-01T10:00:00Z') en un
+    datetime UTC sin zona, como los que guarda MongoDB. Lanza ValueError si no es válida
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError(f"Fecha inválida: {value}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def _csv_cell(value, dumps):
+    if value is None:
+        return ''
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return dumps(value)
+    text = str(value)
+    return "'" + text if text.startswith(_FORMULA_PREFIXES) else text
+
+def _line_formatter(export_format, columns, dumps):
+    """
+    Devuelve (cabecera, función que convierte un documento en una línea) del formato
+    """
+    if export_format != 'csv':
+        return '', lambda document: dumps(document) + '\n'
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def csv_line(values):
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    return csv_line(columns), lambda document: csv_line([_csv_cell(document.get(column), dumps) for column in columns])
+
+class _Chunker:
+    """Agrupa líneas en bloques de ~chunk_size bytes"""
+
+    def __init__(self, chunk_size):
+        self.chunk_size = chunk_size
+        self.lines = []
+        self.size = 0
+
+    def add(self, line):
+        """Añade una línea; devuelve el bloque completo si se alcanzó el tamaño"""
+        self.lines.append(line)
+        self.size += len(line)
+        if self.size >= self.chunk_size:
+            return self.flush()
+        return None
+
+    def flush(self):
+        chunk = ''.join(self.lines)
+        self.lines = []
+        self.size = 0
+        return chunk
+
+def stream_export(cursor, export_format, columns, dumps, chunk_size=None):
+    """
+    Genera la exportación en bloques de ~chunk_size bytes leyendo el cursor por
+    lotes: la memoria usada no depende del número de documentos. El cursor se
+    cierra al terminar o si el cliente corta la descarga
+    """
+    header, format_document = _line_formatter(export_format, columns, dumps)
+    chunker = _Chunker(chunk_size or Config.EXPORT_CHUNK_SIZE)
+    rows = 0
+    try:
+        if header:
+            chunker.add(header)
+        for document in cursor:
+            rows += 1
+            chunk = chunker.add(format_document(document))
+            if chunk:
+                yield chunk
+        if chunker.lines:
+            yield chunker.flush()
+        logger.info("Exportación completada: %s documentos (%s)", rows, export_format)
+    finally:
+        cursor.close()
+
+async def astream_export(cursor, export_format, columns, dumps, chunk_size=None):
+    """
+    Versión asíncrona de stream_export para los cursores de AsyncMongoDBService
+    """
+    header, format_document = _line_formatter(export_format, columns, dumps)
+    chunker = _Chunker(chunk_size or Config.EXPORT_CHUNK_SIZE)
+    rows = 0
+    try:
+        if header:
+            chunker.add(header)
+        async for document in cursor:
+            rows += 1
+            chunk = chunker.add(format_document(document))
+            if chunk:
+                yield chunk
+        if chunker.lines:
+            yield chunker.flush()
+        logger.info("Exportación completada: %s documentos (%s)", rows, export_format)
+    finally:
+        await cursor.close()
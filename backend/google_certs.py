@@ -0,0 +1,170 @@
+from config import Config
+import re
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+def parse_max_age(cache_control, default):
+    """
+    Extrae el max-age (segundos) de una cabecera Cache-Control
+    """
+    if cache_control:
+        match = _MAX_AGE_RE.search(cache_control)
+        if match:
+            return int(match.group(1))
+    return default
+
+class GoogleCertCache:
+    """
+    Caché de los certificados públicos de Google para verificar ID tokens.
+    Respeta el max-age de Cache-Control, se refresca en segundo plano antes de
+    expirar y usa una única sesión HTTP con conexiones persistentes. Las
+    descargas síncronas las hace un solo hilo cada vez y un key id desconocido
+    fuerza como mucho una descarga cada `min_refetch_interval` segundos.
+    """
+
+    def __init__(self, certs_url=None, refresh_margin=None, default_max_age=None, timeout=None,
+                 min_refetch_interval=None):
+        self.certs_url = certs_url or Config.GOOGLE_CERTS_URL
+        self.refresh_margin = refresh_margin if refresh_margin is not None else Config.GOOGLE_CERTS_REFRESH_MARGIN
+        self.default_max_age = default_max_age if default_max_age is not None else Config.GOOGLE_CERTS_DEFAULT_MAX_AGE
+        self.timeout = timeout if timeout is not None else Config.GOOGLE_HTTP_TIMEOUT
+        self.min_refetch_interval = (min_refetch_interval if min_refetch_interval is not None
+                                     else Config.GOOGLE_CERTS_MIN_REFETCH_INTERVAL)
+        # Sesión HTTP creada en la primera descarga (requests no se importa al arrancar)
+        self.session = None
+        self._certs = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+        # Serializa las descargas síncronas (los hilos que esperan reutilizan la descarga)
+        self._fetch_lock = threading.Lock()
+        self._last_forced_fetch = None
+        self._refreshing = False
+        self.fetches = 0
+        self.background_refreshes = 0
+        self.rejected_key_ids = 0
+
+    def reset_after_fork(self):
+        """
+        En un proceso hijo tras fork(): no reutiliza los sockets HTTP del padre
+        """
+        self.session = None
+        self._lock = threading.Lock()
+        self._fetch_lock = threading.Lock()
+        self._refreshing = False
+
+    def fetch(self):
+        """
+        Descarga los certificados y actualiza la caché
+        """
+        if self.session is None:
+            import requests
+            self.session = requests.Session()
+        response = self.session.get(self.certs_url, timeout=self.timeout)
+        if response.status_code != 200:
+            raise ValueError(f"No se pudieron obtener los certificados de Google: HTTP {response.status_code}")
+
+        certs = response.json()
+        max_age = parse_max_age(response.headers.get('Cache-Control'), self.default_max_age)
+
+        with self._lock:
+            self._certs = certs
+            self._expires_at = time.time() + max_age
+            self.fetches += 1
+
+        logger.info("Certificados de Google actualizados (%s claves, max-age=%ss)", len(certs), max_age)
+        return certs
+
+    def get_certs(self, key_id=None):
+        """
+        Devuelve los certificados en caché. Solo descarga de forma síncrona si la
+        caché está vacía o expirada, o si no contiene el key id solicitado
+        (rotación) y no se forzó otra descarga en los últimos
+        min_refetch_interval segundos. Si no se descarga, se devuelven los
+        certificados en caché y el token con ese key id no se puede verificar
+        """
+        with self._lock:
+            certs = self._certs
+            remaining = self._expires_at - time.time()
+
+        if certs is None or remaining <= 0:
+            return self._fetch_if_stale()
+
+        if key_id and key_id not in certs:
+            return self._fetch_for_key_id(key_id)
+
+        if remaining <= self.refresh_margin:
+            self._refresh_in_background()
+
+        return certs
+
+    def _fetch_if_stale(self):
+        """Descarga si la caché sigue vacía o expirada al obtener el lock de descarga"""
+        with self._fetch_lock:
+            with self._lock:
+                certs = self._certs
+                remaining = self._expires_at - time.time()
+            if certs is not None and remaining > 0:
+                return certs
+            return self.fetch()
+
+    def _fetch_for_key_id(self, key_id):
+        """
+        Descarga por un key id que no está en caché, como mucho una vez cada
+        min_refetch_interval segundos: cualquiera puede enviar tokens con un
+        key id inventado a /auth/google
+        """
+        with self._fetch_lock:
+            with self._lock:
+                certs = self._certs
+            if key_id in certs:
+                return certs
+
+            now = time.monotonic()
+            if self._last_forced_fetch is not None and now - self._last_forced_fetch < self.min_refetch_interval:
+                self.rejected_key_ids += 1
+                logger.debug("Key id de Google desconocido sin descarga: %s", key_id)
+                return certs
+
+            self._last_forced_fetch = now
+            return self.fetch()
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def refresh():
+            try:
+                self.fetch()
+                self.background_refreshes += 1
+            except Exception as e:
+                logger.warning(f"Error refrescando certificados de Google: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=refresh, name='google-certs-refresh', daemon=True).start()
+
+    def invalidate(self):
+        with self._lock:
+            self._certs = None
+            self._expires_at = 0.0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'cached_keys': len(self._certs) if self._certs else 0,
+                'expires_in': max(0.0, self._expires_at - time.time()),
+                'fetches': self.fetches,
+                'background_refreshes': self.background_refreshes,
+                'rejected_key_ids': self.rejected_key_ids
+            }
+
+# Caché compartida por todo el proceso
+google_cert_cache = GoogleCertCache()
@@ -0,0 +1,66 @@
+"""
+Configuración de Gunicorn para producción (varios workers pre-fork):
+
+    cd backend
+    python manage.py ensure-indexes
+    gunicorn -c gunicorn.conf.py app:app
+
+La app se importa una sola vez en el master (preload) y los workers la heredan
+con fork(). Importar la app no abre conexiones, y services.py descarta en cada
+worker el cliente de MongoDB y los hilos que pudiera haber heredado, así que cada
+worker crea su propio MongoClient con un pool dimensionado para sus hilos.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', str(multiprocessing.cpu_count())))
+
+# Hilos por worker: las requests esperan sobre todo a MongoDB y al modelo
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+preload_app = True
+
+# Apagado ordenado: los workers terminan las requests en curso antes de salir
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Reciclar workers periódicamente (0 = nunca)
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '0'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '0'))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG')
+errorlog = '-'
+
+def worker_pool_size():
+    """
+    Conexiones de MongoDB por worker: un hilo de requests por conexión más los
+    hilos de fondo (cola de trabajos, lista de revocación y escritor diferido).
+    MONGODB_MAX_POOL_SIZE, si está definido, tiene prioridad
+    """
+    from config import Config
+
+    if 'MONGODB_MAX_POOL_SIZE' in os.environ:
+        return Config.MONGODB_MAX_POOL_SIZE
+    return threads + Config.JOBS_WORKERS + 2
+
+def when_ready(server):
+    pool_size = worker_pool_size()
+    server.log.info(
+        f"{workers} workers x {threads} hilos; pool de MongoDB de {pool_size} conexiones "
+        f"por worker ({workers * pool_size} en total)"
+    )
+
+def post_fork(server, worker):
+    from config import Config
+
+    Config.MONGODB_MAX_POOL_SIZE = worker_pool_size()
+
+def worker_exit(server, worker):
+    import log_config
+    from services import services
+
+    services.shutdown()
+    log_config.stop_logging()
@@ -0,0 +1,135 @@
+from datetime import timezone
+from flask import Response, request
+from config import Config
+import gzip
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional (sin él solo se ofrece gzip)
+    brotli = None
+
+# Tipos de contenido que merece la pena comprimir
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/plain', 'text/csv', 'application/x-ndjson')
+
+def make_etag(*parts):
+    """
+    Valor del ETag (se envía como débil) derivado de la versión de los datos y de
+    los parámetros de la consulta, no del cuerpo: se calcula sin serializar la respuesta
+    """
+    digest = hashlib.sha1('\x00'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+def _http_date(value):
+    """Trunca a segundos (resolución de Last-Modified) y marca como UTC"""
+    return value.replace(microsecond=0, tzinfo=timezone.utc) if value else None
+
+def is_not_modified(etag, last_modified=None, current_request=None):
+    """
+    Evalúa If-None-Match (prioritario) o If-Modified-Since contra los validadores.
+    If-Modified-Since solo tiene resolución de segundos y last_modified de
+    milisegundos: un mensaje nuevo en el mismo segundo que el anterior no cambia
+    la fecha, así que solo se responde 304 si el último cambio es de un segundo
+    anterior al del header. `current_request` permite usarlo con la request de
+    Quart (asgi_app.py)
+    """
+    current_request = current_request or request
+    if current_request.if_none_match:
+        return current_request.if_none_match.contains_weak(etag)
+    if last_modified is not None and current_request.if_modified_since:
+        return _http_date(last_modified) < current_request.if_modified_since
+    return False
+
+def with_validators(response, etag, last_modified=None):
+    """
+    Añade ETag y Last-Modified; el cliente debe revalidar en cada petición
+    """
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified_response(etag, last_modified=None, response_class=Response):
+    """
+    Respuesta 304 sin cuerpo
+    """
+    return with_validators(response_class(status=304), etag, last_modified)
+
+def choose_encoding(accept_encoding):
+    """
+    Elige la codificación según Accept-Encoding (brotli si está disponible, si no gzip)
+    """
+    if brotli is not None and accept_encoding['br']:
+        return 'br'
+    if accept_encoding['gzip']:
+        return 'gzip'
+    return None
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=Config.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+def _should_compress(response):
+    return not (response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES)
+
+def init_app(app):
+    """
+    Registra la compresión negociada (gzip/brotli) de las respuestas que
+    superan COMPRESSION_MIN_SIZE. Las respuestas en streaming (SSE) no se comprimen
+    """
+    @app.after_request
+    def compress_response(response):
+        if not Config.COMPRESSION_ENABLED:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if response.is_streamed or response.direct_passthrough or not _should_compress(response):
+            return response
+
+        encoding = choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < Config.COMPRESSION_MIN_SIZE:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+def init_async_app(app):
+    """
+    Equivalente de init_app para la app ASGI (Quart, asgi_app.py). Solo se
+    comprimen los cuerpos ya en memoria, no los generados en streaming
+    """
+    from quart import request as async_request
+    from quart.wrappers.response import DataBody
+
+    @app.after_request
+    async def compress_response(response):
+        if not Config.COMPRESSION_ENABLED:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        if not isinstance(response.response, DataBody) or not _should_compress(response):
+            return response
+
+        encoding = choose_encoding(async_request.accept_encodings)
+        if encoding is None:
+            return response
+
+        data = await response.get_data()
+        if len(data) < Config.COMPRESSION_MIN_SIZE:
+            return response
+
+        response.set_data(compress(data, encoding))
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,351 @@
+from datetime import datetime, timedelta
+from config import Config
+from metrics import Histogram
+from log_config import bind_request_id, get_request_id, unbind_request_id
+import atexit
+import heapq
+import itertools
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+job_wait = Histogram(
+    'aiwrapper_job_wait_seconds',
+    'Tiempo desde que un trabajo está listo hasta que empieza a ejecutarse',
+    ('job',)
+)
+job_duration = Histogram(
+    'aiwrapper_job_duration_seconds',
+    'Duración de la ejecución de los trabajos en segundo plano',
+    ('job', 'status')
+)
+
+class MemoryJobBackend:
+    """
+    Cola de trabajos en memoria (se pierde al reiniciar el proceso)
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._last_slots = {}
+
+    def push(self, job, dedupe_key=None):
+        with self._lock:
+            if dedupe_key:
+                # Solo se recuerda el último intervalo encolado de cada trabajo periódico
+                base = dedupe_key.rsplit(':', 1)[0]
+                if self._last_slots.get(base) == dedupe_key:
+                    return False
+                self._last_slots[base] = dedupe_key
+                job['_id'] = dedupe_key
+            heapq.heappush(self._heap, (job['run_at'], next(self._counter), job))
+            return True
+
+    def claim(self):
+        with self._lock:
+            if self._heap and self._heap[0][0] <= datetime.utcnow():
+                return heapq.heappop(self._heap)[2]
+            return None
+
+    def complete(self, job):
+        pass
+
+    def retry(self, job, run_at, error):
+        job['run_at'] = run_at
+        job['last_error'] = error
+        self.push(job)
+
+    def fail(self, job, error):
+        job['last_error'] = error
+
+    def depth(self):
+        with self._lock:
+            return len(self._heap)
+
+class MongoJobBackend:
+    """
+    Cola de trabajos persistida en la colección jobs: sobrevive a reinicios y la
+    comparten todos los workers (cada trabajo se reclama de forma atómica)
+    """
+
+    name = 'mongo'
+
+    def __init__(self, db_service, lease_seconds=None):
+        self.db_service = db_service
+        self.lease_seconds = lease_seconds or Config.JOBS_LEASE_SECONDS
+
+    def push(self, job, dedupe_key=None):
+        if dedupe_key:
+            job['_id'] = dedupe_key
+        return self.db_service.enqueue_job(job)
+
+    def claim(self):
+        return self.db_service.claim_job(timedelta(seconds=self.lease_seconds))
+
+    def complete(self, job):
+        self._check_lease(job, self.db_service.finish_job(job['_id'], job['lease_id'], 'done'))
+
+    def retry(self, job, run_at, error):
+        self._check_lease(job, self.db_service.retry_job(job['_id'], job['lease_id'], run_at, error))
+
+    def fail(self, job, error):
+        self._check_lease(job, self.db_service.finish_job(job['_id'], job['lease_id'], 'failed', error))
+
+    def _check_lease(self, job, updated):
+        if not updated:
+            logger.warning(f"Trabajo {job['name']} ({job['_id']}) reclamado por otro worker al expirar su lease; "
+                           f"no se actualiza su estado (JOBS_LEASE_SECONDS={self.lease_seconds})")
+
+    def depth(self):
+        return self.db_service.count_pending_jobs()
+
+class JobQueue:
+    """
+    Cola de trabajos en segundo plano con un pool de hilos, reintentos con
+    backoff exponencial y trabajos periódicos. Las rutas encolan con
+    enqueue(nombre, **kwargs) y responden de inmediato. Los trabajos
+    registrados con persistent=False van siempre a una cola en memoria del
+    proceso: encolarlos no escribe en MongoDB aunque el backend sea 'mongo'.
+    """
+
+    def __init__(self, backend=None, workers=None, max_attempts=None, retry_backoff=None, poll_interval=None):
+        self.backend = backend or MemoryJobBackend()
+        self.local_backend = self.backend if self.backend.name == 'memory' else MemoryJobBackend()
+        self.workers = workers or Config.JOBS_WORKERS
+        self.max_attempts = max_attempts or Config.JOBS_MAX_ATTEMPTS
+        self.retry_backoff = retry_backoff or Config.JOBS_RETRY_BACKOFF
+        self.poll_interval = poll_interval or Config.JOBS_POLL_INTERVAL
+        self._handlers = {}
+        self._local_tasks = set()
+        self._periodic = []
+        self._threads = []
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def task(self, name, persistent=True):
+        """
+        Decorador que registra una función como manejador de trabajos. Con
+        persistent=False el trabajo se encola en memoria (se pierde si el
+        proceso termina antes de ejecutarlo)
+        """
+        def decorator(f):
+            self._handlers[name] = f
+            if not persistent:
+                self._local_tasks.add(name)
+            return f
+        return decorator
+
+    def _backend_for(self, name):
+        return self.local_backend if name in self._local_tasks else self.backend
+
+    def enqueue(self, name, delay=0, **kwargs):
+        """
+        Encola un trabajo (los kwargs deben ser serializables en BSON)
+        """
+        if name not in self._handlers:
+            raise ValueError(f"Trabajo desconocido: {name}")
+
+        now = datetime.utcnow()
+        job = {
+            '_id': uuid.uuid4().hex,
+            'name': name,
+            'kwargs': kwargs,
+            'attempts': 0,
+            'enqueued_at': now,
+            'run_at': now + timedelta(seconds=delay)
+        }
+        # Los logs del trabajo llevan el id de la request que lo encoló
+        request_id = get_request_id()
+        if request_id:
+            job['request_id'] = request_id
+        self._backend_for(name).push(job)
+        self._wakeup.set()
+        return job['_id']
+
+    def schedule(self, name, interval, **kwargs):
+        """
+        Programa un trabajo periódico cada `interval` segundos. Con el backend
+        persistente cada intervalo se encola una sola vez entre todos los workers
+        """
+        self._periodic.append((name, interval, kwargs))
+
+    def start(self):
+        """
+        Arranca los hilos de trabajo y el planificador de trabajos periódicos
+        """
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        if self._periodic:
+            thread = threading.Thread(target=self._schedule_periodic, name='job-scheduler', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        atexit.register(self.stop)
+        logger.info("Cola de trabajos iniciada (%s, %s hilos)", self.backend.name, self.workers)
+
+    def stop(self, timeout=10):
+        """
+        Deja de reclamar trabajos y espera a que terminen los que están en curso
+        """
+        if not self._threads:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _schedule_periodic(self):
+        while not self._stopping.is_set():
+            now = time.time()
+            for name, interval, kwargs in self._periodic:
+                slot = int(now // interval)
+                job = {
+                    'name': name,
+                    'kwargs': kwargs,
+                    'attempts': 0,
+                    'enqueued_at': datetime.utcnow(),
+                    'run_at': datetime.utcnow()
+                }
+                try:
+                    if self.backend.push(job, dedupe_key=f"periodic:{name}:{slot}"):
+                        self._wakeup.set()
+                except Exception as e:
+                    logger.warning(f"Error programando trabajo periódico {name}: {str(e)}")
+            self._stopping.wait(min(interval for _, interval, _ in self._periodic))
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                job = None
+                if self.local_backend is not self.backend:
+                    job = self.local_backend.claim()
+                if job is None:
+                    job = self.backend.claim()
+            except Exception as e:
+                logger.warning(f"Error reclamando trabajo: {str(e)}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                self._run(job)
+            except Exception as e:
+                # Un error inesperado no debe terminar el hilo: los siguientes trabajos seguirían sin ejecutarse
+                logger.error(f"Error ejecutando trabajo {job.get('name')}: {str(e)}")
+
+    def _run(self, job):
+        name = job['name']
+        backend = self._backend_for(name)
+        job_wait.observe((name,), max(0.0, (datetime.utcnow() - job['run_at']).total_seconds()))
+        handler = self._handlers.get(name)
+
+        if job.get('attempts', 0) >= self.max_attempts:
+            # Reclamado tras expirar su lease en cada intento (el worker murió o el
+            # trabajo tarda más que JOBS_LEASE_SECONDS): no se vuelve a ejecutar
+            error = f"Lease expirado en {job['attempts']} intentos"
+            try:
+                backend.fail(job, error)
+            except Exception as e:
+                logger.warning(f"Error descartando trabajo {name}: {str(e)}")
+            with self._lock:
+                self.failed += 1
+            logger.error(f"Trabajo {name} descartado: {error}")
+            return
+
+        with self._lock:
+            self.running += 1
+        started_at = time.perf_counter()
+        request_id_token = bind_request_id(job.get('request_id'))
+        try:
+            if handler is None:
+                raise ValueError(f"Trabajo desconocido: {name}")
+            handler(**job.get('kwargs', {}))
+            status = 'done'
+            with self._lock:
+                self.completed += 1
+        except Exception as e:
+            attempts = job.get('attempts', 0) + 1
+            job['attempts'] = attempts
+            if attempts < self.max_attempts and handler is not None:
+                run_at = datetime.utcnow() + timedelta(seconds=self.retry_backoff ** attempts)
+                try:
+                    backend.retry(job, run_at, str(e))
+                except Exception as backend_error:
+                    # Con el backend persistente se vuelve a reclamar al expirar su lease
+                    logger.warning(f"Error reprogramando trabajo {name}: {str(backend_error)}")
+                status = 'retry'
+                with self._lock:
+                    self.retried += 1
+                logger.warning(f"Trabajo {name} falló (intento {attempts}), se reintentará: {str(e)}")
+            else:
+                try:
+                    backend.fail(job, str(e))
+                except Exception as backend_error:
+                    logger.warning(f"Error descartando trabajo {name}: {str(backend_error)}")
+                status = 'failed'
+                with self._lock:
+                    self.failed += 1
+                logger.error(f"Trabajo {name} descartado tras {attempts} intentos: {str(e)}")
+        else:
+            # Fuera del try del manejador: si falla, el trabajo ya se ejecutó y
+            # reintentarlo ahora repetiría sus efectos (p. ej. track_event). Con
+            # el backend persistente queda 'running' hasta que expire su lease
+            try:
+                backend.complete(job)
+            except Exception as e:
+                logger.error(f"Error marcando trabajo {name} como terminado: {str(e)}")
+        finally:
+            unbind_request_id(request_id_token)
+            with self._lock:
+                self.running -= 1
+
+        job_duration.observe((name, status), time.perf_counter() - started_at)
+
+    def stats(self):
+        """
+        Devuelve profundidad de la cola y contadores de ejecución
+        """
+        try:
+            depth = self.backend.depth()
+            if self.local_backend is not self.backend:
+                depth += self.local_backend.depth()
+        except Exception:
+            depth = None
+        with self._lock:
+            return {
+                'backend': self.backend.name,
+                'workers': self.workers,
+                'queue_depth': depth,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'retried': self.retried
+            }
+
+def create_job_queue(db_service):
+    """
+    Crea la cola con el backend configurado en Config.JOBS_BACKEND
+    """
+    if Config.JOBS_BACKEND == 'mongo' and db_service:
+        return JobQueue(MongoJobBackend(db_service))
+    return JobQueue(MemoryJobBackend())
@@ -0,0 +1,90 @@
+from datetime import date, datetime
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+from config import Config
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional
+    orjson = None
+
+def _default(value):
+    """
+    Serializa los tipos de MongoDB que la librería json no conoce
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Objeto de tipo {type(value).__name__} no serializable a JSON")
+
+def public_documents(documents):
+    """
+    Documentos de MongoDB como los devuelve la API: el `_id` se publica como
+    `id` (el proveedor JSON serializa el ObjectId y los datetime)
+    """
+    public = []
+    for document in documents:
+        document = dict(document)
+        if '_id' in document:
+            document['id'] = document.pop('_id')
+        public.append(document)
+    return public
+
+class MongoJSONProvider(DefaultJSONProvider):
+    """
+    Proveedor JSON de Flask (librería estándar) con soporte para ObjectId y datetime
+    """
+
+    name = 'json'
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        kwargs.setdefault('default', _default)
+        kwargs.setdefault('ensure_ascii', False)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+class OrjsonProvider(MongoJSONProvider):
+    """
+    Proveedor JSON de Flask basado en orjson: serializa datetime de forma nativa
+    y ObjectId mediante `default`
+    """
+
+    name = 'orjson'
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+# Proveedores disponibles, por nombre (Config.JSON_PROVIDER)
+JSON_PROVIDERS = {
+    MongoJSONProvider.name: MongoJSONProvider,
+    OrjsonProvider.name: OrjsonProvider
+}
+
+def get_json_provider_class(name=None):
+    """
+    Devuelve la clase de proveedor JSON configurada, o la estándar si orjson
+    no está instalado
+    """
+    name = name or Config.JSON_PROVIDER
+    if name == OrjsonProvider.name and orjson is None:
+        logger.warning("orjson no está instalado; se usa el codificador JSON estándar")
+        name = MongoJSONProvider.name
+
+    provider_class = JSON_PROVIDERS.get(name)
+    if provider_class is None:
+        raise ValueError(f"Proveedor JSON desconocido: {name}")
+    return provider_class
@@ -0,0 +1,359 @@
+"""
+Configuración del logging de la app: salida JSON (o texto) escrita desde un hilo
+aparte, id de request en cada mensaje y muestreo / límite por segundo de los
+mensajes frecuentes.
+
+En el hilo de la request solo se filtra el mensaje, se resuelven sus argumentos
+y se guarda en un buffer; el formato y la escritura en stderr los hace un hilo
+aparte, por lotes. Los mensajes usan el estilo `logger.info("... %s", valor)`:
+el muestreo y el límite por segundo agrupan por la plantilla del mensaje, y no
+se formatea nada si el nivel está desactivado.
+"""
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from collections import deque
+from config import Config
+import atexit
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'
+
+# Ids de request aceptados del cliente o del proxy (si no, se genera uno)
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._:-]{1,64}$')
+
+# Máximo de mensajes distintos con contador de límite por segundo
+_MAX_RATE_KEYS = 1000
+
+# Id de la request (o del trabajo en segundo plano) en curso. Es un ContextVar
+# para que sirva igual con un hilo por request (WSGI) y una tarea por request (ASGI)
+_request_id = ContextVar('request_id', default=None)
+
+def get_request_id():
+    """
+    Id de la request en curso, o None fuera de una request
+    """
+    return _request_id.get()
+
+def bind_request_id(request_id):
+    """
+    Asocia un id a los mensajes del contexto actual; devuelve el token para
+    restaurar el anterior con unbind_request_id
+    """
+    return _request_id.set(request_id)
+
+def unbind_request_id(token):
+    _request_id.reset(token)
+
+def request_id_from(header_value):
+    """
+    Usa el X-Request-ID recibido si es válido; si no, genera uno
+    """
+    if header_value and _VALID_REQUEST_ID.match(header_value):
+        return header_value
+    return uuid.uuid4().hex
+
+def parse_sample_rates(value):
+    """
+    Convierte 'auth_middleware=0.01,app=0.5' en {'auth_middleware': 0.01, 'app': 0.5}
+    """
+    rates = {}
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+class RequestContextFilter(logging.Filter):
+    """Añade el id de la request en curso (se ejecuta en el hilo que registra el mensaje)"""
+
+    def filter(self, record):
+        record.request_id = _request_id.get() or '-'
+        return True
+
+class SamplingFilter(logging.Filter):
+    """
+    Muestreo por logger (LOG_SAMPLING) y límite de mensajes por segundo para cada
+    mensaje (LOG_RATE_LIMIT), solo para niveles por debajo de WARNING. El límite
+    agrupa por plantilla (record.msg), así que solo es efectivo con mensajes
+    '... %s', no con f-strings. El primer mensaje que pasa tras un segundo
+    limitado indica cuántos se descartaron (`suppressed`)
+    """
+
+    def __init__(self, sample_rates=None, rate_limit=0):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limit = rate_limit
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _sample_rate(self, name):
+        while name:
+            if name in self.sample_rates:
+                return self.sample_rates[name]
+            name = name.rpartition('.')[0]
+        return 1.0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        if self.sample_rates:
+            rate = self._sample_rate(record.name)
+            if rate < 1.0:
+                if random.random() >= rate:
+                    return False
+                record.sample_rate = rate
+
+        if self.rate_limit:
+            key = (record.name, record.msg)
+            second = int(record.created)
+            with self._lock:
+                window = self._windows.get(key)
+                if window is None or window[0] != second:
+                    if window is None and len(self._windows) >= _MAX_RATE_KEYS:
+                        self._windows.clear()
+                    if window and window[2]:
+                        record.suppressed = window[2]
+                    self._windows[key] = [second, 1, 0]
+                elif window[1] >= self.rate_limit:
+                    window[2] += 1
+                    return False
+                else:
+                    window[1] += 1
+        return True
+
+    def reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por mensaje"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        request_id = getattr(record, 'request_id', '-')
+        if request_id != '-':
+            entry['request_id'] = request_id
+        for key in ('sample_rate', 'suppressed'):
+            if hasattr(record, key):
+                entry[key] = getattr(record, key)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry['stack_info'] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class BufferedLogHandler(logging.Handler):
+    """
+    Handler del hilo de la request: resuelve el mensaje y lo añade a un buffer
+    en memoria sin bloquear (si está lleno, el mensaje se descarta y se cuenta).
+    Un hilo aparte escribe el buffer por lotes cada LOG_FLUSH_INTERVAL segundos,
+    con una sola escritura por lote. A diferencia de QueueHandler/QueueListener,
+    registrar un mensaje no despierta al hilo de escritura
+    """
+
+    def __init__(self, output, max_size, flush_interval):
+        super().__init__()
+        self.output = output
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.records = deque()
+        self.dropped = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def handle(self, record):
+        # deque.append es atómico: no hace falta el lock del handler
+        if not self.filter(record):
+            return False
+        if self._thread is None:
+            # Sin hilo de escritura (tras stop_logging) se escribe directamente
+            self.output.handle(record)
+            return True
+        if len(self.records) >= self.max_size:
+            self.dropped += 1
+            return True
+
+        # Los argumentos pueden cambiar después de registrar el mensaje. Es el
+        # último handler que ve el registro, así que no hace falta copiarlo
+        record.msg = record.getMessage()
+        record.args = None
+        self.records.append(record)
+        if len(self.records) >= self.max_size // 2:
+            self._wakeup.set()
+        return True
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join()
+        self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self):
+        """Escribe en la salida los mensajes acumulados"""
+        lines = []
+        while True:
+            try:
+                record = self.records.popleft()
+            except IndexError:
+                break
+            try:
+                lines.append(self.output.format(record))
+            except Exception:
+                self.output.handleError(record)
+        if not lines:
+            return
+        self.output.acquire()
+        try:
+            self.output.stream.write('\n'.join(lines) + '\n')
+            self.output.flush()
+        except Exception:
+            logging.raiseExceptions and sys.stderr.write('Error escribiendo los logs\n')
+        finally:
+            self.output.release()
+
+    def reset_after_fork(self):
+        # Los mensajes del buffer heredado los escribe el proceso padre
+        self.records = deque()
+        self.dropped = 0
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        if self._thread is not None:
+            self.start()
+
+_handler = None
+_sampling_filter = None
+
+def _output_handler():
+    output = logging.StreamHandler(sys.stderr)
+    if Config.LOG_FORMAT == 'json':
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return output
+
+def configure_logging():
+    """
+    Sustituye los handlers del logger raíz (como logging.basicConfig) por el
+    handler de la app. Es idempotente: app.py y asgi_app.py lo llaman al importarse
+    """
+    global _handler, _sampling_filter
+    if _handler is not None:
+        return
+
+    output = _output_handler()
+    _sampling_filter = SamplingFilter(parse_sample_rates(Config.LOG_SAMPLING), Config.LOG_RATE_LIMIT)
+    if Config.LOG_ASYNC:
+        _handler = BufferedLogHandler(output, Config.LOG_QUEUE_SIZE, Config.LOG_FLUSH_INTERVAL)
+        _handler.start()
+    else:
+        _handler = output
+    _handler.addFilter(RequestContextFilter())
+    _handler.addFilter(_sampling_filter)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_handler)
+    root.setLevel(Config.LOG_LEVEL)
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """
+    Escribe los mensajes pendientes y detiene el hilo de escritura; los mensajes
+    posteriores se escriben en el hilo que los registra
+    """
+    if isinstance(_handler, BufferedLogHandler):
+        _handler.stop()
+
+def logging_stats():
+    """
+    Estado del buffer de logging (None si se escribe de forma síncrona)
+    """
+    if not isinstance(_handler, BufferedLogHandler):
+        return None
+    return {'buffered': len(_handler.records), 'dropped': _handler.dropped}
+
+def reset_after_fork():
+    """
+    El hilo de escritura no sobrevive a fork(): el proceso hijo arranca el suyo
+    """
+    if _sampling_filter is not None:
+        _sampling_filter.reset_after_fork()
+    if isinstance(_handler, BufferedLogHandler):
+        _handler.reset_after_fork()
+
+def init_app(app):
+    """
+    Asigna un id a cada request (X-Request-ID recibido o uno nuevo), lo añade a
+    sus mensajes de log y lo devuelve en la respuesta
+    """
+    from flask import g, request
+
+    @app.before_request
+    def bind_request():
+        g.request_id = request_id_from(request.headers.get(REQUEST_ID_HEADER))
+        bind_request_id(g.request_id)
+
+    @app.after_request
+    def add_request_id_header(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
+
+    @app.teardown_request
+    def unbind_request(exc):
+        # El hilo atenderá otras requests: los mensajes fuera de ellas no llevan id
+        _request_id.set(None)
+
+def init_async_app(app):
+    """
+    Equivalente de init_app para la app ASGI (Quart, asgi_app.py): cada request
+    es una tarea con su propio contexto, así que no hace falta restaurarlo
+    """
+    from quart import g as async_g, request as async_request
+
+    @app.before_request
+    async def bind_request():
+        async_g.request_id = request_id_from(async_request.headers.get(REQUEST_ID_HEADER))
+        bind_request_id(async_g.request_id)
+
+    @app.after_request
+    async def add_request_id_header(response):
+        if 'request_id' in async_g:
+            response.headers[REQUEST_ID_HEADER] = async_g.request_id
+        return response
+
+os.register_at_fork(after_in_child=reset_after_fork)
@@ -0,0 +1,85 @@
+"""
+Comandos de mantenimiento. Se ejecutan una vez por despliegue, fuera de los workers.
+
+Uso (desde backend/):
+    python manage.py ensure-indexes   # crea los índices que falten
+    python manage.py check-indexes    # lista los que faltan (sale con código 1 si hay alguno)
+    python manage.py migrate-chat-buckets [--batch-size N] [--final]
+                                      # copia chat_history a chat_buckets (se puede repetir)
+"""
+import argparse
+import logging
+import sys
+import time
+
+from config import Config
+from mongodb_service import MongoDBService
+
+def ensure_indexes(db_service, args):
+    db_service.ensure_indexes()
+    print("✅ Índices de MongoDB creados")
+    return 0
+
+def check_indexes(db_service, args):
+    missing = db_service.missing_indexes()
+    if not missing:
+        print("✅ Todos los índices de MongoDB existen")
+        return 0
+
+    print(f"❌ Faltan {len(missing)} índices (ejecuta `python manage.py ensure-indexes`):")
+    for collection_name, keys, options in missing:
+        print(f"   - {collection_name} {keys} {options or ''}")
+    return 1
+
+def _migrate_chat_bucket_batches(db_service, batch_size, settle_seconds=None):
+    # Termina con el primer lote que no copia nada ni cambia de fase
+    while True:
+        state = db_service.get_chat_buckets_migration()
+        phase = state['phase'] if state else None
+        migrated = db_service.migrate_chat_history_batch(batch_size, settle_seconds)
+        state = db_service.get_chat_buckets_migration()
+        if not migrated and state['phase'] == phase:
+            return state
+        print(f"   {state['migrated']} mensajes copiados (fase {state['phase']})")
+
+def migrate_chat_buckets(db_service, args):
+    if not args.final:
+        # Online: la app puede seguir en marcha con CHAT_HISTORY_LAYOUT=documents.
+        # Los mensajes de los últimos CHAT_MIGRATION_SETTLE_SECONDS quedan para la siguiente ejecución
+        state = _migrate_chat_bucket_batches(db_service, args.batch_size)
+        print(f"✅ Historial migrado a chat_buckets: {state['migrated']} mensajes")
+        print("   Tras activar CHAT_HISTORY_LAYOUT=buckets en todos los workers, ejecuta "
+              "`python manage.py migrate-chat-buckets --final` para copiar los últimos mensajes")
+        return 0
+    
+    # Con todos los workers en buckets ya no se escribe en chat_history: pasado
+    # el margen, los mensajes pendientes ya están insertados y se copian todos
+    print(f"   Esperando {Config.CHAT_MIGRATION_SETTLE_SECONDS}s a los últimos mensajes de chat_history...")
+    time.sleep(Config.CHAT_MIGRATION_SETTLE_SECONDS)
+    state = _migrate_chat_bucket_batches(db_service, args.batch_size, settle_seconds=0)
+    print(f"✅ Historial migrado a chat_buckets: {state['migrated']} mensajes")
+    return 0
+
+COMMANDS = {
+    'ensure-indexes': ensure_indexes,
+    'check-indexes': check_indexes,
+    'migrate-chat-buckets': migrate_chat_buckets
+}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=COMMANDS)
+    parser.add_argument('--batch-size', type=int, default=1000, help='mensajes por lote (migrate-chat-buckets)')
+    parser.add_argument('--final', action='store_true',
+                        help='migrate-chat-buckets tras activar CHAT_HISTORY_LAYOUT=buckets: copia también los últimos mensajes')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db_service = MongoDBService(create_indexes=False)
+    try:
+        return COMMANDS[args.command](db_service, args)
+    finally:
+        db_service.close()
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from flask import Response, g, request
+from config import Config
+import inspect
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Límites de los buckets (segundos), al estilo de los histogramas de Prometheus
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Histogramas registrados (se exportan todos en /metrics)
+_registry = []
+
+class Histogram:
+    """
+    Histograma con etiquetas y buckets fijos, exportable en formato Prometheus
+    """
+
+    def __init__(self, name, description, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.description}",
+            f"# TYPE {self.name} histogram"
+        ]
+        with self._lock:
+            series_items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+
+        for labels, (counts, total, count) in series_items:
+            label_text = ','.join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return '\n'.join(lines)
+
+request_duration = Histogram(
+    'aiwrapper_request_duration_seconds',
+    'Duración de las requests HTTP por ruta',
+    ('route', 'method', 'status')
+)
+span_duration = Histogram(
+    'aiwrapper_span_duration_seconds',
+    'Duración de las operaciones internas (AuthService, MongoDBService)',
+    ('span',)
+)
+
+# Spans de la request en curso (para Server-Timing). Es un ContextVar y no `g`
+# para que sirva igual en la app WSGI (un hilo por request) y en la ASGI (una
+# tarea por request); fuera de una request vale None
+_request_spans = ContextVar('request_spans', default=None)
+
+def record_span(name, duration):
+    """
+    Registra la duración de un span en el histograma y en la request actual
+    (para la cabecera Server-Timing)
+    """
+    span_duration.observe((name,), duration)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans[name] = spans.get(name, 0.0) + duration
+
+@contextmanager
+def span(name):
+    """
+    Context manager que mide un bloque de código como span
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+def timed(name):
+    """
+    Decorador que mide cada llamada a la función como un span (también en
+    corrutinas, donde se mide hasta que la corrutina termina)
+    """
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await f(*args, **kwargs)
+                finally:
+                    record_span(name, time.perf_counter() - start)
+            return async_wrapper
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                record_span(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+def render_metrics():
+    """
+    Devuelve todas las métricas en formato de texto de Prometheus
+    """
+    return '\n'.join(histogram.render() for histogram in _registry) + '\n'
+
+def _server_timing_header(spans, total):
+    parts = [f"{name};dur={duration * 1000:.2f}" for name, duration in spans.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ', '.join(parts)
+
+def _record_request(current_request, response, started_at):
+    duration = time.perf_counter() - started_at
+    route = current_request.url_rule.rule if current_request.url_rule else 'unmatched'
+    request_duration.observe((route, current_request.method, str(response.status_code)), duration)
+
+    spans = _request_spans.get()
+    _request_spans.set(None)
+    if Config.SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = _server_timing_header(spans or {}, duration)
+    return response
+
+def init_app(app):
+    """
+    Registra la medición por request, la cabecera Server-Timing opcional
+    y el endpoint /metrics
+    """
+    @app.before_request
+    def start_request_timer():
+        g.request_started_at = time.perf_counter()
+        _request_spans.set({})
+
+    @app.after_request
+    def record_request_duration(response):
+        started_at = g.get('request_started_at')
+        if started_at is None:
+            return response
+        return _record_request(request, response, started_at)
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Endpoint con las métricas de latencia en formato Prometheus"""
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def init_async_app(app):
+    """
+    Equivalente de init_app para la app ASGI (Quart, asgi_app.py): los hooks
+    son corrutinas para que Quart no los ejecute en un hilo aparte
+    """
+    from quart import Response as AsyncResponse, g as async_g, request as async_request
+
+    @app.before_request
+    async def start_request_timer():
+        async_g.request_started_at = time.perf_counter()
+        _request_spans.set({})
+
+    @app.after_request
+    async def record_request_duration(response):
+        started_at = async_g.get('request_started_at')
+        if started_at is None:
+            return response
+        return _record_request(async_request, response, started_at)
+
+    @app.route('/metrics', methods=['GET'])
+    async def metrics():
+        """Endpoint con las métricas de latencia en formato Prometheus"""
+        return AsyncResponse(render_metrics(), mimetype='text/plain; version=0.0.4')
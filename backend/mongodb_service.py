@@ -1,25 +1,656 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from bson import ObjectId, encode as bson_encode
 from datetime import datetime, timedelta
 from config import Config
+from auth_cache import principal_cache
+from chat_writer import ChatMessageWriter
+from metrics import timed
+import base64
+import json
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+_EPOCH = datetime(1970, 1, 1)
+
+def position_key(timestamp, document_id):
+    """
+    Clave de orden (timestamp en ms, _id) usada por la paginación por cursor.
+    MongoDB guarda los datetime con precisión de milisegundos
+    """
+    millis = (timestamp.replace(tzinfo=None) - _EPOCH) // timedelta(milliseconds=1)
+    return millis, document_id
+
+def document_position(document):
+    """
+    Clave de orden de un documento con timestamp y _id
+    """
+    return position_key(document['timestamp'], document['_id'])
+
+def _before_position(timestamp, document_id):
+    # Condición de keyset: documentos anteriores a (timestamp, _id)
+    return [
+        {'timestamp': {'$lt': timestamp}},
+        {'timestamp': timestamp, '_id': {'$lt': document_id}}
+    ]
+
+def _time_range(since=None, until=None):
+    """Filtro [since, until) sobre timestamp, o None si no hay límites"""
+    time_range = {}
+    if since:
+        time_range['$gte'] = since
+    if until:
+        time_range['$lt'] = until
+    return time_range or None
+
+def encode_page_cursor(timestamp, document_id):
+    """
+    Codifica la posición (timestamp, _id) de un documento como un cursor opaco
+    """
+    millis, document_id = position_key(timestamp, document_id)
+    raw = json.dumps([millis, str(document_id)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_page_cursor(cursor):
+    """
+    Decodifica un cursor de paginación. Lanza ValueError si no es válido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        millis, document_id = json.loads(raw)
+        return _EPOCH + timedelta(milliseconds=int(millis)), ObjectId(document_id)
+    except Exception:
+        raise ValueError('Cursor de paginación inválido')
+
+def encode_search_cursor(score, document_id):
+    """
+    Codifica la posición (relevancia, _id) de un resultado de búsqueda
+    """
+    raw = json.dumps([score, str(document_id)], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_search_cursor(cursor):
+    """
+    Decodifica un cursor de búsqueda. Lanza ValueError si no es válido
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        score, document_id = json.loads(raw)
+        return float(score), ObjectId(document_id)
+    except Exception:
+        raise ValueError('Cursor de búsqueda inválido')
+
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Acumula estadísticas del pool de conexiones (tiempo de espera en checkout)"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_failures = 0
+        self.checked_out = 0
+        self.connections_created = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def _record_wait(self, duration):
+        self.total_wait_seconds += duration
+        if duration > self.max_wait_seconds:
+            self.max_wait_seconds = duration
+    
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self._record_wait(event.duration)
+    
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            self._record_wait(event.duration)
+    
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+    
+    def connection_created(self, event):
+        with self._lock:
+            self.connections_created += 1
+    
+    def pool_created(self, event):
+        pass
+    
+    def pool_ready(self, event):
+        pass
+    
+    def pool_cleared(self, event):
+        pass
+    
+    def pool_closed(self, event):
+        pass
+    
+    def connection_ready(self, event):
+        pass
+    
+    def connection_check_out_started(self, event):
+        pass
+    
+    def connection_closed(self, event):
+        pass
+    
+    def snapshot(self):
+        """Devuelve una copia de las estadísticas actuales"""
+        with self._lock:
+            attempts = self.checkouts + self.checkout_failures
+            return {
+                'checkouts': self.checkouts,
+                'checkout_failures': self.checkout_failures,
+                'checked_out': self.checked_out,
+                'connections_created': self.connections_created,
+                'avg_wait_ms': (self.total_wait_seconds / attempts * 1000) if attempts else 0.0,
+                'max_wait_ms': self.max_wait_seconds * 1000,
+                'total_wait_ms': self.total_wait_seconds * 1000
+            }
+
+
+# Margen entre el timestamp de un mensaje y el _id generado al insertarlo
+EXPORT_ID_SLACK = timedelta(minutes=1)
+
+# Fechas representables en un ObjectId (segundos en 32 bits sin signo)
+OBJECT_ID_EPOCH = datetime(1970, 1, 1)
+OBJECT_ID_MAX_TIME = OBJECT_ID_EPOCH + timedelta(seconds=2 ** 32 - 1)
+
+# Índices de cada colección: (claves, opciones de create_index)
+INDEXES = {
+    'users': [
+        ('google_id', {'unique': True}),
+        ('email', {'unique': True})
+    ],
+    # Búsqueda por hash del token y expiración por TTL
+    'sessions': [
+        ('user_id', {}),
+        ([('token_hash', 1), ('is_active', 1), ('expires_at', 1)], {}),
+        ('expires_at', {'expireAfterSeconds': 0})
+    ],
+    # Incluye _id para paginar por cursor sin ordenar en memoria. El índice de
+    # texto (uno por colección) sirve a /admin/search/chat-history
+    'chat_history': [
+        ([('user_id', 1), ('timestamp', -1), ('_id', -1)], {}),
+        ([('message', 'text')], {'default_language': Config.SEARCH_LANGUAGE})
+    ],
+    # Historial en buckets (CHAT_HISTORY_LAYOUT = 'buckets'): el bucket abierto
+    # y las páginas se buscan por usuario y fecha del último mensaje
+    'chat_buckets': [
+        ([('user_id', 1), ('end', -1)], {}),
+        ([('messages.message', 'text')], {'default_language': Config.SEARCH_LANGUAGE})
+    ],
+    # Los tokens revocados se borran al expirar el token
+    'revoked_tokens': [
+        ('jti', {'unique': True}),
+        ('revoked_at', {}),
+        ('expires_at', {'expireAfterSeconds': 0})
+    ],
+    'response_cache': [
+        ('key', {'unique': True}),
+        ('expires_at', {'expireAfterSeconds': 0})
+    ],
+    # Los trabajos terminados se borran a los 7 días
+    'jobs': [
+        ([('status', 1), ('run_at', 1)], {}),
+        ('finished_at', {'expireAfterSeconds': 7 * 24 * 3600})
+    ],
+    # Listado de formularios por fecha y filtros
+    'form_submissions': [
+        ([('timestamp', -1), ('_id', -1)], {}),
+        ([('email', 1), ('timestamp', -1), ('_id', -1)], {}),
+        ([('service_type', 1), ('timestamp', -1), ('_id', -1)], {}),
+        # Búsqueda de leads: coincidir en el nombre o la empresa pesa más que en el mensaje
+        ([('company', 'text'), ('message', 'text'), ('name', 'text')], {
+            'default_language': Config.SEARCH_LANGUAGE,
+            'weights': {'name': 5, 'company': 5, 'message': 1}
+        })
+    ]
+}
+
+def _index_keys(keys):
+    """Normaliza las claves de un índice a una lista de (campo, dirección)"""
+    return [(keys, 1)] if isinstance(keys, str) else list(keys)
+
+def _existing_index_keys(info):
+    """
+    Claves de un índice de index_information(). MongoDB describe los índices de
+    texto como (_fts, _ftsx) con los campos en `weights`
+    """
+    keys = list(info['key'])
+    if ('_fts', 'text') not in keys:
+        return keys
+    return [(field, 'text') for field in sorted(info['weights'])]
+
+# Campos devueltos por defecto en /chat/history (y los que se pueden pedir)
+CHAT_HISTORY_FIELDS = ('message', 'message_type', 'timestamp')
+CHAT_HISTORY_ALLOWED_FIELDS = CHAT_HISTORY_FIELDS + ('metadata',)
+
+def chat_history_fields(requested=None):
+    """
+    Campos de /chat/history a partir del parámetro `fields` (separados por comas)
+    """
+    if not requested:
+        return CHAT_HISTORY_FIELDS
+    return tuple(field for field in requested.split(',') if field in CHAT_HISTORY_ALLOWED_FIELDS)
+
+# Consultas compartidas por MongoDBService y AsyncMongoDBService (async_mongodb_service.py)
+
+# Orden de la paginación por cursor (más recientes primero)
+NEWEST_FIRST = [('timestamp', -1), ('_id', -1)]
+
+def _utcnow_millis():
+    # MongoDB guarda las fechas con precisión de milisegundos
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+def _user_upsert(user_info, now):
+    """
+    Filtro y update con pipeline de create_or_update_user: las expresiones se
+    evalúan sobre el documento previo, así que si el perfil no cambió y
+    last_login es reciente el documento queda idéntico
+    """
+    profile = {
+        'google_id': user_info['google_id'],
+        'email': user_info['email'],
+        'name': user_info['name'],
+        'picture': user_info.get('picture', ''),
+        'email_verified': user_info.get('email_verified', False)
+    }
+    profile_changed = {'$or': [{'$ne': [f'${field}', {'$literal': value}]} for field, value in profile.items()]}
+    login_stale = {'$lt': [
+        {'$ifNull': ['$last_login', datetime(1970, 1, 1)]},
+        now - timedelta(seconds=Config.LAST_LOGIN_UPDATE_INTERVAL)
+    ]}
+    
+    return {'google_id': user_info['google_id']}, [{'$set': {
+        **{field: {'$literal': value} for field, value in profile.items()},
+        'created_at': {'$ifNull': ['$created_at', now]},
+        'updated_at': {'$cond': [profile_changed, now, {'$ifNull': ['$updated_at', now]}]},
+        'last_login': {'$cond': [login_stale, now, '$last_login']}
+    }}]
+
+def _session_document(user_id, token_hash):
+    return {
+        'user_id': user_id,
+        'token_hash': token_hash,
+        'created_at': datetime.utcnow(),
+        'expires_at': datetime.utcnow() + timedelta(seconds=Config.JWT_ACCESS_TOKEN_EXPIRES),
+        'is_active': True
+    }
+
+def _active_session_query(user_id, token_hash):
+    return {
+        'token_hash': token_hash,
+        'is_active': True,
+        'expires_at': {'$gt': datetime.utcnow()},
+        'user_id': user_id
+    }
+
+def _chat_document(user_id, message, message_type, metadata):
+    return {
+        'user_id': user_id,
+        'message': message,
+        'message_type': message_type,  # 'user' o 'bot'
+        'timestamp': datetime.utcnow(),
+        'metadata': metadata or {}
+    }
+
+def _chat_history_query(user_id, position=None, fields=None):
+    """
+    Consulta y proyección de una página del historial anterior a `position`
+    """
+    query = {'user_id': user_id}
+    if position:
+        query['$or'] = _before_position(*position)
+    
+    projection = None
+    if fields:
+        projection = {field: 1 for field in fields}
+        projection['timestamp'] = 1
+    return query, projection
+
+def _next_page_cursor(documents, has_more):
+    """Cursor de la página siguiente (posición del documento más antiguo)"""
+    if not has_more or not documents:
+        return None
+    oldest = documents[-1]
+    return encode_page_cursor(oldest['timestamp'], oldest['_id'])
+
+def _submission_filters(email=None, service_type=None):
+    filters = {}
+    if email:
+        filters['email'] = email
+    if service_type:
+        filters['service_type'] = service_type
+    return filters
+
+def _chat_export_query(user_id=None, since=None, until=None):
+    """
+    Consulta y orden de la exportación del historial. Con user_id usa el índice
+    (user_id, timestamp, _id); sin él recorre el índice de _id, acotado por
+    fechas con ObjectId.from_datetime
+    """
+    query = {}
+    if user_id:
+        query['user_id'] = user_id
+    time_range = _time_range(since, until)
+    if time_range:
+        query['timestamp'] = time_range
+    
+    if user_id:
+        return query, [('timestamp', 1), ('_id', 1)]
+    
+    # El _id se genera al guardar el mensaje: su segundo es >= el del timestamp
+    id_range = {}
+    if since and OBJECT_ID_EPOCH <= since < OBJECT_ID_MAX_TIME:
+        id_range['$gte'] = ObjectId.from_datetime(since)
+    if until and OBJECT_ID_EPOCH <= until + EXPORT_ID_SLACK < OBJECT_ID_MAX_TIME:
+        id_range['$lt'] = ObjectId.from_datetime(until + EXPORT_ID_SLACK)
+    if id_range:
+        query['_id'] = id_range
+    return query, [('_id', 1)]
+
+def _submission_export_query(email=None, service_type=None, since=None, until=None):
+    query = _submission_filters(email, service_type)
+    time_range = _time_range(since, until)
+    if time_range:
+        query['timestamp'] = time_range
+    return query
+
+# Historial en buckets: cada documento de chat_buckets guarda hasta
+# CHAT_BUCKET_SIZE mensajes de un usuario en `messages` (y hasta
+# CHAT_BUCKET_MAX_BYTES de BSON en `bytes`, lejos del límite de 16 MB de un
+# documento), con `count` y el intervalo [start, end] de sus timestamps
+BUCKET_MESSAGE_FIELDS = ('_id', 'message', 'message_type', 'timestamp', 'metadata')
+
+# Buckets por lote al leer una página (una página suele caber en uno o dos)
+BUCKET_READ_BATCH_SIZE = 2
+
+# Punto de control de la migración de chat_history a chat_buckets (colección migrations)
+CHAT_BUCKETS_MIGRATION = 'chat_buckets'
+
+def _bucket_message(document):
+    return {field: document[field] for field in BUCKET_MESSAGE_FIELDS if field in document}
+
+def _bucket_message_size(message):
+    return len(bson_encode(message))
+
+def _bucket_chunks(messages):
+    """
+    Reparte los mensajes de un usuario (en orden cronológico) en buckets de
+    hasta CHAT_BUCKET_SIZE mensajes y CHAT_BUCKET_MAX_BYTES
+    """
+    chunks = []
+    chunk, chunk_bytes = [], 0
+    for message in messages:
+        size = _bucket_message_size(_bucket_message(message))
+        if chunk and (len(chunk) >= Config.CHAT_BUCKET_SIZE or chunk_bytes + size > Config.CHAT_BUCKET_MAX_BYTES):
+            chunks.append(chunk)
+            chunk, chunk_bytes = [], 0
+        chunk.append(message)
+        chunk_bytes += size
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def _bucket_append(document):
+    """
+    Filtro, update y orden del $push de un mensaje al bucket abierto más
+    reciente del usuario con sitio para él; si no hay ninguno, el upsert crea
+    uno nuevo (también para un mensaje de más de CHAT_BUCKET_MAX_BYTES)
+    """
+    message = _bucket_message(document)
+    size = _bucket_message_size(message)
+    return (
+        {
+            'user_id': document['user_id'],
+            'count': {'$lt': Config.CHAT_BUCKET_SIZE},
+            # Los buckets sin `bytes` (anteriores al límite) no reciben más mensajes
+            'bytes': {'$lte': Config.CHAT_BUCKET_MAX_BYTES - size}
+        },
+        {
+            '$push': {'messages': message},
+            '$inc': {'count': 1, 'bytes': size},
+            '$min': {'start': document['timestamp']},
+            '$max': {'end': document['timestamp']}
+        },
+        [('end', -1)]
+    )
+
+def _bucket_history_query(user_id, position=None):
+    query = {'user_id': user_id}
+    if position:
+        # Solo los buckets con algún mensaje anterior al cursor
+        query['start'] = {'$lte': position[0]}
+    return query
+
+def _bucket_version(bucket):
+    """Versión del historial en buckets: cambia con cada mensaje añadido"""
+    if bucket is None:
+        return None
+    return {'_id': f"{bucket['_id']}:{bucket['count']}", 'timestamp': bucket['end']}
+
+def _bucket_document(user_id, messages):
+    """Bucket completo con los mensajes dados (en orden cronológico)"""
+    bucket_messages = [_bucket_message(message) for message in messages]
+    return {
+        'user_id': user_id,
+        'messages': bucket_messages,
+        'count': len(messages),
+        'bytes': sum(_bucket_message_size(message) for message in bucket_messages),
+        'start': messages[0]['timestamp'],
+        'end': messages[-1]['timestamp']
+    }
+
+def _bucket_export_pipeline(user_id=None, since=None, until=None):
+    """
+    Aggregation que devuelve los mensajes de los buckets como documentos sueltos
+    (con user_id), bucket a bucket en orden cronológico
+    """
+    match = {}
+    if user_id:
+        match['user_id'] = user_id
+    if since:
+        match['end'] = {'$gte': since}
+    if until:
+        match['start'] = {'$lt': until}
+    
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'end': 1} if user_id else {'_id': 1}},
+        {'$unwind': '$messages'},
+        {'$project': dict({field: f'$messages.{field}' for field in BUCKET_MESSAGE_FIELDS}, user_id=1)}
+    ]
+    time_range = _time_range(since, until)
+    if time_range:
+        pipeline.append({'$match': {'timestamp': time_range}})
+    return pipeline
+
+# Longitud máxima del texto de una búsqueda
+SEARCH_MAX_QUERY_LENGTH = 200
+
+# Campos de cada resultado de /admin/search/chat-history
+CHAT_SEARCH_FIELDS = ('user_id', 'message', 'message_type', 'timestamp')
+
+def _text_search_pipeline(search, filters, position=None, limit=20, projection=None):
+    """
+    Aggregation de una página de resultados de $text ordenada por relevancia
+    (textScore) y _id, paginada por cursor sobre esa misma clave
+    """
+    match = dict(filters)
+    match['$text'] = {'$search': search}
+    pipeline = [
+        {'$match': match},
+        {'$addFields': {'score': {'$meta': 'textScore'}}}
+    ]
+    if position:
+        score, document_id = position
+        pipeline.append({'$match': {'$or': [
+            {'score': {'$lt': score}},
+            {'score': score, '_id': {'$lt': document_id}}
+        ]}})
+    pipeline += [
+        {'$sort': {'score': -1, '_id': -1}},
+        {'$limit': limit + 1}
+    ]
+    if projection:
+        pipeline.append({'$project': projection})
+    return pipeline
+
+def _chat_search_pipeline(search, user_id=None, since=None, until=None, position=None, limit=20):
+    filters = {}
+    if user_id:
+        filters['user_id'] = user_id
+    time_range = _time_range(since, until)
+    if time_range:
+        filters['timestamp'] = time_range
+    projection = {field: 1 for field in CHAT_SEARCH_FIELDS}
+    projection['score'] = 1
+    return _text_search_pipeline(search, filters, position, limit, projection)
+
+def _bucket_search_pipeline(search, user_id=None, since=None, until=None, position=None, limit=20):
+    """
+    Búsqueda en el historial en buckets: el índice de texto (y su relevancia)
+    es por bucket, así que cada resultado es un bucket con el usuario, el
+    intervalo [start, end] de sus mensajes y `count`, sin los mensajes. Los
+    mensajes se leen con la exportación del usuario en ese intervalo
+    """
+    filters = {}
+    if user_id:
+        filters['user_id'] = user_id
+    if since:
+        filters['end'] = {'$gte': since}
+    if until:
+        filters['start'] = {'$lt': until}
+    projection = {field: 1 for field in ('user_id', 'start', 'end', 'count')}
+    projection['score'] = 1
+    return _text_search_pipeline(search, filters, position, limit, projection)
+
+def _submission_search_pipeline(search, email=None, service_type=None, since=None, until=None, position=None, limit=20):
+    filters = _submission_export_query(email, service_type, since, until)
+    return _text_search_pipeline(search, filters, position, limit, {'notified_at': 0})
+
+def _search_page(results, limit):
+    """Página de resultados y cursor de la siguiente (posición del último)"""
+    has_more = len(results) > limit
+    results = results[:limit]
+    next_cursor = None
+    if has_more and results:
+        next_cursor = encode_search_cursor(results[-1]['score'], results[-1]['_id'])
+    return {'results': results, 'next_cursor': next_cursor}
+
+def _search_params(search, limit, cursor):
+    """
+    Valida el texto de búsqueda y devuelve (texto, límite, posición). Lanza ValueError
+    """
+    search = (search or '').strip()
+    if not search:
+        raise ValueError('El parámetro q es obligatorio')
+    if len(search) > SEARCH_MAX_QUERY_LENGTH:
+        raise ValueError(f"La búsqueda no puede superar {SEARCH_MAX_QUERY_LENGTH} caracteres")
+    limit = max(1, min(limit, Config.SEARCH_MAX_PAGE_SIZE))
+    position = decode_search_cursor(cursor) if cursor else None
+    return search, limit, position
+
+def _group_by_user(messages):
+    """Divide una lista ordenada por user_id en listas de mensajes de cada usuario"""
+    groups = []
+    for message in messages:
+        if groups and groups[-1][-1]['user_id'] == message['user_id']:
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+class BucketPage:
+    """
+    Reúne una página del historial (más recientes primero) a partir de los
+    buckets de un usuario leídos por `end` descendente. Deja de pedir buckets
+    cuando los restantes solo pueden contener mensajes más antiguos que la página
+    """
+
+    def __init__(self, user_id, limit, position=None, fields=None):
+        self.user_id = user_id
+        self.limit = limit
+        self.before = position_key(*position) if position else None
+        self.fields = fields
+        self.messages = []
+
+    def add(self, bucket):
+        """Añade los mensajes del bucket; devuelve False si ya no hacen falta más"""
+        if len(self.messages) > self.limit and position_key(bucket['end'], None)[0] < document_position(self.messages[-1])[0]:
+            return False
+        for message in bucket['messages']:
+            if self.before is None or document_position(message) < self.before:
+                self.messages.append(message)
+        self.messages.sort(key=document_position, reverse=True)
+        del self.messages[self.limit + 1:]
+        return True
+
+    def result(self):
+        has_more = len(self.messages) > self.limit
+        messages = self.messages[:self.limit]
+        if self.fields:
+            keys = ('_id', 'timestamp') + tuple(self.fields)
+            messages = [{key: message[key] for key in keys if key in message} for message in messages]
+        else:
+            messages = [dict(message, user_id=self.user_id) for message in messages]
+        
+        # Invertir para mostrar en orden cronológico
+        return {
+            'messages': list(reversed(messages)),
+            'next_cursor': _next_page_cursor(messages, has_more)
+        }
+
 class MongoDBService:
     """Servicio para manejar operaciones con MongoDB"""
     
-    def __init__(self):
+    def __init__(self, create_indexes=True):
         try:
-            self.client = MongoClient(Config.MONGODB_URI)
+            self.pool_stats = PoolStatsListener()
+            self.client = MongoClient(
+                Config.MONGODB_URI,
+                maxPoolSize=Config.MONGODB_MAX_POOL_SIZE,
+                minPoolSize=Config.MONGODB_MIN_POOL_SIZE,
+                waitQueueTimeoutMS=Config.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=Config.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+                event_listeners=[self.pool_stats]
+            )
             self.db = self.client.aiwrapper
             
             # Colecciones
             self.users = self.db.users
             self.sessions = self.db.sessions
             self.chat_history = self.db.chat_history
+            self.chat_buckets = self.db.chat_buckets
+            self.form_submissions = self.db.form_submissions
+            self.revoked_tokens = self.db.revoked_tokens
+            self.response_cache = self.db.response_cache
+            self.jobs = self.db.jobs
+            self.migrations = self.db.migrations
+            
+            # Esquema del historial: un documento por mensaje o buckets de mensajes
+            self.bucketed = Config.CHAT_HISTORY_LAYOUT == 'buckets'
+            
+            # Escritura diferida opcional de mensajes de chat (solo con un documento por mensaje)
+            self.chat_writer = None
+            if Config.CHAT_WRITE_BEHIND and self.bucketed:
+                logger.warning("CHAT_WRITE_BEHIND no se aplica con CHAT_HISTORY_LAYOUT=buckets")
+            elif Config.CHAT_WRITE_BEHIND:
+                self.chat_writer = ChatMessageWriter(self.chat_history)
             
             # Crear índices para optimizar consultas
-            self._create_indexes()
+            if create_indexes:
+                try:
+                    self.ensure_indexes()
+                except Exception as e:
+                    logger.warning(f"Error creando índices: {str(e)}")
             
             logger.info("Conexión a MongoDB establecida exitosamente")
             
@@ -27,61 +658,103 @@ class MongoDBService:
             logger.error(f"Error conectando a MongoDB: {str(e)}")
             raise
     
-    def _create_indexes(self):
-        """Crea índices necesarios para optimizar las consultas"""
+    def ensure_indexes(self):
+        """
+        Crea los índices de INDEXES que falten (create_index es idempotente). Los
+        índices TTL que ya existían sin TTL se convierten con collMod. Se ejecuta
+        una vez por despliegue (python manage.py ensure-indexes), no en cada worker
+        """
+        for collection_name, indexes in INDEXES.items():
+            collection = self.db[collection_name]
+            for keys, options in indexes:
+                try:
+                    collection.create_index(keys, **options)
+                except OperationFailure as e:
+                    # IndexOptionsConflict: existe el índice sin TTL de versiones anteriores
+                    if e.code != 85 or 'expireAfterSeconds' not in options:
+                        raise
+                    self.db.command('collMod', collection_name, index={
+                        'keyPattern': dict(_index_keys(keys)),
+                        'expireAfterSeconds': options['expireAfterSeconds']
+                    })
+                    logger.info("Índice %s.%s convertido a TTL", collection_name, _index_keys(keys))
+        
+        logger.info("Índices de MongoDB creados exitosamente")
+    
+    def missing_indexes(self):
+        """
+        Devuelve los índices de INDEXES que no existen (o difieren en unique/TTL)
+        como lista de (colección, claves, opciones)
+        """
+        missing = []
+        for collection_name, indexes in INDEXES.items():
+            existing = {
+                tuple(_existing_index_keys(info)): (info.get('unique', False), info.get('expireAfterSeconds'))
+                for info in self.db[collection_name].index_information().values()
+            }
+            for keys, options in indexes:
+                expected = (options.get('unique', False), options.get('expireAfterSeconds'))
+                if existing.get(tuple(_index_keys(keys))) != expected:
+                    missing.append((collection_name, _index_keys(keys), options))
+        return missing
+    
+    def ping(self):
+        """
+        Comprueba que el servidor responde
+        """
         try:
-            # Índices para usuarios
-            self.users.create_index("google_id", unique=True)
-            self.users.create_index("email", unique=True)
-            
-            # Índices para sesiones
-            self.sessions.create_index("user_id")
-            self.sessions.create_index("expires_at")
-            
-            # Índices para historial de chat
-            self.chat_history.create_index([("user_id", 1), ("timestamp", -1)])
-            
-            logger.info("Índices de MongoDB creados exitosamente")
-            
+            self.client.admin.command('ping')
+            return True
         except Exception as e:
-            logger.warning(f"Error creando índices: {str(e)}")
+            logger.warning(f"MongoDB no responde: {str(e)}")
+            return False
     
+    def get_pool_stats(self):
+        """
+        Devuelve las estadísticas del pool de conexiones
+        """
+        stats = self.pool_stats.snapshot()
+        stats['max_pool_size'] = Config.MONGODB_MAX_POOL_SIZE
+        stats['min_pool_size'] = Config.MONGODB_MIN_POOL_SIZE
+        return stats
+    
+    def close(self):
+        """
+        Cierra el cliente y libera las conexiones del pool
+        """
+        if self.chat_writer:
+            self.chat_writer.close()
+        self.client.close()
+    
+    @timed('mongo.create_or_update_user')
     def create_or_update_user(self, user_info):
         """
-        Crea un nuevo usuario o actualiza uno existente
+        Crea un nuevo usuario o actualiza uno existente y lo devuelve, en una sola
+        operación atómica. Si el perfil no cambió y last_login es reciente, el
+        documento queda idéntico y MongoDB no realiza ninguna escritura
         """
         try:
-            user_data = {
-                'google_id': user_info['google_id'],
-                'email': user_info['email'],
-                'name': user_info['name'],
-                'picture': user_info.get('picture', ''),
-                'email_verified': user_info.get('email_verified', False),
-                'last_login': datetime.utcnow(),
-                'updated_at': datetime.utcnow()
-            }
+            now = _utcnow_millis()
+            query, pipeline = _user_upsert(user_info, now)
             
-            # Usar upsert para crear o actualizar
-            result = self.users.update_one(
-                {'google_id': user_info['google_id']},
-                {
-                    '$set': user_data,
-                    '$setOnInsert': {'created_at': datetime.utcnow()}
-                },
-                upsert=True
+            # Update con pipeline: las expresiones se evalúan sobre el documento previo
+            user = self.users.find_one_and_update(
+                query,
+                pipeline,
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
             
-            if result.upserted_id:
-                logger.info(f"Nuevo usuario creado: {user_info['email']}")
-            else:
-                logger.info(f"Usuario actualizado: {user_info['email']}")
+            if user['created_at'] == now:
+                logger.info("Nuevo usuario creado: %s", user_info['email'])
             
-            return self.get_user_by_google_id(user_info['google_id'])
+            return user
             
         except Exception as e:
             logger.error(f"Error creando/actualizando usuario: {str(e)}")
             return None
     
+    @timed('mongo.get_user_by_google_id')
     def get_user_by_google_id(self, google_id):
         """
         Obtiene un usuario por su Google ID
@@ -94,6 +767,7 @@ class MongoDBService:
             logger.error(f"Error obteniendo usuario: {str(e)}")
             return None
     
+    @timed('mongo.get_user_by_email')
     def get_user_by_email(self, email):
         """
         Obtiene un usuario por su email
@@ -106,21 +780,14 @@ class MongoDBService:
             logger.error(f"Error obteniendo usuario por email: {str(e)}")
             return None
     
-    def create_session(self, user_id, jwt_token):
+    @timed('mongo.create_session')
+    def create_session(self, user_id, token_hash):
         """
-        Crea una nueva sesión para el usuario
+        Crea una nueva sesión para el usuario (se guarda el hash del token, no el token)
         """
         try:
-            session_data = {
-                'user_id': user_id,
-                'jwt_token': jwt_token,
-                'created_at': datetime.utcnow(),
-                'expires_at': datetime.utcnow() + timedelta(seconds=Config.JWT_ACCESS_TOKEN_EXPIRES),
-                'is_active': True
-            }
-            
-            result = self.sessions.insert_one(session_data)
-            logger.info(f"Sesión creada para usuario: {user_id}")
+            result = self.sessions.insert_one(_session_document(user_id, token_hash))
+            logger.info("Sesión creada para usuario: %s", user_id)
             
             return str(result.inserted_id)
             
@@ -128,16 +795,13 @@ class MongoDBService:
             logger.error(f"Error creando sesión: {str(e)}")
             return None
     
-    def get_active_session(self, user_id):
+    @timed('mongo.get_active_session')
+    def get_active_session(self, user_id, token_hash):
         """
-        Obtiene la sesión activa de un usuario
+        Obtiene la sesión activa asociada a un token (por su hash)
         """
         try:
-            session = self.sessions.find_one({
-                'user_id': user_id,
-                'is_active': True,
-                'expires_at': {'$gt': datetime.utcnow()}
-            })
+            session = self.sessions.find_one(_active_session_query(user_id, token_hash))
             
             return session
             
@@ -145,34 +809,86 @@ class MongoDBService:
             logger.error(f"Error obteniendo sesión activa: {str(e)}")
             return None
     
+    @timed('mongo.invalidate_session')
     def invalidate_session(self, session_id):
         """
         Invalida una sesión específica
         """
         try:
-            result = self.sessions.update_one(
-                {'_id': session_id},
-                {'$set': {'is_active': False, 'invalidated_at': datetime.utcnow()}}
+            session = self.sessions.find_one_and_update(
+                {'_id': session_id, 'is_active': True},
+                {'$set': {'is_active': False, 'invalidated_at': datetime.utcnow()}},
+                projection={'token_hash': 1}
             )
             
-            return result.modified_count > 0
+            # Evitar que la caché de autenticación siga sirviendo el token de la sesión
+            if session and session.get('token_hash'):
+                principal_cache.evict_token(session['token_hash'])
+            
+            return session is not None
             
         except Exception as e:
             logger.error(f"Error invalidando sesión: {str(e)}")
             return False
     
-    def save_chat_message(self, user_id, message, message_type='user'):
+    @timed('mongo.revoke_token')
+    def revoke_token(self, jti, expires_at):
+        """
+        Registra un jti revocado hasta la expiración del token
+        """
+        try:
+            self.revoked_tokens.update_one(
+                {'jti': jti},
+                {
+                    '$setOnInsert': {'jti': jti, 'expires_at': expires_at},
+                    '$currentDate': {'revoked_at': True}
+                },
+                upsert=True
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error revocando token: {str(e)}")
+            return False
+    
+    @timed('mongo.get_revoked_tokens')
+    def get_revoked_tokens(self, since=None):
+        """
+        Obtiene los jtis revocados no expirados (desde `since` si se indica)
+        """
+        query = {'expires_at': {'$gt': datetime.utcnow()}}
+        if since:
+            query['revoked_at'] = {'$gte': since}
+        
+        return list(self.revoked_tokens.find(query, {'_id': 0, 'jti': 1, 'revoked_at': 1}))
+    
+    @timed('mongo.is_token_revoked')
+    def is_token_revoked(self, jti):
+        """
+        Comprueba en la base de datos si un jti está revocado. Los errores se
+        propagan: sin poder comprobarlo no se puede dar el token por válido
+        """
+        return self.revoked_tokens.find_one({'jti': jti}, {'_id': 1}) is not None
+    
+    @timed('mongo.save_chat_message')
+    def save_chat_message(self, user_id, message, message_type='user', metadata=None):
         """
         Guarda un mensaje del chat en el historial
         """
         try:
-            chat_data = {
-                'user_id': user_id,
-                'message': message,
-                'message_type': message_type,  # 'user' o 'bot'
-                'timestamp': datetime.utcnow(),
-                'metadata': {}
-            }
+            chat_data = _chat_document(user_id, message, message_type, metadata)
+            
+            if self.bucketed:
+                chat_data['_id'] = ObjectId()
+                query, update, sort = _bucket_append(chat_data)
+                self.chat_buckets.find_one_and_update(query, update, sort=sort, upsert=True, projection={'_id': 1})
+                return str(chat_data['_id'])
+            
+            if self.chat_writer:
+                # El _id se genera en el cliente para poder devolverlo sin esperar al lote
+                chat_data['_id'] = ObjectId()
+                self.chat_writer.enqueue(chat_data)
+                return str(chat_data['_id'])
             
             result = self.chat_history.insert_one(chat_data)
             return str(result.inserted_id)
@@ -181,25 +897,502 @@ class MongoDBService:
             logger.error(f"Error guardando mensaje de chat: {str(e)}")
             return None
     
+    @timed('mongo.get_chat_history')
     def get_chat_history(self, user_id, limit=50):
         """
         Obtiene el historial de chat de un usuario
         """
+        return self.get_chat_history_page(user_id, limit)['messages']
+    
+    @timed('mongo.get_chat_history_page')
+    def get_chat_history_page(self, user_id, limit=50, cursor=None, fields=None):
+        """
+        Obtiene una página del historial de chat (orden cronológico) paginando
+        por cursor sobre (timestamp, _id), de más reciente a más antiguo.
+        `fields` limita los campos devueltos; `cursor` es el next_cursor de la
+        página anterior. Lanza ValueError si el cursor no es válido.
+        """
+        limit = max(1, min(limit, Config.CHAT_HISTORY_MAX_PAGE_SIZE))
+        position = decode_page_cursor(cursor) if cursor else None
+        
         try:
-            messages = list(self.chat_history.find(
-                {'user_id': user_id}
-            ).sort('timestamp', -1).limit(limit))
+            if self.bucketed:
+                page = BucketPage(user_id, limit, position, fields)
+                buckets = self.chat_buckets.find(_bucket_history_query(user_id, position)).sort('end', -1).batch_size(BUCKET_READ_BATCH_SIZE)
+                try:
+                    for bucket in buckets:
+                        if not page.add(bucket):
+                            break
+                finally:
+                    buckets.close()
+                return page.result()
+            
+            query, projection = _chat_history_query(user_id, position, fields)
+            
+            # Los pendientes se leen antes que MongoDB: un mensaje que el escritor
+            # diferido inserta entre las dos lecturas aparece al menos en una
+            pending = self.chat_writer.pending_for_user(user_id) if self.chat_writer else []
+            
+            # Se pide un documento de más para saber si hay páginas anteriores
+            messages = list(self.chat_history.find(query, projection).sort(NEWEST_FIRST).limit(limit + 1))
+            
+            has_more = len(messages) > limit
+            messages = messages[:limit]
+            
+            # Incluir mensajes aún no escritos (lectura de las propias escrituras)
+            if pending:
+                seen_ids = {message['_id'] for message in messages}
+                pending = [
+                    doc for doc in pending
+                    if doc['_id'] not in seen_ids and (not position or document_position(doc) < position_key(*position))
+                ]
+                if pending:
+                    if projection:
+                        pending = [{key: doc[key] for key in list(projection) + ['_id'] if key in doc} for doc in pending]
+                    messages = sorted(messages + pending, key=document_position, reverse=True)
+                    has_more = has_more or len(messages) > limit
+                    messages = messages[:limit]
             
             # Invertir para mostrar en orden cronológico
-            return list(reversed(messages))
+            return {
+                'messages': list(reversed(messages)),
+                'next_cursor': _next_page_cursor(messages, has_more)
+            }
             
         except Exception as e:
             logger.error(f"Error obteniendo historial de chat: {str(e)}")
-            return []
+            return {'messages': [], 'next_cursor': None}
+    
+    @timed('mongo.get_chat_history_version')
+    def get_chat_history_version(self, user_id):
+        """
+        Devuelve el último mensaje del usuario ({'_id', 'timestamp'}) como versión
+        del historial, incluyendo los pendientes de escribir. El historial solo
+        crece, así que cambia siempre que cambia cualquier página. Con buckets,
+        la versión es el bucket más reciente y su número de mensajes
+        """
+        if self.bucketed:
+            return _bucket_version(self.chat_buckets.find_one({'user_id': user_id}, {'end': 1, 'count': 1}, sort=[('end', -1)]))
+        
+        # Pendientes antes que MongoDB, como en get_chat_history_page
+        pending = self.chat_writer.pending_for_user(user_id) if self.chat_writer else []
+        newest = self.chat_history.find_one({'user_id': user_id}, {'timestamp': 1}, sort=NEWEST_FIRST)
+        for doc in pending:
+            if newest is None or document_position(doc) > document_position(newest):
+                newest = {'_id': doc['_id'], 'timestamp': doc['timestamp']}
+        return newest
+    
+    def export_chat_history(self, user_id=None, since=None, until=None, batch_size=None):
+        """
+        Devuelve un cursor sobre el historial en orden cronológico para exportarlo
+        en streaming (los mensajes pendientes del escritor diferido no se incluyen).
+        Con user_id usa el índice (user_id, timestamp, _id); sin él recorre el
+        índice de _id, acotado por fechas con ObjectId.from_datetime. Con buckets
+        es una aggregation que devuelve los mensajes como documentos sueltos
+        """
+        if self.bucketed:
+            return self.chat_buckets.aggregate(
+                _bucket_export_pipeline(user_id, since, until),
+                batchSize=batch_size or Config.EXPORT_BATCH_SIZE
+            )
+        
+        query, sort = _chat_export_query(user_id, since, until)
+        return self.chat_history.find(query).sort(sort).batch_size(batch_size or Config.EXPORT_BATCH_SIZE)
+    
+    @timed('mongo.search_chat_history')
+    def search_chat_history(self, search, user_id=None, since=None, until=None, limit=20, cursor=None):
+        """
+        Busca mensajes del historial con el índice de texto, ordenados por
+        relevancia, con filtros opcionales por usuario y fechas [since, until).
+        Con el historial en buckets los resultados son buckets (ver
+        _bucket_search_pipeline). Lanza ValueError si la búsqueda o el cursor
+        no son válidos; los errores de MongoDB se propagan
+        """
+        search, limit, position = _search_params(search, limit, cursor)
+        
+        if self.bucketed:
+            results = self.chat_buckets.aggregate(_bucket_search_pipeline(search, user_id, since, until, position, limit))
+        else:
+            results = self.chat_history.aggregate(_chat_search_pipeline(search, user_id, since, until, position, limit))
+        return _search_page(list(results), limit)
+    
+    def migrate_chat_history_batch(self, batch_size=1000, settle_seconds=None):
+        """
+        Copia el siguiente lote de chat_history a chat_buckets y devuelve el
+        número de mensajes copiados (0 cuando no queda nada). Es online: la
+        app sigue escribiendo en chat_history mientras se ejecuta.
+        
+        1. 'scan': recorre los mensajes existentes (hasta el _id más alto de
+           hace más de `settle_seconds` al empezar) por usuario y fecha y los agrupa en buckets completos; el
+           último bucket de cada usuario puede quedar a medias y recibe los
+           mensajes nuevos tras cambiar CHAT_HISTORY_LAYOUT.
+        2. 'tail': copia por _id los mensajes escritos después, solo los de
+           un _id de hace más de `settle_seconds` (CHAT_MIGRATION_SETTLE_SECONDS).
+           El orden de los _id no es el de inserción: los ObjectId de dos
+           procesos en el mismo segundo no siguen el orden de escritura y el
+           escritor diferido inserta _id generados antes. Tras el cambio de
+           esquema ya no se escribe en chat_history y se ejecuta con
+           settle_seconds=0 para recoger los últimos.
+        
+        El punto de control se guarda en `migrations` tras cada lote y cada
+        bucket usa como _id el de su primer mensaje, así que repetir un lote
+        interrumpido no duplica mensajes siempre que forme los mismos buckets.
+        En 'scan' dependen solo del punto de control; en 'tail', del lote, así
+        que antes de escribir se guarda su último _id en `planned` y, si el
+        lote se interrumpe, la siguiente ejecución repite exactamente ese rango
+        """
+        if settle_seconds is None:
+            settle_seconds = Config.CHAT_MIGRATION_SETTLE_SECONDS
+        settled = ObjectId.from_datetime(datetime.utcnow() - timedelta(seconds=settle_seconds))
+        
+        state = self.migrations.find_one({'_id': CHAT_BUCKETS_MIGRATION})
+        if state is None:
+            newest = self.chat_history.find_one({'_id': {'$lt': settled}}, {'_id': 1}, sort=[('_id', -1)])
+            state = {
+                '_id': CHAT_BUCKETS_MIGRATION,
+                'phase': 'scan',
+                'high_water': newest['_id'] if newest else None,
+                'last': None,
+                'migrated': 0
+            }
+            self.migrations.insert_one(state)
+        
+        update = {}
+        if state['phase'] == 'scan' and state['high_water'] is None:
+            # chat_history estaba vacía al empezar: no hay nada que recorrer
+            state['phase'] = 'tail'
+            update['phase'] = 'tail'
+        
+        if state['phase'] == 'scan':
+            chunks, last, done = self._scan_chat_history(state, batch_size)
+            update['last'] = last
+            if done:
+                update = {'phase': 'tail', 'last': state['high_water']}
+        else:
+            chunks, last = self._tail_chat_history(state, batch_size, settled if settle_seconds > 0 else None)
+            update['last'] = last
+            if chunks and state.get('planned') != last:
+                self.migrations.update_one({'_id': CHAT_BUCKETS_MIGRATION}, {'$set': {'planned': last}})
+        
+        migrated = sum(len(chunk) for chunk in chunks)
+        if chunks:
+            self.chat_buckets.bulk_write([
+                UpdateOne(
+                    {'_id': chunk[0]['_id']},
+                    {'$setOnInsert': _bucket_document(chunk[0]['user_id'], chunk)},
+                    upsert=True
+                )
+                for chunk in chunks
+            ], ordered=False)
+        
+        if migrated or update.get('phase'):
+            self.migrations.update_one(
+                {'_id': CHAT_BUCKETS_MIGRATION},
+                {
+                    '$set': dict(update, updated_at=datetime.utcnow()),
+                    '$inc': {'migrated': migrated},
+                    '$unset': {'planned': ''}
+                }
+            )
+        return migrated
+    
+    def _scan_chat_history(self, state, batch_size):
+        """
+        Lote de la fase 'scan' en orden (user_id desc, timestamp, _id), que es
+        el índice de chat_history recorrido al revés. Devuelve (buckets, posición
+        del último mensaje copiado, fase terminada)
+        """
+        query = {'_id': {'$lte': state['high_water']}}
+        last = state['last']
+        if last:
+            query['$or'] = [
+                {'user_id': {'$lt': last['user_id']}},
+                {'user_id': last['user_id'], 'timestamp': {'$gt': last['timestamp']}},
+                {'user_id': last['user_id'], 'timestamp': last['timestamp'], '_id': {'$gt': last['_id']}}
+            ]
+        
+        # Con más de un bucket de margen cada lote completa al menos uno
+        limit = max(batch_size, Config.CHAT_BUCKET_SIZE + 1)
+        messages = list(self.chat_history.find(query).sort(
+            [('user_id', -1), ('timestamp', 1), ('_id', 1)]
+        ).limit(limit))
+        done = len(messages) < limit
+        
+        chunks = []
+        for user_messages in _group_by_user(messages):
+            chunks.extend(_bucket_chunks(user_messages))
+        
+        # El último usuario del lote puede seguir en el siguiente: su último
+        # bucket se deja para ese lote, que lo vuelve a repartir igual
+        if not done and chunks:
+            chunks.pop()
+        
+        if not chunks:
+            return [], last, done
+        newest = chunks[-1][-1]
+        return chunks, {key: newest[key] for key in ('user_id', 'timestamp', '_id')}, done
+    
+    def _tail_chat_history(self, state, batch_size, settled=None):
+        """
+        Lote de la fase 'tail': mensajes con _id posterior al último copiado (y
+        anterior a `settled` si se indica), agrupados por usuario, o el rango
+        `planned` de un lote interrumpido. Devuelve (buckets, último _id copiado)
+        """
+        id_range = {}
+        if state['last']:
+            id_range['$gt'] = state['last']
+        if state.get('planned'):
+            # Mismo rango que la ejecución interrumpida: mismos buckets
+            id_range['$lte'] = state['planned']
+            batch_size = 0
+        elif settled:
+            id_range['$lt'] = settled
+        query = {'_id': id_range} if id_range else {}
+        messages = list(self.chat_history.find(query).sort('_id', 1).limit(batch_size))
+        if not messages:
+            return [], state['last']
+        
+        chunks = []
+        for user_messages in _group_by_user(sorted(messages, key=lambda message: message['user_id'])):
+            user_messages.sort(key=document_position)
+            chunks.extend(_bucket_chunks(user_messages))
+        return chunks, messages[-1]['_id']
+    
+    def get_chat_buckets_migration(self):
+        """
+        Estado de la migración a chat_buckets (None si no ha empezado)
+        """
+        return self.migrations.find_one({'_id': CHAT_BUCKETS_MIGRATION})
+    
+    @timed('mongo.get_cached_response')
+    def get_cached_response(self, key):
+        """
+        Obtiene una respuesta del chatbot cacheada (si no ha expirado)
+        """
+        try:
+            return self.response_cache.find_one(
+                {'key': key, 'expires_at': {'$gt': datetime.utcnow()}},
+                {'_id': 0, 'response': 1, 'backend_ms': 1, 'expires_at': 1}
+            )
+            
+        except Exception as e:
+            logger.error(f"Error obteniendo respuesta cacheada: {str(e)}")
+            return None
+    
+    @timed('mongo.save_cached_response')
+    def save_cached_response(self, key, response, backend_ms, expires_at):
+        """
+        Guarda (o reemplaza) una respuesta del chatbot en la caché compartida
+        """
+        try:
+            self.response_cache.update_one(
+                {'key': key},
+                {'$set': {
+                    'response': response,
+                    'backend_ms': backend_ms,
+                    'created_at': datetime.utcnow(),
+                    'expires_at': expires_at
+                }},
+                upsert=True
+            )
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error guardando respuesta cacheada: {str(e)}")
+            return False
     
+    @timed('mongo.save_form_submission')
+    def save_form_submission(self, submission):
+        """
+        Guarda un formulario de contacto y devuelve su id
+        """
+        try:
+            submission_data = dict(submission)
+            submission_data['timestamp'] = datetime.utcnow()
+            
+            result = self.form_submissions.insert_one(submission_data)
+            return str(result.inserted_id)
+            
+        except Exception as e:
+            logger.error(f"Error guardando formulario: {str(e)}")
+            return None
+    
+    @timed('mongo.get_form_submissions_page')
+    def get_form_submissions_page(self, limit=50, cursor=None, email=None, service_type=None):
+        """
+        Obtiene una página de formularios (más recientes primero), con filtros
+        opcionales por email y tipo de servicio. Lanza ValueError si el cursor
+        no es válido.
+        """
+        limit = max(1, min(limit, Config.FORM_SUBMISSIONS_MAX_PAGE_SIZE))
+        position = decode_page_cursor(cursor) if cursor else None
+        
+        try:
+            filters = _submission_filters(email, service_type)
+            query = dict(filters)
+            if position:
+                query['$or'] = _before_position(*position)
+            
+            # notified_at es interno de la cola de trabajos: el listado solo
+            # contiene campos inmutables (ver get_form_submissions_version)
+            submissions = list(self.form_submissions.find(query, {'notified_at': 0}).sort(NEWEST_FIRST).limit(limit + 1))
+            
+            has_more = len(submissions) > limit
+            submissions = submissions[:limit]
+            next_cursor = _next_page_cursor(submissions, has_more)
+            
+            # Sin filtros, el total sale de los metadatos de la colección
+            if filters:
+                total = self.form_submissions.count_documents(filters)
+            else:
+                total = self.form_submissions.estimated_document_count()
+            
+            return {
+                'submissions': submissions,
+                'next_cursor': next_cursor,
+                'total': total
+            }
+            
+        except Exception as e:
+            logger.error(f"Error obteniendo formularios: {str(e)}")
+            return {'submissions': [], 'next_cursor': None, 'total': 0}
+    
+    def export_form_submissions(self, email=None, service_type=None, since=None, until=None, batch_size=None):
+        """
+        Devuelve un cursor sobre los formularios en orden cronológico para
+        exportarlos en streaming, con los mismos índices que el listado
+        """
+        query = _submission_export_query(email, service_type, since, until)
+        return self.form_submissions.find(query, {'notified_at': 0}).sort(
+            [('timestamp', 1), ('_id', 1)]
+        ).batch_size(batch_size or Config.EXPORT_BATCH_SIZE)
+    
+    @timed('mongo.search_form_submissions')
+    def search_form_submissions(self, search, email=None, service_type=None, since=None, until=None, limit=20, cursor=None):
+        """
+        Busca formularios por texto (nombre, empresa y mensaje), ordenados por
+        relevancia, con los filtros de la exportación. Lanza ValueError si la
+        búsqueda o el cursor no son válidos; los errores de MongoDB se propagan
+        """
+        search, limit, position = _search_params(search, limit, cursor)
+        
+        pipeline = _submission_search_pipeline(search, email, service_type, since, until, position, limit)
+        return _search_page(list(self.form_submissions.aggregate(pipeline)), limit)
+    
+    @timed('mongo.get_form_submissions_version')
+    def get_form_submissions_version(self, email=None, service_type=None):
+        """
+        Devuelve el formulario más reciente ({'_id', 'timestamp'}) que cumple los
+        filtros, como versión del listado (los formularios no se modifican)
+        """
+        return self.form_submissions.find_one(
+            _submission_filters(email, service_type),
+            {'timestamp': 1},
+            sort=NEWEST_FIRST
+        )
+    
+    @timed('mongo.enqueue_job')
+    def enqueue_job(self, job):
+        """
+        Encola un trabajo; devuelve False si ya existía uno con el mismo _id
+        """
+        try:
+            job = dict(job, status='pending')
+            self.jobs.insert_one(job)
+            return True
+            
+        except DuplicateKeyError:
+            return False
+    
+    @timed('mongo.claim_job')
+    def claim_job(self, lease):
+        """
+        Reclama de forma atómica el siguiente trabajo listo (o uno cuyo lease
+        expiró sin terminarlo) durante `lease`. Reclamar un trabajo con el
+        lease expirado cuenta como un intento fallido. El trabajo devuelto
+        lleva un lease_id nuevo: finish_job y retry_job solo lo modifican si
+        sigue siendo el mismo
+        """
+        now = datetime.utcnow()
+        return self.jobs.find_one_and_update(
+            {'$or': [
+                {'status': 'pending', 'run_at': {'$lte': now}},
+                {'status': 'running', 'locked_until': {'$lt': now}}
+            ]},
+            [{'$set': {
+                'attempts': {'$cond': [
+                    {'$eq': ['$status', 'running']},
+                    {'$add': [{'$ifNull': ['$attempts', 0]}, 1]},
+                    {'$ifNull': ['$attempts', 0]}
+                ]},
+                'status': 'running',
+                'lease_id': ObjectId(),
+                'locked_until': now + lease,
+                'started_at': now
+            }}],
+            sort=[('run_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+    
+    @timed('mongo.retry_job')
+    def retry_job(self, job_id, lease_id, run_at, error):
+        """
+        Devuelve un trabajo fallido a la cola para reintentarlo en `run_at`.
+        Devuelve False si otro worker lo reclamó al expirar el lease
+        """
+        result = self.jobs.update_one(
+            {'_id': job_id, 'lease_id': lease_id},
+            {'$set': {'status': 'pending', 'run_at': run_at, 'last_error': error},
+             '$inc': {'attempts': 1}}
+        )
+        return result.matched_count > 0
+    
+    @timed('mongo.finish_job')
+    def finish_job(self, job_id, lease_id, status, error=None):
+        """
+        Marca un trabajo como terminado ('done') o descartado ('failed').
+        Devuelve False si otro worker lo reclamó al expirar el lease
+        """
+        update = {'status': status, 'finished_at': datetime.utcnow()}
+        if error:
+            update['last_error'] = error
+        result = self.jobs.update_one({'_id': job_id, 'lease_id': lease_id}, {'$set': update})
+        return result.matched_count > 0
+    
+    def count_pending_jobs(self):
+        """
+        Cuenta los trabajos pendientes (profundidad de la cola)
+        """
+        return self.jobs.count_documents({'status': 'pending'})
+    
+    @timed('mongo.mark_submission_notified')
+    def mark_submission_notified(self, submission_id):
+        """
+        Marca un formulario como notificado al equipo comercial
+        """
+        result = self.form_submissions.update_one(
+            {'_id': ObjectId(submission_id), 'notified_at': {'$exists': False}},
+            {'$set': {'notified_at': datetime.utcnow()}}
+        )
+        return result.modified_count > 0
+    
+    @timed('mongo.increment_daily_counter')
+    def increment_daily_counter(self, event, day=None):
+        """
+        Incrementa el contador diario de un evento de analítica
+        """
+        day = day or datetime.utcnow().strftime('%Y-%m-%d')
+        self.db.analytics_daily.update_one(
+            {'day': day, 'event': event},
+            {'$inc': {'count': 1}},
+            upsert=True
+        )
+    
+    @timed('mongo.cleanup_expired_sessions')
     def cleanup_expired_sessions(self):
         """
-        Limpia sesiones expiradas (para ejecutar periódicamente)
+        Marca como inactivas las sesiones expiradas que el índice TTL aún no ha
+        borrado (el monitor TTL de MongoDB se ejecuta cada ~60 segundos)
         """
         try:
             result = self.sessions.update_many(
@@ -210,9 +1403,46 @@ class MongoDBService:
                 {'$set': {'is_active': False, 'expired_at': datetime.utcnow()}}
             )
             
-            logger.info(f"Sesiones expiradas limpiadas: {result.modified_count}")
+            logger.info("Sesiones expiradas limpiadas: %s", result.modified_count)
             return result.modified_count
             
         except Exception as e:
             logger.error(f"Error limpiando sesiones expiradas: {str(e)}")
-            return 0 
\ No newline at end of file
+            return 0 
+
+
+# Instancia compartida por todo el proceso (app.py y middleware)
+_db_service = None
+_db_service_lock = threading.Lock()
+
+def get_db_service():
+    """
+    Devuelve el MongoDBService compartido del proceso, creándolo la primera vez.
+    El cliente conecta de forma perezosa; los índices solo se crean aquí si
+    MONGODB_AUTO_CREATE_INDEXES está activado.
+    """
+    global _db_service
+    if _db_service is None:
+        with _db_service_lock:
+            if _db_service is None:
+                _db_service = MongoDBService(create_indexes=Config.MONGODB_AUTO_CREATE_INDEXES)
+    return _db_service
+
+def reset_db_service():
+    """
+    Descarta el MongoDBService heredado tras fork() sin cerrarlo: MongoClient no
+    es fork-safe y el proceso hijo debe crear su propio cliente y pool
+    """
+    global _db_service, _db_service_lock
+    _db_service = None
+    _db_service_lock = threading.Lock()
+
+def close_db_service():
+    """
+    Cierra el MongoDBService compartido (vacía el escritor diferido y el pool)
+    """
+    global _db_service
+    with _db_service_lock:
+        if _db_service is not None:
+            _db_service.close()
+            _db_service = None
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from config import Config
+from mongodb_service import get_db_service
+from async_mongodb_service import get_async_db_service
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+import logging
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_EDGE_PUNCTUATION = ' \t\n¿?¡!.,;:'
+
+def normalize_prompt(message):
+    """
+    Normaliza un mensaje para que preguntas equivalentes compartan entrada
+    (mayúsculas, espacios y signos de puntuación en los extremos)
+    """
+    normalized = unicodedata.normalize('NFKC', message).lower()
+    normalized = _WHITESPACE_RE.sub(' ', normalized)
+    return normalized.strip(_EDGE_PUNCTUATION)
+
+class ResponseCache:
+    """
+    Caché de respuestas del chatbot por coincidencia exacta del prompt normalizado
+    y la huella del backend (nombre, versión y system prompt). Los mensajes con
+    conversación previa solo comparten entrada dentro de esa conversación. LRU
+    con TTL en memoria y, opcionalmente, persistida en MongoDB para compartirla
+    entre workers.
+    """
+
+    def __init__(self, max_size=None, ttl=None, persistent=None):
+        self.max_size = max_size if max_size is not None else Config.RESPONSE_CACHE_MAX_SIZE
+        self.ttl = ttl if ttl is not None else Config.RESPONSE_CACHE_TTL
+        self.persistent = persistent if persistent is not None else Config.RESPONSE_CACHE_PERSISTENT
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self.saved_backend_ms = 0.0
+
+    def allowed(self, data, user):
+        """
+        Indica si se puede usar la caché de respuestas: la conversación puede
+        desactivarla con "cache": false y el usuario con chat_cache_opt_out
+        """
+        if not Config.RESPONSE_CACHE_ENABLED or data.get('cache') is False:
+            return False
+        return not (user.get('user_data') or {}).get('chat_cache_opt_out', False)
+
+    def make_key(self, backend, message, user, context=None):
+        """
+        Construye la clave de caché; los backends personalizados la separan por
+        usuario. Si el contexto tiene turnos o resumen, la respuesta depende de la
+        conversación ("sí", "cuéntame más"): la clave incluye el usuario y el contexto
+        """
+        parts = [backend.fingerprint(), normalize_prompt(message)]
+        conversational = bool(context and (context['summary'] or context['turns']))
+        if backend.personalized or conversational:
+            parts.append(user['user_id'])
+        if conversational:
+            parts.append(json.dumps([context['summary'], context['turns']], ensure_ascii=False))
+        return hashlib.sha256('\x00'.join(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Devuelve la respuesta en caché o None
+        """
+        response = self._get_local(key)
+        if response is not None:
+            return response
+
+        if self.persistent:
+            document = get_db_service().get_cached_response(key)
+            if document:
+                return self._persistent_hit(key, document)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def aget(self, key):
+        """
+        Versión asíncrona de get (app ASGI): la caché persistente se consulta
+        con AsyncMongoDBService
+        """
+        response = self._get_local(key)
+        if response is not None:
+            return response
+
+        if self.persistent:
+            document = await get_async_db_service().get_cached_response(key)
+            if document:
+                return self._persistent_hit(key, document)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, response, backend_ms):
+        """
+        Guarda una respuesta junto con lo que tardó el backend en generarla
+        """
+        self._store_local(key, response, backend_ms, time.time() + self.ttl)
+        if self.persistent:
+            expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+            get_db_service().save_cached_response(key, response, backend_ms, expires_at)
+
+    async def aset(self, key, response, backend_ms):
+        """
+        Versión asíncrona de set
+        """
+        self._store_local(key, response, backend_ms, time.time() + self.ttl)
+        if self.persistent:
+            expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+            await get_async_db_service().save_cached_response(key, response, backend_ms, expires_at)
+
+    def _get_local(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, response, backend_ms = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_backend_ms += backend_ms
+                    return response
+                del self._entries[key]
+        return None
+
+    def _persistent_hit(self, key, document):
+        # La entrada local no vive más que la del documento persistido
+        expires_at = min(time.time() + self.ttl, (document['expires_at'] - datetime(1970, 1, 1)).total_seconds())
+        self._store_local(key, document['response'], document.get('backend_ms', 0.0), expires_at)
+        with self._lock:
+            self.hits += 1
+            self.persistent_hits += 1
+            self.saved_backend_ms += document.get('backend_ms', 0.0)
+        return document['response']
+
+    def _store_local(self, key, response, backend_ms, expires_at):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (expires_at, response, backend_ms)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Devuelve la tasa de aciertos y la latencia de backend ahorrada
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'saved_backend_ms': self.saved_backend_ms
+            }
+
+# Caché compartida por todo el proceso
+response_cache = ResponseCache()
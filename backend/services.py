@@ -0,0 +1,163 @@
+from config import Config
+from mongodb_service import close_db_service, get_db_service, reset_db_service
+from async_mongodb_service import close_async_db_service, get_async_db_service, reset_async_db_service
+from google_certs import google_cert_cache
+from token_denylist import token_denylist
+from chat_context import ChatContextBuilder
+from jobs import create_job_queue
+from tasks import register_tasks
+import os
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class AppServices:
+    """
+    Servicios de la aplicación, creados en el primer uso y no al importar la app:
+    un worker nuevo arranca sin conectar a MongoDB ni crear índices, y si MongoDB
+    no está disponible se vuelve a intentar pasado MONGODB_RETRY_INTERVAL en lugar
+    de quedarse sin base de datos hasta reiniciar.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._db_service = None
+        self._db_failed_at = None
+        self._context_builder = None
+        self._job_queue = None
+        self._async_db_service = None
+        self._async_db_failed_at = None
+        self._async_context_builder = None
+
+    @property
+    def db(self):
+        """
+        MongoDBService compartido, o None si no se pudo crear. Al crearlo se
+        arranca también la cola de trabajos en segundo plano
+        """
+        if self._db_service is None:
+            with self._lock:
+                if self._db_service is None and self._can_retry():
+                    try:
+                        db_service = get_db_service()
+                    except Exception as e:
+                        logger.error(f"Error inicializando MongoDB: {str(e)}")
+                        self._db_failed_at = time.time()
+                    else:
+                        self._db_failed_at = None
+                        self._job_queue = self._start_job_queue(db_service)
+                        self._db_service = db_service
+        return self._db_service
+
+    def _can_retry(self, failed_at=None):
+        failed_at = failed_at if failed_at is not None else self._db_failed_at
+        return failed_at is None or time.time() - failed_at >= Config.MONGODB_RETRY_INTERVAL
+
+    @property
+    def async_db(self):
+        """
+        AsyncMongoDBService compartido para la app ASGI, o None si no se pudo
+        crear. Solo se usa desde el event loop; la cola de trabajos sigue
+        arrancándose con el MongoDBService síncrono (ver job_queue)
+        """
+        if self._async_db_service is None and self._can_retry(self._async_db_failed_at):
+            try:
+                self._async_db_service = get_async_db_service()
+                self._async_db_failed_at = None
+            except Exception as e:
+                logger.error(f"Error inicializando MongoDB (asíncrono): {str(e)}")
+                self._async_db_failed_at = time.time()
+        return self._async_db_service
+
+    def _start_job_queue(self, db_service):
+        job_queue = create_job_queue(db_service)
+        register_tasks(job_queue, db_service)
+        job_queue.start()
+        return job_queue
+
+    @property
+    def context_builder(self):
+        """
+        Constructor del contexto de conversación (últimos turnos + resumen acumulado)
+        """
+        if self._context_builder is None:
+            db_service = self.db
+            if db_service:
+                self._context_builder = ChatContextBuilder(db_service)
+        return self._context_builder
+
+    @property
+    def async_context_builder(self):
+        """
+        Constructor del contexto de conversación sobre AsyncMongoDBService (usar abuild)
+        """
+        if self._async_context_builder is None:
+            db_service = self.async_db
+            if db_service:
+                self._async_context_builder = ChatContextBuilder(db_service)
+        return self._async_context_builder
+
+    @property
+    def job_queue(self):
+        """
+        Cola de trabajos en segundo plano (None si no hay base de datos)
+        """
+        return self._job_queue if self.db else None
+
+    def job_queue_stats(self):
+        """
+        Estadísticas de la cola sin inicializar los servicios (None si aún no existe)
+        """
+        return self._job_queue.stats() if self._job_queue else None
+
+    def reset_after_fork(self):
+        """
+        En un proceso hijo tras fork() (p. ej. workers de Gunicorn con preload):
+        descarta el cliente de MongoDB y los hilos heredados del padre, que se
+        vuelven a crear en el primer uso dentro del worker
+        """
+        self._lock = threading.Lock()
+        self._db_service = None
+        self._db_failed_at = None
+        self._context_builder = None
+        self._job_queue = None
+        self._async_db_service = None
+        self._async_db_failed_at = None
+        self._async_context_builder = None
+        reset_db_service()
+        reset_async_db_service()
+        token_denylist.reset_after_fork()
+        google_cert_cache.reset_after_fork()
+
+    def shutdown(self):
+        """
+        Apagado ordenado del worker: termina los trabajos en curso, detiene la
+        sincronización de la lista de revocación, vacía el escritor diferido y
+        cierra el pool de MongoDB
+        """
+        if self._job_queue:
+            self._job_queue.stop()
+        token_denylist.stop()
+        if self._db_service:
+            close_db_service()
+            self._db_service = None
+        logger.info("Servicios detenidos")
+
+    async def ashutdown(self):
+        """
+        Apagado ordenado de un worker ASGI: cierra el cliente asíncrono y
+        después el resto de servicios (ver shutdown)
+        """
+        if self._async_db_service:
+            await close_async_db_service()
+            self._async_db_service = None
+            self._async_context_builder = None
+        self.shutdown()
+
+# Servicios compartidos por todo el proceso
+services = AppServices()
+
+# MongoClient no es fork-safe: cada proceso hijo crea sus propios clientes
+os.register_at_fork(after_in_child=services.reset_after_fork)
@@ -0,0 +1,27 @@
+from config import Config
+import logging
+
+logger = logging.getLogger(__name__)
+
+def register_tasks(job_queue, db_service):
+    """
+    Registra los trabajos en segundo plano de la aplicación y programa los periódicos
+    """
+
+    @job_queue.task('cleanup_expired_sessions')
+    def cleanup_expired_sessions():
+        db_service.cleanup_expired_sessions()
+
+    @job_queue.task('notify_new_lead')
+    def notify_new_lead(submission_id, email, service_type=''):
+        # Solo se notifica una vez aunque el trabajo se reintente
+        if db_service.mark_submission_notified(submission_id):
+            logger.info("Nuevo lead notificado: %s (%s) [%s]", email, service_type or 'sin servicio', submission_id)
+
+    # En memoria incluso con JOBS_BACKEND=mongo: encolarlo no añade una escritura
+    # en MongoDB a cada request y perder algún contador al reiniciar es aceptable
+    @job_queue.task('track_event', persistent=False)
+    def track_event(event):
+        db_service.increment_daily_counter(event)
+
+    job_queue.schedule('cleanup_expired_sessions', Config.SESSION_CLEANUP_INTERVAL)
@@ -0,0 +1,206 @@
+from datetime import timedelta
+from config import Config
+from mongodb_service import get_db_service
+from async_mongodb_service import get_async_db_service
+import asyncio
+import hashlib
+import math
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class BloomFilter:
+    """
+    Filtro de Bloom sencillo (sin falsos negativos) para jtis revocados
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.num_hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).digest()
+        h1 = int.from_bytes(digest[:8], 'big')
+        h2 = int.from_bytes(digest[8:16], 'big') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.num_hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+class TokenDenylist:
+    """
+    Lista local de jtis revocados respaldada por la colección revoked_tokens.
+    Los tokens válidos se aceptan sin consultar MongoDB: solo los positivos del
+    filtro de Bloom se confirman contra la base de datos. Un hilo en segundo plano
+    sincroniza las revocaciones nuevas cada JWT_DENYLIST_SYNC_INTERVAL segundos y
+    reconstruye el filtro periódicamente para olvidar los tokens ya expirados.
+    """
+
+    # Margen al sincronizar para no perder revocaciones que llegan con retraso
+    SYNC_OVERLAP = timedelta(seconds=5)
+
+    def __init__(self, capacity=None, error_rate=None, sync_interval=None, rebuild_interval=None):
+        self.capacity = capacity or Config.JWT_DENYLIST_CAPACITY
+        self.error_rate = error_rate or Config.JWT_DENYLIST_ERROR_RATE
+        self.sync_interval = sync_interval or Config.JWT_DENYLIST_SYNC_INTERVAL
+        self.rebuild_interval = rebuild_interval or Config.JWT_DENYLIST_REBUILD_INTERVAL
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._lock = threading.Lock()
+        self._last_seen = None
+        self._last_rebuild = 0.0
+        self._thread = None
+        self._stopping = threading.Event()
+        self.checks = 0
+        self.positives = 0
+        self.false_positives = 0
+        self.syncs = 0
+
+    def start(self):
+        """
+        Carga el filtro y arranca el hilo de sincronización (una vez por proceso)
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='token-denylist-sync', daemon=True)
+
+        try:
+            self.rebuild()
+        except Exception as e:
+            # El hilo de sincronización reintentará la carga completa
+            logger.warning(f"Error cargando tokens revocados: {str(e)}")
+        self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el hilo de sincronización (al apagar el worker)
+        """
+        self._stopping.set()
+
+    def reset_after_fork(self):
+        """
+        En un proceso hijo tras fork(): el hilo del padre no existe, así que se
+        descarta su estado para arrancar uno nuevo en el primer uso
+        """
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.sync_interval):
+            try:
+                if time.time() - self._last_rebuild >= self.rebuild_interval:
+                    self.rebuild()
+                else:
+                    self.sync()
+            except Exception as e:
+                logger.warning(f"Error sincronizando tokens revocados: {str(e)}")
+
+    def rebuild(self):
+        """
+        Reconstruye el filtro solo con las revocaciones que aún no han expirado
+        """
+        new_filter = BloomFilter(self.capacity, self.error_rate)
+        last_seen = None
+        for entry in get_db_service().get_revoked_tokens():
+            new_filter.add(entry['jti'])
+            if last_seen is None or entry['revoked_at'] > last_seen:
+                last_seen = entry['revoked_at']
+
+        with self._lock:
+            self._filter = new_filter
+            self._last_seen = last_seen or self._last_seen
+            self._last_rebuild = time.time()
+            self.syncs += 1
+
+    def sync(self):
+        """
+        Añade al filtro las revocaciones registradas desde la última sincronización
+        """
+        since = self._last_seen - self.SYNC_OVERLAP if self._last_seen else None
+        entries = get_db_service().get_revoked_tokens(since)
+
+        with self._lock:
+            for entry in entries:
+                self._filter.add(entry['jti'])
+                if self._last_seen is None or entry['revoked_at'] > self._last_seen:
+                    self._last_seen = entry['revoked_at']
+            self.syncs += 1
+
+    def revoke(self, jti, expires_at):
+        """
+        Revoca un jti hasta su expiración (en este proceso de inmediato y en el
+        resto de workers en la siguiente sincronización)
+        """
+        if not jti:
+            return False
+
+        with self._lock:
+            self._filter.add(jti)
+        return get_db_service().revoke_token(jti, expires_at)
+
+    def is_revoked(self, jti):
+        """
+        Indica si un jti está revocado. Solo consulta MongoDB si el filtro da
+        positivo; si esa consulta falla, lanza la excepción
+        """
+        if not jti:
+            return False
+
+        if self._thread is None:
+            self.start()
+
+        if not self._filter_positive(jti):
+            return False
+        return self._confirmed(get_db_service().is_token_revoked(jti))
+
+    async def ais_revoked(self, jti):
+        """
+        Versión asíncrona de is_revoked (app ASGI): los positivos del filtro se
+        confirman con AsyncMongoDBService sin bloquear el event loop
+        """
+        if not jti:
+            return False
+
+        if self._thread is None:
+            # La carga inicial del filtro usa el cliente síncrono
+            await asyncio.to_thread(self.start)
+
+        if not self._filter_positive(jti):
+            return False
+        return self._confirmed(await get_async_db_service().is_token_revoked(jti))
+
+    def _filter_positive(self, jti):
+        self.checks += 1
+        if jti not in self._filter:
+            return False
+        self.positives += 1
+        return True
+
+    def _confirmed(self, revoked):
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def stats(self):
+        return {
+            'filter_bits': self._filter.size,
+            'filter_hashes': self._filter.num_hashes,
+            'entries': self._filter.count,
+            'checks': self.checks,
+            'positives': self.positives,
+            'false_positives': self.false_positives,
+            'syncs': self.syncs
+        }
+
+# Lista compartida por todo el proceso
+token_denylist = TokenDenylist()